@@ -2,6 +2,8 @@
 ASGI config for lgramweb project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Under an ASGI server the /generate/stream/ endpoint streams sentences from an
+async iterator instead of holding a worker thread for the whole generation.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -43,9 +43,11 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'main.visitor.VisitorCookieMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'main.session_manager.RecentActivityMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -82,6 +84,17 @@ DATABASES = {
 }
 
 
+# Cache
+# Shared by every worker process: rate limit counters and recent activity rings
+# must not be per process. The table is created by migration 0010 (or createcachetable)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'lgram_cache',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -138,8 +151,106 @@ SESSION_COOKIE_SECURE = False  # Set to True in production with HTTPS
 SESSION_COOKIE_HTTPONLY = True  # Prevent XSS attacks
 SESSION_COOKIE_SAMESITE = 'Lax'  # CSRF protection
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'  # Store in database
+SESSION_ENGINE = 'main.session_backend'  # Database store that skips no-op writes
+SESSION_EXPIRY_REFRESH_SECONDS = 300  # Unchanged sessions push expire_date forward at most this often
 
 # Session cleanup settings
 SESSION_COOKIE_NAME = 'lgram_sessionid'
+VISITOR_COOKIE_NAME = 'lgram_visitor'  # Signed id for anonymous visitors without a session
 SESSION_SERIALIZER = 'django.contrib.sessions.serializers.JSONSerializer'
+
+# Language model settings
+# Load the lgram model in a background thread as soon as each worker starts,
+# instead of on the first generation request
+LGRAM_MODEL_WARMUP = False
+
+# Generation result cache (opt-in)
+# Identical seed text + settings + model version reuse a stored result
+GENERATION_CACHE_ENABLED = False
+GENERATION_CACHE_MEMORY_ENTRIES = 256  # Per-process LRU tier
+GENERATION_CACHE_MEMORY_BYTES = 4 * 1024 * 1024
+GENERATION_CACHE_DB_BYTES = 50 * 1024 * 1024  # Database tier
+
+# Grammar correction micro-batching
+# Concurrent correct_grammar_t5 calls are grouped into one padded T5 generate() call per window.
+# Needs the corrector's tokenizer and model on the lgram model; batching stays off (with a logged
+# warning) without them or when the batched output differs from correct_grammar_t5
+GRAMMAR_BATCHING_ENABLED = False
+GRAMMAR_BATCH_MAX_SIZE = 16
+GRAMMAR_BATCH_WAIT_MS = 10
+GRAMMAR_BATCH_TIMEOUT_SECONDS = 60
+GRAMMAR_T5_TOKENIZER_ATTR = 't5_tokenizer'
+GRAMMAR_T5_MODEL_ATTR = 't5_model'
+GRAMMAR_T5_PREFIX = ''  # Must match the task prefix correct_grammar_t5 adds
+GRAMMAR_T5_MAX_LENGTH = 256
+
+# Batch generation API
+# Prompts are generated on a process pool; each process keeps its own warm model
+GENERATION_POOL_SIZE = 2
+GENERATION_POOL_START_METHOD = 'spawn'
+GENERATION_BATCH_MAX_PROMPTS = 32
+GENERATION_STREAM_CLAIM_SECONDS = 30  # Workers leave jobs queued for a stream alone this long
+
+# Generation rate limit
+# Generations allowed per signed-in user (or per IP for anonymous visitors) in a window of seconds
+GENERATION_RATE_LIMIT = (30, 60)
+RATE_LIMIT_CACHE = 'default'
+
+# Transition analysis limits
+# Texts above MAX_CHARS are rejected; analyses slower than BUDGET_SECONDS are flagged
+TRANSITION_ANALYSIS_MAX_CHARS = 100_000
+TRANSITION_ANALYSIS_BUDGET_SECONDS = 10.0
+
+# Parse-artifact cache shared by the analysis views
+LGRAM_SPACY_MODEL = 'en_core_web_sm'
+PARSE_CACHE_MAX_ENTRIES = 64
+PARSE_CACHE_MAX_CHARS = 2_000_000  # Total text held in memory
+PARSE_CACHE_DIR = None  # e.g. BASE_DIR / 'parse_cache' to keep parses across restarts
+PARSE_CACHE_DISK_MAX_FILES = 1000
+PARSE_CACHE_MAX_SENTENCES = 20_000  # Per-sentence artifacts reused across edited drafts
+PARSE_CACHE_TRANSITION_CONTEXT = 3  # Preceding sentences re-analyzed with an edited pair
+
+# Full-text search
+SEARCH_INDEX_CHECK_SECONDS = 60  # How long each worker trusts that the FTS tables and triggers exist
+
+# Activity logging
+# Activity rows are queued in memory and written with bulk_create by a background
+# thread; set ACTIVITY_LOG_ASYNC = False (e.g. in tests) to write each row immediately
+ACTIVITY_LOG_ASYNC = True
+ACTIVITY_LOG_FLUSH_SIZE = 100
+ACTIVITY_LOG_FLUSH_INTERVAL = 1.0  # Seconds
+ACTIVITY_LOG_MAX_PENDING = 10_000  # Oldest rows are dropped past this while the database is unavailable
+
+# Per-user statistics
+# Missing UserStats rows are seeded by a background thread, never on the request path;
+# with USER_STATS_BACKFILL_ASYNC = False run reconcile_user_stats --missing instead
+USER_STATS_BACKFILL_ASYNC = True
+
+# Recent activity tracking
+# Per-visitor ring buffer of fixed-size records, kept in memory and copied to the cache
+RECENT_ACTIVITY_SIZE = 20
+RECENT_ACTIVITY_MAX_SESSIONS = 1000  # Rings held in each worker's memory
+RECENT_ACTIVITY_PERSIST_SECONDS = 30
+RECENT_ACTIVITY_CACHE = 'default'
+
+# Cleanup commands
+# Old rows are deleted in primary-key order, one short transaction per batch
+CLEANUP_BATCH_SIZE = 500
+CLEANUP_BATCH_SLEEP = 0.05  # Seconds between batches, lets live requests take the write lock
+
+# Log partitioning
+# Login and activity logs written to one table per month; retention drops whole months.
+# Tables are created by the create_log_partitions command (run it daily from cron and after migrate)
+LOG_PARTITIONING_ENABLED = False
+LOG_PARTITION_LIST_SECONDS = 60  # How long each worker caches the list of partition tables
+
+# Log archive
+# archive_logs moves old log rows into gzip JSONL segments with a per-user index
+LOG_ARCHIVE_DIR = BASE_DIR / 'log_archive'
+
+# Personal data export
+EXPORT_CHUNK_SIZE = 2000  # Rows read per query and emitted per streamed chunk
+
+# Admin on large tables
+# Log changelists count at most this many rows and page by keyset instead of OFFSET
+ADMIN_COUNT_CAP = 10_000
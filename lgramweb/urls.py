@@ -21,12 +21,17 @@ from django.conf.urls.static import static
 from main.views import (
     index, transition_analysis, coherence_report, 
     login_view, register_view, logout_view, session_info_view,
-    profile_view, settings_view, export_data_view
+    profile_view, settings_view, export_data_view, history_search_view, job_status,
+    generate_stream, stream_job, generate_batch_api
 )
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', index, name='index'),
+    path('generate/stream/', generate_stream, name='generate_stream'),
+    path('generate/stream/<int:job_id>/', stream_job, name='generate_stream_job'),
+    path('jobs/<int:job_id>/', job_status, name='job_status'),
+    path('api/generate/batch/', generate_batch_api, name='generate_batch_api'),
     path('transition-analysis/', transition_analysis, name='transition_analysis'),
     path('coherence-report/', coherence_report, name='coherence_report'),
     path('login/', login_view, name='login'),
@@ -36,6 +41,7 @@ urlpatterns = [
     path('profile/', profile_view, name='profile'),
     path('settings/', settings_view, name='settings'),
     path('export-data/', export_data_view, name='export_data'),
+    path('history/search/', history_search_view, name='history_search'),
 ]
 
 if settings.DEBUG:
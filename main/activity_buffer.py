@@ -0,0 +1,252 @@
+"""
+Per-session ring buffer of recent activity
+
+Recent activity used to be a JSON list inside the session, rewritten on
+every request. It now lives in a fixed-size ring of packed 128-byte
+records per visitor. The ring is kept in process memory (an LRU bounded
+by RECENT_ACTIVITY_MAX_SESSIONS) and merged into the Django cache
+(RECENT_ACTIVITY_CACHE) at most every RECENT_ACTIVITY_PERSIST_SECONDS,
+when it is evicted, and at interpreter exit.
+
+Every worker records into its own copy of the ring, so a persist re-reads
+the stored ring and merges in only the records this worker added since its
+last persist, under a short cache lock; rings held in memory are refreshed
+from the cache on the same interval. Other workers therefore see activity
+up to that interval late. The cache must be shared by all workers (see
+CACHES in settings); with a per-process cache each worker sees only its
+own requests.
+"""
+import atexit
+import struct
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone as dt_timezone
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .visitor import get_visitor_id
+
+# timestamp, activity type, HTTP method, detail (usually the path)
+RECORD = struct.Struct('<d16s8s96s')
+
+
+def _pack(timestamp: float, activity_type: str, method: str, detail: str) -> bytes:
+    return RECORD.pack(
+        timestamp,
+        activity_type.encode('utf-8')[:16],
+        method.encode('utf-8')[:8],
+        detail.encode('utf-8')[:96],
+    )
+
+
+def _text(raw: bytes) -> str:
+    return raw.rstrip(b'\0').decode('utf-8', 'ignore')
+
+
+class ActivityRing:
+    """
+    Fixed number of packed records; the oldest is overwritten when full
+    """
+
+    __slots__ = ('size', 'data', 'head', 'pending', 'persisted_at')
+
+    def __init__(self, size: int, data: Optional[bytes] = None, head: int = 0):
+        self.size = size
+        # Stored rings of another size (RECENT_ACTIVITY_SIZE changed) are discarded
+        valid = data is not None and len(data) == size * RECORD.size
+        self.data = bytearray(data) if valid else bytearray(size * RECORD.size)
+        self.head = head if valid else 0
+        # Records appended since the last persist, not yet in the cache
+        self.pending: List[bytes] = []
+        self.persisted_at = time.monotonic()
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self.pending)
+
+    def _write(self, record: bytes) -> None:
+        offset = (self.head % self.size) * RECORD.size
+        self.data[offset:offset + RECORD.size] = record
+        self.head += 1
+
+    def append(self, record: bytes) -> None:
+        self._write(record)
+        self.pending.append(record)
+        del self.pending[:-self.size]
+
+    def raw_records(self) -> List[bytes]:
+        """
+        Packed records, oldest first
+        """
+        start = max(0, self.head - self.size)
+        return [
+            bytes(self.data[(index % self.size) * RECORD.size:(index % self.size + 1) * RECORD.size])
+            for index in range(start, self.head)
+        ]
+
+    def merge(self, stored: Optional[tuple]) -> None:
+        """
+        Replace the contents with the stored ring plus the pending records, newest ``size`` by timestamp
+        """
+        # Nothing stored (expired or evicted from the cache): keep what this worker has
+        base = ActivityRing(self.size, *stored).raw_records() if stored else self.raw_records()
+        seen = set(base)
+        merged = base + [record for record in self.pending if record not in seen]
+        merged.sort(key=lambda record: RECORD.unpack_from(record)[0])
+        self.data = bytearray(self.size * RECORD.size)
+        self.head = 0
+        for record in merged[-self.size:]:
+            self._write(record)
+
+    def __len__(self) -> int:
+        return min(self.head, self.size)
+
+    def records(self) -> List[tuple]:
+        """
+        Unpacked records, oldest first
+        """
+        start = max(0, self.head - self.size)
+        return [
+            RECORD.unpack_from(self.data, (index % self.size) * RECORD.size)
+            for index in range(start, self.head)
+        ]
+
+
+class RecentActivityBuffer:
+    """
+    Process-wide LRU of activity rings keyed by visitor
+    """
+
+    _lock = threading.Lock()
+    _rings: 'OrderedDict[str, ActivityRing]' = OrderedDict()
+
+    @staticmethod
+    def buffer_key(request) -> Optional[str]:
+        if request.user.is_authenticated:
+            return f"user_{request.user.id}"
+        return request.session.session_key or get_visitor_id(request, create=False)
+
+    @staticmethod
+    def _cache():
+        return caches[getattr(settings, 'RECENT_ACTIVITY_CACHE', 'default')]
+
+    @classmethod
+    def _get_ring(cls, key: str) -> ActivityRing:
+        """
+        Ring for this key from memory, then the cache; caller must hold the lock
+        """
+        ring = cls._rings.get(key)
+        if ring is not None:
+            cls._rings.move_to_end(key)
+            return ring
+
+        size = getattr(settings, 'RECENT_ACTIVITY_SIZE', 20)
+        stored = cls._cache().get(f'recent_activity:{key}')
+        ring = ActivityRing(size, *stored) if stored else ActivityRing(size)
+        cls._rings[key] = ring
+        while len(cls._rings) > getattr(settings, 'RECENT_ACTIVITY_MAX_SESSIONS', 1000):
+            evicted_key, evicted = cls._rings.popitem(last=False)
+            if evicted.dirty:
+                cls._persist(evicted_key, evicted)
+        return ring
+
+    @classmethod
+    def _persist(cls, key: str, ring: ActivityRing) -> None:
+        """
+        Merge the ring's pending records into the stored ring and reload it
+        """
+        cache = cls._cache()
+        cache_key = f'recent_activity:{key}'
+        lock_key = f'{cache_key}:lock'
+        locked = False
+        if ring.dirty:
+            # add() is atomic on shared backends; give up after ~0.1s and retry on the next persist
+            for _ in range(10):
+                locked = cache.add(lock_key, 1, timeout=5)
+                if locked:
+                    break
+                time.sleep(0.01)
+            else:
+                return
+        try:
+            ring.merge(cache.get(cache_key))
+            if ring.dirty:
+                cache.set(cache_key, (bytes(ring.data), ring.head), getattr(settings, 'SESSION_COOKIE_AGE', 1209600))
+                ring.pending.clear()
+        finally:
+            if locked:
+                cache.delete(lock_key)
+        ring.persisted_at = time.monotonic()
+
+    @classmethod
+    def _sync_if_due(cls, key: str, ring: ActivityRing) -> ActivityRing:
+        """
+        Persist the ring, picking up what other workers recorded, once per RECENT_ACTIVITY_PERSIST_SECONDS
+        """
+        if time.monotonic() - ring.persisted_at >= getattr(settings, 'RECENT_ACTIVITY_PERSIST_SECONDS', 30):
+            cls._persist(key, ring)
+        return ring
+
+    @classmethod
+    def record(cls, request, activity_type: str, metadata: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Append an activity for the visitor behind this request
+        """
+        key = cls.buffer_key(request)
+        if key is None:
+            return
+        metadata = metadata or {}
+        detail = metadata.get('path') or next((str(value) for value in metadata.values()), '')
+        entry = _pack(time.time(), activity_type, metadata.get('method', ''), detail)
+
+        with cls._lock:
+            ring = cls._get_ring(key)
+            ring.append(entry)
+            cls._sync_if_due(key, ring)
+
+    @classmethod
+    def get_activities(cls, request, activity_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Recent activities for this visitor, oldest first
+        """
+        key = cls.buffer_key(request)
+        if key is None:
+            return []
+        with cls._lock:
+            records = cls._sync_if_due(key, cls._get_ring(key)).records()
+
+        activities = []
+        for timestamp, kind, method, detail in records:
+            kind = _text(kind)
+            if activity_type and kind != activity_type:
+                continue
+            activities.append({
+                'type': kind,
+                'timestamp': datetime.fromtimestamp(timestamp, tz=dt_timezone.utc),
+                'metadata': {'path': _text(detail), 'method': _text(method)},
+            })
+        return activities
+
+    @classmethod
+    def count(cls, request) -> int:
+        key = cls.buffer_key(request)
+        if key is None:
+            return 0
+        with cls._lock:
+            return len(cls._sync_if_due(key, cls._get_ring(key)))
+
+    @classmethod
+    def persist_all(cls) -> None:
+        """
+        Merge every ring with unsaved activity into the cache
+        """
+        with cls._lock:
+            for key, ring in cls._rings.items():
+                if ring.dirty:
+                    cls._persist(key, ring)
+
+
+atexit.register(RecentActivityBuffer.persist_all)
@@ -0,0 +1,189 @@
+"""
+Buffered activity logging
+
+log_user_activity hands unsaved UserActivityLog rows to a process-wide
+ActivityLogSink instead of inserting them on the request path. A
+background thread writes the queued rows with one bulk_create when
+ACTIVITY_LOG_FLUSH_SIZE rows are pending or every
+ACTIVITY_LOG_FLUSH_INTERVAL seconds, whichever comes first. Counter
+increments (see rollups.py) are summed in memory and upserted on the
+same flush. Pending rows are flushed at interpreter exit. With
+ACTIVITY_LOG_ASYNC = False (e.g. in tests) every row is written
+immediately.
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityLogSink:
+    """
+    Queues model instances in memory and writes them in batches
+    """
+
+    def __init__(self, flush_size: int = 100, flush_interval: float = 1.0, max_pending: int = 10_000):
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = max(0.01, flush_interval)
+        self.max_pending = max(self.flush_size, max_pending)
+        self._pending: List[Any] = []
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._stats = {'queued': 0, 'counted': 0, 'written': 0, 'flushes': 0, 'dropped': 0, 'errors': 0}
+
+    def emit(self, instance) -> None:
+        """
+        Queue an unsaved model instance for the next flush
+        """
+        self._ensure_flusher()
+        with self._lock:
+            self._pending.append(instance)
+            self._stats['queued'] += 1
+            if len(self._pending) > self.max_pending:
+                # The database has been unavailable for a while; keep the newest rows
+                overflow = len(self._pending) - self.max_pending
+                del self._pending[:overflow]
+                self._stats['dropped'] += overflow
+            full = len(self._pending) >= self.flush_size
+        if full:
+            self._wake.set()
+
+    def count(self, key, amount: int = 1) -> None:
+        """
+        Add to a rollup counter; repeated keys are merged before the flush
+        """
+        self._ensure_flusher()
+        with self._lock:
+            self._counts[key] += amount
+            self._stats['counted'] += amount
+
+    def _ensure_flusher(self) -> None:
+        # Threads do not survive fork(), so restart the flusher in child workers
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                # Rows inherited from the parent are the parent's to write
+                self._pending = []
+                self._counts = Counter()
+            self._pid = os.getpid()
+            self._stopped = False
+            self._thread = threading.Thread(target=self._flush_forever, name='activity-log-sink', daemon=True)
+            self._thread.start()
+
+    def _flush_forever(self) -> None:
+        while not self._stopped:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+        connection.close()
+
+    def flush(self) -> int:
+        """
+        Write every pending instance and counter now; returns how many rows were written
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                counts, self._counts = self._counts, Counter()
+            if not batch and not counts:
+                return 0
+
+            close_old_connections()
+            if counts:
+                self._flush_counts(counts)
+            written = 0
+            try:
+                by_model: Dict[type, List[Any]] = {}
+                for instance in batch:
+                    by_model.setdefault(type(instance), []).append(instance)
+                for model, instances in by_model.items():
+                    model.objects.bulk_create(instances, batch_size=500)
+                    written += len(instances)
+            except Exception:
+                logger.exception('Activity log flush failed; %d rows will be retried', len(batch) - written)
+                with self._lock:
+                    self._pending[:0] = batch[written:]
+                    self._stats['errors'] += 1
+            with self._lock:
+                self._stats['written'] += written
+                self._stats['flushes'] += 1
+            return written
+
+    def _flush_counts(self, counts: Counter) -> None:
+        from .rollups import add_rollup_counts
+
+        try:
+            add_rollup_counts(counts)
+        except Exception:
+            logger.exception('Activity rollup flush failed; %d counters will be retried', len(counts))
+            with self._lock:
+                self._counts.update(counts)
+                self._stats['errors'] += 1
+
+    def shutdown(self) -> None:
+        """
+        Stop the flusher thread and write whatever is still pending
+        """
+        self._stopped = True
+        self._wake.set()
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+            stats['pending_counters'] = len(self._counts)
+        stats['flush_size'] = self.flush_size
+        stats['flush_interval'] = self.flush_interval
+        return stats
+
+
+_sink: Optional[ActivityLogSink] = None
+_sink_lock = threading.Lock()
+
+
+def get_sink() -> ActivityLogSink:
+    """
+    Process-wide sink configured from settings
+    """
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                _sink = ActivityLogSink(
+                    flush_size=getattr(settings, 'ACTIVITY_LOG_FLUSH_SIZE', 100),
+                    flush_interval=getattr(settings, 'ACTIVITY_LOG_FLUSH_INTERVAL', 1.0),
+                    max_pending=getattr(settings, 'ACTIVITY_LOG_MAX_PENDING', 10_000),
+                )
+                atexit.register(_sink.shutdown)
+    return _sink
+
+
+def is_async_enabled() -> bool:
+    return getattr(settings, 'ACTIVITY_LOG_ASYNC', True)
+
+
+def flush_activity_logs() -> int:
+    """
+    Write pending activity rows now (management commands call this before reading logs)
+    """
+    if _sink is None:
+        return 0
+    return _sink.flush()
@@ -1,13 +1,20 @@
 from django.contrib import admin
-from .models import GeneratedText, UserLoginLog, UserActivityLog
+from .models import (
+    ActivityRollup, GeneratedText, GenerationCacheEntry, GenerationJob, HourlyBucket, UserLoginLog,
+    UserActivityLog, UserStats
+)
+from .large_admin import LargeTableAdminMixin, PartitionedLogAdminMixin, UserAutocompleteFilter
+from .search import FullTextSearchMixin
 
 
 @admin.register(GeneratedText)
-class GeneratedTextAdmin(admin.ModelAdmin):
+class GeneratedTextAdmin(LargeTableAdminMixin, FullTextSearchMixin, admin.ModelAdmin):
     list_display = ("user", "session_key", "input_text_preview", "generated_text_preview", "created_at")
-    list_filter = ("created_at", "user")
+    list_filter = ("created_at", ("user", UserAutocompleteFilter))
     search_fields = ("input_text", "generated_text", "session_key", "user__username")
+    fulltext_search_fields = ("=session_key", "^user__username")
     readonly_fields = ("created_at",)
+    keyset_field = "created_at"
     
     def input_text_preview(self, obj):
         return obj.input_text[:50] + "..." if len(obj.input_text) > 50 else obj.input_text
@@ -19,12 +26,12 @@ class GeneratedTextAdmin(admin.ModelAdmin):
 
 
 @admin.register(UserLoginLog)
-class UserLoginLogAdmin(admin.ModelAdmin):
+class UserLoginLogAdmin(PartitionedLogAdminMixin, LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ("user", "login_time", "logout_time", "ip_address", "login_successful", "session_duration")
-    list_filter = ("login_successful", "login_time", "logout_time")
+    list_filter = ("login_successful", "login_time", "logout_time", ("user", UserAutocompleteFilter))
     search_fields = ("user__username", "ip_address", "session_key")
     readonly_fields = ("login_time", "session_key")
-    ordering = ("-login_time",)
+    keyset_field = "login_time"
     
     def session_duration(self, obj):
         if obj.logout_time and obj.login_time:
@@ -37,13 +44,68 @@ class UserLoginLogAdmin(admin.ModelAdmin):
 
 
 @admin.register(UserActivityLog)
-class UserActivityLogAdmin(admin.ModelAdmin):
+class UserActivityLogAdmin(PartitionedLogAdminMixin, LargeTableAdminMixin, FullTextSearchMixin, admin.ModelAdmin):
     list_display = ("user", "action", "description_preview", "timestamp", "ip_address")
-    list_filter = ("action", "timestamp", "user")
+    list_filter = ("action", "timestamp", ("user", UserAutocompleteFilter))
     search_fields = ("user__username", "description", "ip_address", "session_key")
+    fulltext_search_fields = ("^user__username", "=ip_address", "=session_key")
     readonly_fields = ("timestamp",)
-    ordering = ("-timestamp",)
+    keyset_field = "timestamp"
     
     def description_preview(self, obj):
         return obj.description[:50] + "..." if len(obj.description) > 50 else obj.description
     description_preview.short_description = "Description"
+
+
+@admin.register(GenerationJob)
+class GenerationJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "status", "input_text_preview", "worker_id", "created_at", "finished_at")
+    list_filter = ("status", "created_at")
+    search_fields = ("session_key", "user__username")
+    readonly_fields = ("created_at", "started_at", "finished_at", "worker_id")
+    ordering = ("-created_at",)
+    
+    def input_text_preview(self, obj):
+        return obj.input_text[:50] + "..." if len(obj.input_text) > 50 else obj.input_text
+    input_text_preview.short_description = "Input Text"
+
+
+@admin.register(GenerationCacheEntry)
+class GenerationCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ("key", "input_text_preview", "num_sentences", "length", "model_version", "hit_count", "size_bytes", "last_used_at")
+    list_filter = ("model_version",)
+    search_fields = ("key",)
+    readonly_fields = ("created_at", "last_used_at", "hit_count", "size_bytes")
+    ordering = ("-last_used_at",)
+    
+    def input_text_preview(self, obj):
+        return obj.input_text[:50] + "..." if len(obj.input_text) > 50 else obj.input_text
+    input_text_preview.short_description = "Input Text"
+
+
+@admin.register(ActivityRollup)
+class ActivityRollupAdmin(admin.ModelAdmin):
+    list_display = ("hour", "action", "user", "session_key", "count")
+    list_filter = ("action", "hour")
+    search_fields = ("user__username", "session_key")
+    readonly_fields = ("action", "subject", "user", "session_key", "hour", "count")
+    date_hierarchy = "hour"
+    ordering = ("-hour",)
+
+
+@admin.register(UserStats)
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = ("user", "total_generations", "total_activities", "total_logins", "last_login_at", "updated_at")
+    search_fields = ("user__username",)
+    readonly_fields = ("user", "total_generations", "total_activities", "total_logins", "action_counts",
+                       "last_login_at", "updated_at")
+    ordering = ("-total_activities",)
+
+
+@admin.register(HourlyBucket)
+class HourlyBucketAdmin(admin.ModelAdmin):
+    list_display = ("hour", "metric", "action", "count")
+    list_filter = ("metric", "action")
+    readonly_fields = ("hour", "metric", "action", "count")
+    date_hierarchy = "hour"
+    ordering = ("-hour",)
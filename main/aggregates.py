@@ -0,0 +1,296 @@
+"""
+Hourly aggregates for summaries and dashboards
+
+HourlyBucket keeps one counter per (hour, metric, action): successful
+logins, activities by action (page visits included) and generated texts.
+HourlyUserActivity keeps one counter per (hour, user), which answers
+"distinct users" and "most active users" for any time range. Both are
+incremented by the same write hooks as UserStats, with the upsert used
+for ActivityRollup, so summaries sum a few hundred small rows instead of
+scanning the log tables.
+
+backfill() recomputes the buckets of a time range from the database one
+day at a time; run ``backfill_hourly_stats`` once for data written before
+the aggregates existed. Generated texts and rollups outlive the login and
+activity logs, whose old rows are archived or deleted by retention, so
+hours before the oldest log row still in the database are only raised to
+the recomputed counts, never lowered.
+"""
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncHour
+
+from .models import (
+    ActivityRollup, GeneratedText, HourlyBucket, HourlyUserActivity, UserActivityLog, UserLoginLog
+)
+
+logger = logging.getLogger(__name__)
+
+BucketKey = Tuple[datetime, str, str]  # (hour, metric, action)
+UserKey = Tuple[datetime, int]  # (hour, user_id)
+
+
+def _hour(moment: datetime) -> datetime:
+    return moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+# Incremental updates
+
+def add_counts(buckets: Dict[BucketKey, int], users: Dict[UserKey, int]) -> None:
+    """
+    Add counts to the hourly rows; failures are logged, never raised
+    """
+    try:
+        with transaction.atomic():
+            if buckets:
+                _add(HourlyBucket, ('hour', 'metric', 'action'), buckets)
+            if users:
+                _add(HourlyUserActivity, ('hour', 'user_id'), users)
+    except Exception:
+        # The source rows are already written; backfill_hourly_stats repairs the buckets
+        logger.exception('Hourly aggregate update failed for %d buckets', len(buckets) + len(users))
+
+
+def _add(model, columns: Tuple[str, ...], counts: Dict[tuple, int]) -> None:
+    if connection.vendor in ('sqlite', 'postgresql'):
+        table = connection.ops.quote_name(model._meta.db_table)
+        names = ', '.join(columns)
+        sql = (
+            f'INSERT INTO {table} ({names}, count) VALUES ({", ".join(["%s"] * (len(columns) + 1))}) '
+            f'ON CONFLICT ({names}) DO UPDATE SET count = {table}.count + excluded.count'
+        )
+        rows = [
+            (connection.ops.adapt_datetimefield_value(key[0]), *key[1:], count)
+            for key, count in counts.items()
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+        return
+
+    for key, count in counts.items():
+        lookup = dict(zip(columns, key))
+        if model.objects.filter(**lookup).update(count=F('count') + count):
+            continue
+        try:
+            with transaction.atomic():
+                model.objects.create(count=count, **lookup)
+        except IntegrityError:
+            # Another worker created the row first
+            model.objects.filter(**lookup).update(count=F('count') + count)
+
+
+def record_rows(model, rows: Iterable) -> None:
+    """
+    Count newly written GeneratedText, UserActivityLog or UserLoginLog rows
+    """
+    buckets: Counter = Counter()
+    users: Counter = Counter()
+    for row in rows:
+        if issubclass(model, GeneratedText):
+            buckets[(_hour(row.created_at), HourlyBucket.METRIC_GENERATION, '')] += 1
+        elif issubclass(model, UserActivityLog):
+            hour = _hour(row.timestamp)
+            buckets[(hour, HourlyBucket.METRIC_ACTIVITY, row.action)] += 1
+            if row.user_id is not None:
+                users[(hour, row.user_id)] += 1
+        elif row.login_successful:
+            buckets[(_hour(row.login_time), HourlyBucket.METRIC_LOGIN, '')] += 1
+    add_counts(buckets, users)
+
+
+def record_visits(counts: Dict[tuple, int]) -> None:
+    """
+    Count page visits added to the hourly rollups, keyed like rollups.RollupKey
+    """
+    buckets: Counter = Counter()
+    users: Counter = Counter()
+    for (action, user_id, _, hour), count in counts.items():
+        hour = _hour(hour)
+        buckets[(hour, HourlyBucket.METRIC_ACTIVITY, action)] += count
+        if user_id is not None:
+            users[(hour, user_id)] += count
+    add_counts(buckets, users)
+
+
+# Queries
+
+def _range(queryset, start: Optional[datetime], end: Optional[datetime]):
+    if start is not None:
+        queryset = queryset.filter(hour__gte=_hour(start))
+    if end is not None:
+        queryset = queryset.filter(hour__lt=end)
+    return queryset
+
+
+def totals(start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict[str, object]:
+    """
+    Logins, activities (total and by action) and generations in [start, end), by whole hours
+    """
+    result = {'logins': 0, 'activities': 0, 'generations': 0, 'activities_by_action': Counter()}
+    rows = _range(HourlyBucket.objects.all(), start, end).values_list('metric', 'action').annotate(total=Sum('count'))
+    for metric, action, total in rows:
+        if metric == HourlyBucket.METRIC_ACTIVITY:
+            result['activities'] += total
+            result['activities_by_action'][action] += total
+        elif metric == HourlyBucket.METRIC_LOGIN:
+            result['logins'] += total
+        elif metric == HourlyBucket.METRIC_GENERATION:
+            result['generations'] += total
+    return result
+
+
+def distinct_users(start: Optional[datetime] = None, end: Optional[datetime] = None) -> int:
+    return _range(HourlyUserActivity.objects.all(), start, end).values('user_id').distinct().count()
+
+
+def user_activities(start: Optional[datetime] = None, end: Optional[datetime] = None) -> int:
+    """
+    Activities of signed-in users; the rest of the activity total is anonymous
+    """
+    return _range(HourlyUserActivity.objects.all(), start, end).aggregate(total=Sum('count'))['total'] or 0
+
+
+def most_active_users(start: Optional[datetime] = None, end: Optional[datetime] = None,
+                      limit: int = 5) -> List[Tuple[str, int]]:
+    rows = (
+        _range(HourlyUserActivity.objects.all(), start, end)
+        .values_list('user__username')
+        .annotate(total=Sum('count'))
+        .order_by('-total')[:limit]
+    )
+    return list(rows)
+
+
+def series(metric: str, start: datetime, end: datetime, action: str = None) -> List[Tuple[datetime, int]]:
+    """
+    Per-hour counts of one metric, for charts
+    """
+    queryset = _range(HourlyBucket.objects.filter(metric=metric), start, end)
+    if action is not None:
+        queryset = queryset.filter(action=action)
+    return list(queryset.order_by('hour').values_list('hour').annotate(total=Sum('count')))
+
+
+# Backfill
+
+def _grouped(queryset, time_field: str, *fields: str):
+    """
+    (hour, *fields, count) rows of ``queryset`` grouped by UTC hour
+    """
+    return (
+        queryset.order_by()
+        .annotate(bucket=TruncHour(time_field, tzinfo=dt_timezone.utc))
+        .values_list('bucket', *fields)
+        .annotate(total=Count('pk'))
+    )
+
+
+def _collect(start: datetime, end: datetime):
+    buckets: Counter = Counter()
+    users: Counter = Counter()
+    for queryset in UserActivityLog.objects.across_partitions(start, end).querysets:
+        for hour, action, count in _grouped(queryset, 'timestamp', 'action'):
+            buckets[(hour, HourlyBucket.METRIC_ACTIVITY, action)] += count
+        for hour, user_id, count in _grouped(queryset.filter(user__isnull=False), 'timestamp', 'user_id'):
+            users[(hour, user_id)] += count
+    for queryset in UserLoginLog.objects.across_partitions(start, end).filter(login_successful=True).querysets:
+        for hour, count in _grouped(queryset, 'login_time'):
+            buckets[(hour, HourlyBucket.METRIC_LOGIN, '')] += count
+    texts = GeneratedText.objects.filter(created_at__gte=start, created_at__lt=end)
+    for hour, count in _grouped(texts, 'created_at'):
+        buckets[(hour, HourlyBucket.METRIC_GENERATION, '')] += count
+    visits = ActivityRollup.objects.filter(hour__gte=start, hour__lt=end).order_by()
+    for hour, action, count in visits.values_list('hour', 'action').annotate(total=Sum('count')):
+        buckets[(_hour(hour), HourlyBucket.METRIC_ACTIVITY, action)] += count
+    for hour, user_id, count in visits.filter(user__isnull=False).values_list('hour', 'user_id').annotate(total=Sum('count')):
+        users[(_hour(hour), user_id)] += count
+    return buckets, users
+
+
+def _oldest(model, time_field: str) -> Optional[datetime]:
+    candidates = [
+        queryset.order_by(time_field).values_list(time_field, flat=True).first()
+        for queryset in model.objects.across_partitions().querysets
+    ]
+    candidates = [moment for moment in candidates if moment is not None]
+    return min(candidates) if candidates else None
+
+
+def complete_logs_from() -> Optional[datetime]:
+    """
+    First hour from which no login or activity rows have been archived or deleted; None if unknown
+
+    The hour of the oldest remaining row may have lost its earlier rows, so it counts as incomplete.
+    """
+    oldest = [_oldest(UserActivityLog, 'timestamp'), _oldest(UserLoginLog, 'login_time')]
+    oldest = [moment for moment in oldest if moment is not None]
+    if not oldest:
+        return None
+    return _hour(max(oldest)) + timedelta(hours=1)
+
+
+def _keep_higher(model, key_fields: Tuple[str, ...], counts: Counter, start: datetime, end: datetime) -> None:
+    for *key, count in model.objects.filter(hour__gte=start, hour__lt=end).values_list(*key_fields, 'count'):
+        key = tuple(key)
+        counts[key] = max(counts[key], count)
+
+
+def backfill(start: datetime, end: datetime,
+             progress: Optional[Callable[[datetime, int], None]] = None) -> int:
+    """
+    Replace the buckets of [start, end) with counts recomputed from the database; returns rows written
+
+    Works one day per transaction. Hours before complete_logs_from() keep their count when it is
+    higher than the recomputed one. ``progress`` is called with (day, rows written for it).
+    """
+    start = _hour(start)
+    complete_from = complete_logs_from()
+    written = 0
+    day = start
+    while day < end:
+        day_end = min(day + timedelta(days=1), end)
+        with transaction.atomic():
+            # Write first, so the transaction holds the write lock (SQLite) or the bucket rows
+            # (PostgreSQL) while counting: live increments wait instead of being replaced
+            HourlyBucket.objects.filter(hour__gte=day, hour__lt=day_end).update(count=F('count'))
+            HourlyUserActivity.objects.filter(hour__gte=day, hour__lt=day_end).update(count=F('count'))
+            buckets, users = _collect(day, day_end)
+            incomplete_end = day_end if complete_from is None else min(day_end, complete_from)
+            if day < incomplete_end:
+                _keep_higher(HourlyBucket, ('hour', 'metric', 'action'), buckets, day, incomplete_end)
+                _keep_higher(HourlyUserActivity, ('hour', 'user_id'), users, day, incomplete_end)
+            HourlyBucket.objects.filter(hour__gte=day, hour__lt=day_end).delete()
+            HourlyUserActivity.objects.filter(hour__gte=day, hour__lt=day_end).delete()
+            HourlyBucket.objects.bulk_create([
+                HourlyBucket(hour=hour, metric=metric, action=action, count=count)
+                for (hour, metric, action), count in buckets.items()
+            ], batch_size=500)
+            HourlyUserActivity.objects.bulk_create([
+                HourlyUserActivity(hour=hour, user_id=user_id, count=count)
+                for (hour, user_id), count in users.items()
+            ], batch_size=500)
+        rows = len(buckets) + len(users)
+        written += rows
+        if progress is not None:
+            progress(day, rows)
+        day = day_end
+    return written
+
+
+def earliest_source_time() -> Optional[datetime]:
+    """
+    Oldest timestamp in the tables the buckets are computed from
+    """
+    candidates = [
+        GeneratedText.objects.order_by('created_at').values_list('created_at', flat=True).first(),
+        ActivityRollup.objects.order_by('hour').values_list('hour', flat=True).first(),
+        _oldest(UserActivityLog, 'timestamp'),
+        _oldest(UserLoginLog, 'login_time'),
+    ]
+    candidates = [moment for moment in candidates if moment is not None]
+    return min(candidates) if candidates else None
@@ -0,0 +1,240 @@
+"""
+Centering theory transition analysis for the Transition Analysis tab
+
+Wraps ``lgram.models.analyze_transitions.analyze_transitions`` and turns the
+returned DataFrame into the summary the template renders. Label
+normalization, counting and window scoring are vectorized over the frame.
+"""
+import re
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+from django.conf import settings
+
+# How much each transition contributes to local coherence
+TRANSITION_SCORES = {
+    'CONTINUE': 1.0,
+    'RETAIN': 0.75,
+    'SHIFT': 0.5,
+    'ROUGH_SHIFT': 0.25,
+    'OTHER': 0.5,
+}
+
+MAX_DISPLAYED_TRANSITIONS = 200
+
+# Columns of the analyze_transitions DataFrame, one row per sentence pair
+SENTENCE_COLUMNS = ('current_sentences', 'next_sentences')
+TRANSITION_COLUMN = 'transition'
+CENTER_COLUMN = 'next_nps'  # Noun phrases of the second sentence
+BACKWARD_COLUMN = 'current_nps'  # Noun phrases of the first sentence
+REQUIRED_COLUMNS = (*SENTENCE_COLUMNS, TRANSITION_COLUMN, CENTER_COLUMN, BACKWARD_COLUMN)
+
+
+class AnalysisTooLarge(ValueError):
+    """Raised when a text exceeds the configured analysis budget"""
+
+
+class UnexpectedTransitionFrame(ValueError):
+    """Raised when analyze_transitions returns a DataFrame without the expected columns"""
+
+
+def check_transition_columns(frame) -> None:
+    """
+    Raise UnexpectedTransitionFrame unless ``frame`` has the analyze_transitions columns used here
+
+    An empty frame (fewer than two sentences) has no columns and passes.
+    """
+    if frame.empty:
+        return
+    missing = [column for column in REQUIRED_COLUMNS if column not in frame.columns]
+    if missing:
+        raise UnexpectedTransitionFrame(
+            f'analyze_transitions returned no {", ".join(missing)} column '
+            f'(got {", ".join(map(str, frame.columns))}); is the installed lgram version supported?'
+        )
+
+
+def _format_center(value) -> str:
+    # Noun phrase columns hold lists of phrases
+    if isinstance(value, (list, tuple, set)):
+        return ', '.join(str(item) for item in value)
+    return '' if value is None else str(value)
+
+
+def normalize_transition_labels(labels):
+    """
+    Map lgram's transition labels (e.g. 'Center Continuation', 'Smooth Shift')
+    onto CONTINUE/RETAIN/SHIFT/ROUGH_SHIFT, with OTHER for the rest
+    """
+    import numpy as np
+
+    lowered = labels.astype(str).str.lower()
+    return np.select(
+        [
+            lowered.str.contains('continu'),
+            lowered.str.contains('retain'),
+            lowered.str.contains('rough'),
+            lowered.str.contains('shift'),
+        ],
+        ['CONTINUE', 'RETAIN', 'ROUGH_SHIFT', 'SHIFT'],
+        default='OTHER',
+    )
+
+
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+# Dependency labels that count as subject/object in the entity grid
+SUBJECT_DEPS = {'nsubj', 'nsubjpass', 'csubj', 'csubjpass', 'expl'}
+OBJECT_DEPS = {'dobj', 'obj', 'iobj', 'dative', 'attr', 'oprd'}
+
+_nlp = None
+_nlp_lock = threading.Lock()
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Cheap punctuation-based sentence split used to index parse artifacts
+    """
+    return [sentence.strip() for sentence in _SENTENCE_BOUNDARY.split(text.strip()) if sentence.strip()]
+
+
+def get_nlp():
+    """
+    Shared spaCy pipeline (LGRAM_SPACY_MODEL), loaded once per process
+    """
+    global _nlp
+    if _nlp is None:
+        with _nlp_lock:
+            if _nlp is None:
+                import spacy
+                _nlp = spacy.load(getattr(settings, 'LGRAM_SPACY_MODEL', 'en_core_web_sm'))
+    return _nlp
+
+
+def extract_entities(sentences: List[str]) -> List[List[Tuple[str, str, bool]]]:
+    """
+    Entities of each sentence as (lemma, role, is_pronoun), where role is
+    S (subject), O (object) or X (other), as in an entity grid
+    """
+    entities = []
+    for doc in get_nlp().pipe(sentences):
+        mentions = []
+        for chunk in doc.noun_chunks:
+            root = chunk.root
+            if root.dep_ in SUBJECT_DEPS:
+                role = 'S'
+            elif root.dep_ in OBJECT_DEPS:
+                role = 'O'
+            else:
+                role = 'X'
+            mentions.append((root.lemma_.lower(), role, root.pos_ == 'PRON'))
+        entities.append(mentions)
+    return entities
+
+
+def run_analyze_transitions(text: str):
+    """
+    Run lgram's parser-based transition analysis and return its DataFrame
+    """
+    from lgram.models.analyze_transitions import analyze_transitions
+    return analyze_transitions(text)
+
+
+def summarize_transitions(frame, sentence_window: int = 3, coherence_threshold: float = 0.5) -> Dict[str, Any]:
+    """
+    Count transition types and score coherence over sliding sentence windows
+    """
+    import numpy as np
+    import pandas as pd
+
+    sentence_window = max(1, int(sentence_window))
+    if frame is None or frame.empty:
+        return {
+            'continue_count': 0,
+            'retain_count': 0,
+            'shift_count': 0,
+            'rough_shift_count': 0,
+            'other_count': 0,
+            'transition_count': 0,
+            'coherence_score': 0.0,
+            'transitions': [],
+            'weak_windows': [],
+            'sentence_window': sentence_window,
+            'coherence_threshold': coherence_threshold,
+        }
+
+    check_transition_columns(frame)
+    types = normalize_transition_labels(frame[TRANSITION_COLUMN])
+    counts = pd.Series(types).value_counts()
+    scores = pd.Series(types).map(TRANSITION_SCORES).to_numpy(dtype=float)
+
+    # Rolling mean over each window of transitions; weak windows fall below the threshold
+    window = min(sentence_window, len(scores))
+    window_scores = np.convolve(scores, np.ones(window) / window, mode='valid')
+    weak_starts = np.flatnonzero(window_scores < coherence_threshold)
+
+    shown = min(len(frame), MAX_DISPLAYED_TRANSITIONS)
+    centers = frame[CENTER_COLUMN].iloc[:shown].map(_format_center).tolist()
+    backward = frame[BACKWARD_COLUMN].iloc[:shown].map(_format_center).tolist()
+
+    return {
+        'continue_count': int(counts.get('CONTINUE', 0)),
+        'retain_count': int(counts.get('RETAIN', 0)),
+        'shift_count': int(counts.get('SHIFT', 0)),
+        'rough_shift_count': int(counts.get('ROUGH_SHIFT', 0)),
+        'other_count': int(counts.get('OTHER', 0)),
+        'transition_count': int(len(types)),
+        'coherence_score': float(scores.mean()),
+        'transitions': [
+            {'type': kind, 'center': center, 'backward_center': back}
+            for kind, center, back in zip(types[:shown].tolist(), centers, backward)
+        ],
+        'weak_windows': [
+            {
+                'start': int(start) + 1,
+                'end': int(start) + window + 1,
+                'score': float(window_scores[start]),
+            }
+            for start in weak_starts[:MAX_DISPLAYED_TRANSITIONS]
+        ],
+        'sentence_window': sentence_window,
+        'coherence_threshold': coherence_threshold,
+    }
+
+
+def check_text_size(text: str) -> None:
+    """
+    Raise AnalysisTooLarge for texts above TRANSITION_ANALYSIS_MAX_CHARS
+    """
+    max_chars = getattr(settings, 'TRANSITION_ANALYSIS_MAX_CHARS', 100_000)
+    if len(text) > max_chars:
+        raise AnalysisTooLarge(f'Text is too long for analysis ({len(text)} characters, limit {max_chars})')
+
+
+def analyze_text(text: str, sentence_window: int = 3, coherence_threshold: float = 0.5) -> Dict[str, Any]:
+    """
+    Full transition analysis for the view, timed against TRANSITION_ANALYSIS_BUDGET_SECONDS
+    """
+    check_text_size(text)
+
+    from .parse_cache import ParseCache
+
+    started = time.perf_counter()
+    document = ParseCache.get_or_parse(text)
+    frame = document.get_transitions()
+    ParseCache.save(document)
+    parsed = time.perf_counter()
+    results = summarize_transitions(frame, sentence_window, coherence_threshold)
+    finished = time.perf_counter()
+
+    budget = getattr(settings, 'TRANSITION_ANALYSIS_BUDGET_SECONDS', 10.0)
+    results['incremental'] = document.get_transition_stats()
+    results['timings'] = {
+        'parse_seconds': parsed - started,
+        'summary_seconds': finished - parsed,
+        'total_seconds': finished - started,
+        'budget_seconds': budget,
+        'over_budget': finished - started > budget,
+    }
+    return results
@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class MainConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main'
+
+    def ready(self):
+        from django.contrib.auth.models import User
+        from django.db.models.signals import post_delete, post_migrate, pre_delete, pre_migrate
+
+        from .model_registry import warm_up_if_enabled
+        from .models import create_log_views, delete_archived_logs, delete_partitioned_logs, drop_log_views
+
+        pre_delete.connect(delete_partitioned_logs, sender=User, dispatch_uid='main.delete_partitioned_logs')
+        post_delete.connect(delete_archived_logs, sender=User, dispatch_uid='main.delete_archived_logs')
+        pre_migrate.connect(drop_log_views, sender=self, dispatch_uid='main.drop_log_views')
+        post_migrate.connect(create_log_views, sender=self, dispatch_uid='main.create_log_views')
+        warm_up_if_enabled()
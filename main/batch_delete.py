@@ -0,0 +1,83 @@
+"""
+Batched deletes for cleanup commands
+
+One unbounded ``.delete()`` makes Django's collector load every row and
+holds SQLite's write lock for the whole transaction, so live requests
+fail with "database is locked". delete_in_batches walks the matching
+rows in primary-key order, or in the order of an indexed column and then
+the primary key, and deletes CLEANUP_BATCH_SIZE of them per short
+transaction, optionally sleeping between batches. Each committed batch is
+final, so an interrupted run is resumed by running it again.
+
+Pass ``order_field`` when the rows are selected by a range on an indexed
+column (e.g. created_at__lt with Index(fields=['user', '-created_at'])):
+ordering by primary key alone would make the database sort every
+remaining matching row again for each batch.
+"""
+import time
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+
+def _after(field: str, descending: bool, value, pk) -> Q:
+    """
+    Rows past (value, pk) in (field, pk) order; the first condition bounds the index range
+    """
+    near, past = ('lte', 'lt') if descending else ('gte', 'gt')
+    return Q(**{f'{field}__{near}': value}) & (Q(**{f'{field}__{past}': value}) | Q(**{field: value, 'pk__gt': pk}))
+
+
+def delete_in_batches(queryset, batch_size: Optional[int] = None, sleep: Optional[float] = None,
+                      progress: Optional[Callable[[int, int, object], None]] = None,
+                      order_field: Optional[str] = None) -> int:
+    """
+    Delete every row of ``queryset``; returns how many rows of its model were deleted
+
+    ``order_field`` (e.g. '-created_at', in the direction of its index) walks the rows in
+    (order_field, pk) order instead of primary-key order. ``progress`` is called after each
+    batch with (deleted so far, batches, last primary key).
+    """
+    batch_size = max(1, batch_size or getattr(settings, 'CLEANUP_BATCH_SIZE', 500))
+    sleep = getattr(settings, 'CLEANUP_BATCH_SLEEP', 0.05) if sleep is None else sleep
+    model = queryset.model
+    label = model._meta.label
+
+    field = order_field.lstrip('-') if order_field else None
+    descending = bool(order_field) and order_field.startswith('-')
+
+    deleted = 0
+    batches = 0
+    last_pk = None
+    last_value = None
+    while True:
+        # Keyset pagination: never rescan the rows already handled in this run
+        if field is None:
+            page = queryset.order_by('pk')
+            if last_pk is not None:
+                page = page.filter(pk__gt=last_pk)
+            pks = list(page.values_list('pk', flat=True)[:batch_size])
+        else:
+            page = queryset.order_by(order_field, 'pk')
+            if last_pk is not None:
+                page = page.filter(_after(field, descending, last_value, last_pk))
+            rows = list(page.values_list(field, 'pk')[:batch_size])
+            pks = [pk for _, pk in rows]
+            if rows:
+                last_value = rows[-1][0]
+        if not pks:
+            break
+        with transaction.atomic():
+            _, per_model = model._base_manager.filter(pk__in=pks).delete()
+        deleted += per_model.get(label, 0)
+        batches += 1
+        last_pk = pks[-1]
+        if progress is not None:
+            progress(deleted, batches, last_pk)
+        if len(pks) < batch_size:
+            break
+        if sleep:
+            time.sleep(sleep)
+    return deleted
@@ -0,0 +1,175 @@
+"""
+Bulk export of every user's data to gzip NDJSON shards
+
+Users are split into N shards by ``user_id % N``. export_shard writes one
+``shard-XXX.ndjson.gz`` with a line per row, each tagged with its table,
+reading every table in primary-key pages (keyset pagination) so no query
+ever scans rows it already returned. Archived log rows (see log_archive)
+are included with ``"archived": true``.
+
+A shard is finished once its ``shard-XXX.json`` status file exists; it
+records row counts, byte size and SHA-256 of the data file. Re-running an
+export skips finished shards, so an interrupted run only redoes the shards
+that were in progress. The export_all_users command runs the shards in a
+process pool and writes ``manifest.json`` when all of them are done.
+"""
+import gzip
+import hashlib
+import json
+import os
+import time
+from datetime import date, datetime
+from typing import Dict, Iterator, Optional
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections
+from django.db.models.functions import Mod
+
+from .log_archive import LogArchive
+from .models import ActivityRollup, GeneratedText, GenerationJob, UserActivityLog, UserLoginLog
+
+USER_FIELDS = ('id', 'username', 'email', 'first_name', 'last_name', 'date_joined', 'last_login', 'is_active')
+
+# table name in the export, model, fields; log models are read across their partitions
+TABLES = (
+    ('generated_text', GeneratedText, ('id', 'user_id', 'session_key', 'input_text', 'generated_text',
+                                       'created_at', 'ip_address')),
+    ('generation_job', GenerationJob, ('id', 'user_id', 'input_text', 'num_sentences', 'length', 'status',
+                                       'result_text', 'created_at', 'finished_at')),
+    ('activity_log', UserActivityLog, ('id', 'user_id', 'action', 'description', 'ip_address', 'user_agent',
+                                       'session_key', 'timestamp', 'additional_data')),
+    ('login_log', UserLoginLog, ('id', 'user_id', 'ip_address', 'user_agent', 'session_key', 'login_time',
+                                 'logout_time', 'login_successful')),
+    ('activity_rollup', ActivityRollup, ('id', 'user_id', 'action', 'hour', 'count')),
+)
+
+ARCHIVED_TABLES = (('activity_log', 'activity'), ('login_log', 'login'))
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def shard_name(shard: int) -> str:
+    return f'shard-{shard:03d}'
+
+
+def _keyset_pages(queryset, fields, chunk_size: int) -> Iterator[dict]:
+    last_pk = None
+    while True:
+        page = queryset.order_by('pk')
+        if last_pk is not None:
+            page = page.filter(pk__gt=last_pk)
+        rows = list(page.values(*fields)[:chunk_size])
+        if not rows:
+            return
+        yield from rows
+        last_pk = rows[-1]['id']
+        if len(rows) < chunk_size:
+            return
+
+
+def _table_querysets(model):
+    if hasattr(model.objects, 'across_partitions'):
+        return model.objects.across_partitions().querysets
+    return [model.objects.all()]
+
+
+def _shard_rows(shard: int, shards: int, chunk_size: int) -> Iterator[tuple]:
+    """
+    (table, row) for every row belonging to the users of one shard
+    """
+    users = User.objects.annotate(bucket=Mod('id', shards)).filter(bucket=shard)
+    user_ids = []
+    for row in _keyset_pages(users, USER_FIELDS, chunk_size):
+        user_ids.append(row['id'])
+        yield 'user', row
+
+    for table, model, fields in TABLES:
+        for queryset in _table_querysets(model):
+            owned = queryset.filter(user__isnull=False).annotate(bucket=Mod('user_id', shards)).filter(bucket=shard)
+            for row in _keyset_pages(owned, fields, chunk_size):
+                yield table, row
+
+    for table, kind in ARCHIVED_TABLES:
+        archive = LogArchive(kind)
+        if not archive.segments():
+            continue
+        for user_id in user_ids:
+            for row in archive.rows(user_id):
+                row['archived'] = True
+                yield table, row
+
+
+def export_shard(output_dir: str, shard: int, shards: int, chunk_size: Optional[int] = None) -> Dict[str, object]:
+    """
+    Write one shard and its status file; returns the status
+    """
+    chunk_size = chunk_size or getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+    name = shard_name(shard)
+    data_path = os.path.join(output_dir, f'{name}.ndjson.gz')
+    temp_path = data_path + '.tmp'
+    started = time.perf_counter()
+    counts: Dict[str, int] = {}
+
+    try:
+        with gzip.open(temp_path, 'wt', encoding='utf-8') as handle:
+            for table, row in _shard_rows(shard, shards, chunk_size):
+                row['table'] = table
+                handle.write(json.dumps(row, ensure_ascii=False, default=_default, separators=(',', ':')))
+                handle.write('\n')
+                counts[table] = counts.get(table, 0) + 1
+    finally:
+        # Pool workers outlive the shard; don't leave connections open
+        connections.close_all()
+
+    digest = hashlib.sha256()
+    with open(temp_path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1 << 20), b''):
+            digest.update(block)
+    os.replace(temp_path, data_path)
+
+    elapsed = time.perf_counter() - started
+    rows = sum(counts.values())
+    status = {
+        'shard': shard,
+        'file': os.path.basename(data_path),
+        'rows': rows,
+        'counts': counts,
+        'bytes': os.path.getsize(data_path),
+        'sha256': digest.hexdigest(),
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(rows / elapsed, 1) if elapsed else None,
+    }
+    status_temp = os.path.join(output_dir, f'{name}.json.tmp')
+    with open(status_temp, 'w') as handle:
+        json.dump(status, handle, indent=2)
+    os.replace(status_temp, os.path.join(output_dir, f'{name}.json'))
+    return status
+
+
+def load_shard_status(output_dir: str, shard: int) -> Optional[Dict[str, object]]:
+    """
+    Status of a finished shard, or None if it has to be (re)exported
+    """
+    name = shard_name(shard)
+    try:
+        with open(os.path.join(output_dir, f'{name}.json')) as handle:
+            status = json.load(handle)
+    except (OSError, ValueError):
+        return None
+    data_path = os.path.join(output_dir, status.get('file', ''))
+    if not os.path.exists(data_path) or os.path.getsize(data_path) != status.get('bytes'):
+        return None
+    return status
+
+
+def worker_init():
+    """
+    Process pool initializer; spawned workers start without Django set up
+    """
+    import django
+    django.setup()
@@ -0,0 +1,100 @@
+"""
+Streaming personal data export
+
+The export used to collect every row into lists and serialize one large
+string, so memory grew with the user's history. iter_user_export reads
+each table with ``.iterator(chunk_size=EXPORT_CHUNK_SIZE)`` and yields the
+same JSON document piece by piece; gzip_stream compresses the pieces on
+the fly. Peak memory is one chunk of rows whatever the history size.
+Log rows already moved to the log archive follow the database rows of
+their section, marked ``"archived": true`` as in bulk_export.
+"""
+import itertools
+import json
+import zlib
+from datetime import date, datetime
+from typing import Iterable, Iterator
+
+from django.conf import settings
+from django.utils import timezone
+
+from .log_archive import LogArchive
+from .models import GeneratedText, UserActivityLog, UserLoginLog
+
+SECTIONS = (
+    ('generated_texts', ('input_text', 'generated_text', 'created_at')),
+    ('activities', ('action', 'description', 'timestamp', 'ip_address')),
+    ('login_history', ('login_time', 'logout_time', 'ip_address', 'login_successful')),
+)
+
+# Section -> log archive kind
+ARCHIVED_SECTIONS = {'activities': 'activity', 'login_history': 'login'}
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _dumps(value, level: int) -> str:
+    text = json.dumps(value, indent=2, ensure_ascii=False, default=_default)
+    return text.replace('\n', '\n' + '  ' * level)
+
+
+def _section_rows(user, section: str, fields, chunk_size: int) -> Iterator[dict]:
+    if section == 'generated_texts':
+        return GeneratedText.objects.filter(user=user).values(*fields).iterator(chunk_size=chunk_size)
+    model = UserActivityLog if section == 'activities' else UserLoginLog
+    rows = model.objects.across_partitions().filter(user=user).values(*fields, chunk_size=chunk_size)
+    return itertools.chain(rows, _archived_rows(user, section, fields))
+
+
+def _archived_rows(user, section: str, fields) -> Iterator[dict]:
+    for row in LogArchive(ARCHIVED_SECTIONS[section]).rows(user.pk):
+        archived = {field: row.get(field) for field in fields}
+        archived['archived'] = True
+        yield archived
+
+
+def iter_user_export(user, chunk_size: int = None) -> Iterator[str]:
+    """
+    The user's export document as JSON text fragments
+    """
+    chunk_size = chunk_size or getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+    user_info = {
+        'username': user.username,
+        'email': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'date_joined': user.date_joined.isoformat(),
+        'last_login': user.last_login.isoformat() if user.last_login else None,
+    }
+    export_date = timezone.now().isoformat()
+
+    yield '{\n  "user_info": ' + _dumps(user_info, 1)
+    for section, fields in SECTIONS:
+        yield f',\n  "{section}": ['
+        separator = '\n    '
+        buffer = []
+        for row in _section_rows(user, section, fields, chunk_size):
+            buffer.append(separator + _dumps(row, 2))
+            separator = ',\n    '
+            if len(buffer) >= chunk_size:
+                yield ''.join(buffer)
+                buffer = []
+        buffer.append('\n  ]' if separator != '\n    ' else ']')
+        yield ''.join(buffer)
+    yield f',\n  "export_date": {json.dumps(export_date)}\n}}'
+
+
+def gzip_stream(chunks: Iterable[str], level: int = 6) -> Iterator[bytes]:
+    """
+    Gzip-compress a stream of text fragments as they are produced
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
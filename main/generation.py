@@ -0,0 +1,47 @@
+"""
+Text generation pipeline shared by the web views and the job worker
+"""
+from .grammar_batcher import correct_grammar
+from .model_registry import ModelRegistry
+
+
+def parse_input_words(text: str) -> list:
+    """
+    Split a seed sentence into the word list the model expects
+    """
+    return text.strip().rstrip('.').split()
+
+
+def generate_corrected_text(text: str, num_sentences: int, length: int) -> str:
+    """
+    Generate text from a seed sentence and run it through the grammar corrector
+    """
+    model = ModelRegistry.get_model()
+    generated_text = model.generate_text(
+        num_sentences=num_sentences,
+        input_words=parse_input_words(text),
+        length=length,
+        use_progress_bar=True
+    )
+    return correct_grammar(generated_text)
+
+
+def iter_corrected_sentences(text: str, num_sentences: int, length: int):
+    """
+    Yield grammar-corrected sentences one at a time as the model produces them
+
+    Each sentence is seeded with the words of the previous one so the
+    stream continues the same discourse as a single generate_text() call.
+    """
+    model = ModelRegistry.get_model()
+    input_words = parse_input_words(text)
+    for _ in range(num_sentences):
+        sentence = model.generate_text(
+            num_sentences=1,
+            input_words=input_words,
+            length=length,
+            use_progress_bar=False
+        )
+        corrected = correct_grammar(sentence)
+        yield corrected
+        input_words = parse_input_words(corrected) or input_words
@@ -0,0 +1,182 @@
+"""
+Content-addressed cache for generated texts
+
+Entries are keyed on the normalized seed words, the generation settings and
+the model version. Lookups go through a per-process LRU first and then the
+GenerationCacheEntry table; both tiers are bounded by size. The cache is
+opt-in through the GENERATION_CACHE_ENABLED setting.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .generation import parse_input_words
+from .model_registry import ModelRegistry
+from .models import GenerationCacheEntry
+
+
+class GenerationCache:
+    """
+    Two-tier (memory + database) cache of generation results
+    """
+
+    _lock = threading.Lock()
+    _memory: 'OrderedDict[str, str]' = OrderedDict()
+    _memory_bytes = 0
+    _counters = {'memory_hits': 0, 'db_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    @staticmethod
+    def is_enabled() -> bool:
+        return getattr(settings, 'GENERATION_CACHE_ENABLED', False)
+
+    @staticmethod
+    def make_key(text: str, num_sentences: int, length: int) -> str:
+        """
+        Hash of the normalized request; identical prompts map to the same key
+        """
+        payload = json.dumps({
+            'input_words': parse_input_words(text),
+            'num_sentences': int(num_sentences),
+            'length': int(length),
+            'model_version': ModelRegistry.get_model_version(),
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def get(cls, text: str, num_sentences: int, length: int) -> Optional[str]:
+        """
+        Return a cached result, or None on a miss or when the cache is disabled
+        """
+        if not cls.is_enabled():
+            return None
+        key = cls.make_key(text, num_sentences, length)
+
+        with cls._lock:
+            result = cls._memory.get(key)
+            if result is not None:
+                cls._memory.move_to_end(key)
+                cls._counters['memory_hits'] += 1
+                return result
+
+        entry = GenerationCacheEntry.objects.filter(key=key).only('result_text').first()
+        if entry is None:
+            with cls._lock:
+                cls._counters['misses'] += 1
+            return None
+
+        GenerationCacheEntry.objects.filter(key=key).update(
+            hit_count=F('hit_count') + 1,
+            last_used_at=timezone.now()
+        )
+        with cls._lock:
+            cls._counters['db_hits'] += 1
+            cls._remember(key, entry.result_text)
+        return entry.result_text
+
+    @classmethod
+    def set(cls, text: str, num_sentences: int, length: int, result: str) -> None:
+        """
+        Store a result in both tiers
+        """
+        if not cls.is_enabled():
+            return
+        key = cls.make_key(text, num_sentences, length)
+        with cls._lock:
+            cls._counters['stores'] += 1
+            cls._remember(key, result)
+
+        size = len(result.encode('utf-8'))
+        try:
+            GenerationCacheEntry.objects.update_or_create(
+                key=key,
+                defaults={
+                    'input_text': text,
+                    'num_sentences': num_sentences,
+                    'length': length,
+                    'model_version': ModelRegistry.get_model_version(),
+                    'result_text': result,
+                    'size_bytes': size,
+                    'last_used_at': timezone.now(),
+                }
+            )
+        except IntegrityError:
+            # A concurrent worker stored the same key first
+            pass
+        cls.evict_db()
+
+    @classmethod
+    def _remember(cls, key: str, result: str) -> None:
+        """
+        Insert into the memory tier and evict least recently used entries;
+        caller must hold the lock
+        """
+        max_entries = getattr(settings, 'GENERATION_CACHE_MEMORY_ENTRIES', 256)
+        max_bytes = getattr(settings, 'GENERATION_CACHE_MEMORY_BYTES', 4 * 1024 * 1024)
+
+        previous = cls._memory.pop(key, None)
+        if previous is not None:
+            cls._memory_bytes -= len(previous)
+        cls._memory[key] = result
+        cls._memory_bytes += len(result)
+
+        while cls._memory and (len(cls._memory) > max_entries or cls._memory_bytes > max_bytes):
+            _, evicted = cls._memory.popitem(last=False)
+            cls._memory_bytes -= len(evicted)
+            cls._counters['evictions'] += 1
+
+    @classmethod
+    def evict_db(cls) -> int:
+        """
+        Delete least recently used rows until the table fits GENERATION_CACHE_DB_BYTES
+        """
+        max_bytes = getattr(settings, 'GENERATION_CACHE_DB_BYTES', 50 * 1024 * 1024)
+        total = GenerationCacheEntry.objects.aggregate(total=Sum('size_bytes'))['total'] or 0
+        if total <= max_bytes:
+            return 0
+
+        to_delete = []
+        for pk, size in GenerationCacheEntry.objects.order_by('last_used_at').values_list('pk', 'size_bytes').iterator():
+            if total <= max_bytes:
+                break
+            to_delete.append(pk)
+            total -= size
+        GenerationCacheEntry.objects.filter(pk__in=to_delete).delete()
+        with cls._lock:
+            cls._counters['evictions'] += len(to_delete)
+        return len(to_delete)
+
+    @classmethod
+    def clear(cls) -> int:
+        with cls._lock:
+            cls._memory.clear()
+            cls._memory_bytes = 0
+        deleted, _ = GenerationCacheEntry.objects.all().delete()
+        return deleted
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Any]:
+        """
+        Hit/miss counters for this process plus the size of both tiers
+        """
+        with cls._lock:
+            stats = dict(cls._counters)
+            stats['memory_entries'] = len(cls._memory)
+            stats['memory_bytes'] = cls._memory_bytes
+        lookups = stats['memory_hits'] + stats['db_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['db_hits']) / lookups if lookups else None
+        totals = GenerationCacheEntry.objects.aggregate(
+            total_bytes=Sum('size_bytes'),
+            total_hits=Sum('hit_count')
+        )
+        stats['db_entries'] = GenerationCacheEntry.objects.count()
+        stats['db_bytes'] = totals['total_bytes'] or 0
+        stats['db_total_hits'] = totals['total_hits'] or 0
+        stats['enabled'] = cls.is_enabled()
+        return stats
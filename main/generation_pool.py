@@ -0,0 +1,119 @@
+"""
+Bounded process pool for parallel text generation
+
+Each pool process loads the language model once in its initializer and
+keeps it warm for every prompt it is given. This module must not import
+Django models: with the spawn start method the children import it
+without an initialized app registry.
+"""
+import atexit
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+from .generation import parse_input_words
+from .model_registry import ModelRegistry
+
+logger = logging.getLogger(__name__)
+
+
+def _init_worker() -> None:
+    ModelRegistry.warm_up(background=False)
+
+
+def _generate_one(prompt: Dict) -> Dict:
+    """
+    Runs inside a pool process; failures are returned rather than raised so
+    one bad prompt does not abort the rest of the batch
+    """
+    model = ModelRegistry.get_model()
+    try:
+        generated_text = model.generate_text(
+            num_sentences=prompt['num_sentences'],
+            input_words=parse_input_words(prompt['input_text']),
+            length=prompt['length'],
+            use_progress_bar=False
+        )
+        return {'generated_text': model.correct_grammar_t5(generated_text), 'error': None}
+    except Exception as e:
+        return {'generated_text': None, 'error': str(e)}
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """
+    Process-wide pool sized by GENERATION_POOL_SIZE
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                context = multiprocessing.get_context(
+                    getattr(settings, 'GENERATION_POOL_START_METHOD', 'spawn')
+                )
+                _pool = ProcessPoolExecutor(
+                    max_workers=getattr(settings, 'GENERATION_POOL_SIZE', 2),
+                    mp_context=context,
+                    initializer=_init_worker,
+                )
+                atexit.register(shutdown_pool)
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    """
+    Drop a broken pool so the next call starts a new one
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def generate_many(prompts: List[Dict]) -> List[Dict]:
+    """
+    Generate every prompt on the pool and return the results in input order
+
+    If a pool process dies (or the model fails to load in one), the prompts
+    it left unfinished get an error and the pool is replaced on the next call.
+    """
+    if not prompts:
+        return []
+    pool = get_pool()
+    try:
+        futures = [pool.submit(_generate_one, prompt) for prompt in prompts]
+    except RuntimeError as e:
+        # BrokenProcessPool, or shut down by another thread
+        logger.error('Generation pool unusable, replacing it: %s', e)
+        _discard_pool(pool)
+        return [{'generated_text': None, 'error': f'Generation worker failed: {e}'} for _ in prompts]
+
+    results = []
+    broken = None
+    for future in futures:
+        try:
+            results.append(future.result())
+        except BrokenProcessPool as e:
+            broken = e
+            results.append({'generated_text': None, 'error': f'Generation worker failed: {e}'})
+    if broken is not None:
+        logger.error('Generation pool broke, replacing it: %s', broken)
+        _discard_pool(pool)
+    return results
@@ -0,0 +1,262 @@
+"""
+Dynamic micro-batching in front of the T5 grammar corrector
+
+Concurrent requests hand their text to a single dispatcher thread, which
+waits up to GRAMMAR_BATCH_WAIT_MS for more work (or until
+GRAMMAR_BATCH_MAX_SIZE texts are pending), runs them through the T5 model
+as one padded generate() call and wakes each caller with its own result.
+
+Batching needs the corrector's Hugging Face tokenizer and model, read from
+the lgram model attributes named by GRAMMAR_T5_TOKENIZER_ATTR and
+GRAMMAR_T5_MODEL_ATTR; GRAMMAR_T5_PREFIX must match the task prefix
+correct_grammar_t5 uses. Once per loaded model the batched path is checked
+against correct_grammar_t5 on PROBE_TEXTS; if the attributes are missing or
+the outputs differ a warning is logged and, as with GRAMMAR_BATCHING_ENABLED
+off (the default), every call goes straight to correct_grammar_t5.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .model_registry import ModelRegistry
+
+logger = logging.getLogger(__name__)
+
+# Texts the batched path must correct exactly like correct_grammar_t5 before it is used
+PROBE_TEXTS = [
+    'the student have finish his assignment before the professor arrive to class.',
+    'She dont like going to school on monday',
+    'This sentence is already correct.',
+]
+
+
+def _t5_parts(model):
+    """
+    (tokenizer, seq2seq model) of the grammar corrector, or None if the model does not expose them
+    """
+    tokenizer = getattr(model, getattr(settings, 'GRAMMAR_T5_TOKENIZER_ATTR', 't5_tokenizer'), None)
+    t5_model = getattr(model, getattr(settings, 'GRAMMAR_T5_MODEL_ATTR', 't5_model'), None)
+    if tokenizer is None or not hasattr(t5_model, 'generate'):
+        return None
+    return tokenizer, t5_model
+
+
+def _check_batching(model) -> bool:
+    """
+    Whether the batched path reproduces correct_grammar_t5 on this model; logs why not
+    """
+    if _t5_parts(model) is None:
+        logger.warning(
+            'Grammar batching disabled: the language model has no %r tokenizer and %r model attributes '
+            '(GRAMMAR_T5_TOKENIZER_ATTR, GRAMMAR_T5_MODEL_ATTR)',
+            getattr(settings, 'GRAMMAR_T5_TOKENIZER_ATTR', 't5_tokenizer'),
+            getattr(settings, 'GRAMMAR_T5_MODEL_ATTR', 't5_model'),
+        )
+        return False
+    try:
+        batched = _correct_batch(model, PROBE_TEXTS)
+    except Exception:
+        logger.warning('Grammar batching disabled: the batched T5 call failed', exc_info=True)
+        return False
+    direct = [model.correct_grammar_t5(text) for text in PROBE_TEXTS]
+    if batched != direct:
+        logger.warning(
+            'Grammar batching disabled: batched output %r differs from correct_grammar_t5 output %r '
+            '(check GRAMMAR_T5_PREFIX and GRAMMAR_T5_MAX_LENGTH)', batched, direct
+        )
+        return False
+    return True
+
+
+_support: Optional[Tuple[Any, bool]] = None
+_support_lock = threading.Lock()
+
+
+def supports_batching() -> bool:
+    """
+    Whether batching may stand in for correct_grammar_t5, checked once per loaded model
+    """
+    global _support
+    model = ModelRegistry.get_model()
+    support = _support
+    if support is not None and support[0] is model:
+        return support[1]
+    with _support_lock:
+        if _support is None or _support[0] is not model:
+            _support = (model, _check_batching(model))
+        return _support[1]
+
+
+def correct_batch_with_model(texts: List[str]) -> List[str]:
+    """
+    Correct a batch of texts with one padded generate() call of the shared T5 model
+    """
+    return _correct_batch(ModelRegistry.get_model(), texts)
+
+
+def _correct_batch(model, texts: List[str]) -> List[str]:
+    parts = _t5_parts(model)
+    if parts is None:
+        raise RuntimeError('The language model does not expose its T5 tokenizer and model '
+                           '(see GRAMMAR_T5_TOKENIZER_ATTR and GRAMMAR_T5_MODEL_ATTR)')
+    import torch
+
+    tokenizer, t5_model = parts
+    prefix = getattr(settings, 'GRAMMAR_T5_PREFIX', '')
+    max_length = getattr(settings, 'GRAMMAR_T5_MAX_LENGTH', 256)
+    inputs = tokenizer(
+        [prefix + text for text in texts],
+        padding=True,
+        truncation=True,
+        max_length=max_length,
+        return_tensors='pt',
+    ).to(t5_model.device)
+    with torch.no_grad():
+        outputs = t5_model.generate(**inputs, max_length=max_length)
+    return [text.strip() for text in tokenizer.batch_decode(outputs, skip_special_tokens=True)]
+
+
+class _PendingCorrection:
+    __slots__ = ('text', 'result', 'error', 'done', 'abandoned')
+
+    def __init__(self, text: str):
+        self.text = text
+        self.result: Optional[str] = None
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+        self.abandoned = False
+
+
+class GrammarBatcher:
+    """
+    Collects grammar correction requests from many threads into batches
+    """
+
+    def __init__(self, correct_batch: Callable[[List[str]], List[str]],
+                 max_batch_size: int = 16, max_wait_ms: float = 10, timeout: float = 60):
+        self.correct_batch = correct_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.timeout = timeout
+        self._queue: 'queue.Queue[_PendingCorrection]' = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._stats = {'batches': 0, 'items': 0, 'largest_batch': 0, 'errors': 0, 'retried': 0, 'timeouts': 0}
+
+    def correct(self, text: str) -> str:
+        """
+        Submit a text and block until its batch has been corrected
+        """
+        self._ensure_dispatcher()
+        item = _PendingCorrection(text)
+        self._queue.put(item)
+        if not item.done.wait(self.timeout):
+            # Skipped by the dispatcher if it has not reached the item yet
+            item.abandoned = True
+            self._stats['timeouts'] += 1
+            raise TimeoutError(f'Grammar correction did not finish within {self.timeout}s')
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def _ensure_dispatcher(self) -> None:
+        # Threads do not survive fork(), so restart the dispatcher in child workers
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._dispatch_forever, name='grammar-batcher', daemon=True)
+            self._thread.start()
+
+    def _dispatch_forever(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: List[_PendingCorrection]) -> None:
+        batch = [item for item in batch if not item.abandoned]
+        if not batch:
+            return
+        try:
+            self._correct_items(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                self._stats['errors'] += 1
+                batch[0].error = e
+            else:
+                # One bad text must not fail everyone in its batch: retry each on its own
+                self._stats['retried'] += 1
+                for item in batch:
+                    try:
+                        self._correct_items([item])
+                    except Exception as item_error:
+                        self._stats['errors'] += 1
+                        item.error = item_error
+        finally:
+            self._stats['batches'] += 1
+            self._stats['items'] += len(batch)
+            self._stats['largest_batch'] = max(self._stats['largest_batch'], len(batch))
+            for item in batch:
+                item.done.set()
+
+    def _correct_items(self, items: List[_PendingCorrection]) -> None:
+        results = self.correct_batch([item.text for item in items])
+        if len(results) != len(items):
+            raise ValueError(f'Grammar corrector returned {len(results)} results for {len(items)} texts')
+        for item, result in zip(items, results):
+            item.result = result
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats['average_batch'] = stats['items'] / stats['batches'] if stats['batches'] else None
+        stats['max_batch_size'] = self.max_batch_size
+        stats['max_wait_ms'] = self.max_wait * 1000
+        stats['timeout'] = self.timeout
+        return stats
+
+
+_batcher: Optional[GrammarBatcher] = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher() -> GrammarBatcher:
+    """
+    Process-wide batcher configured from settings
+    """
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = GrammarBatcher(
+                    correct_batch_with_model,
+                    max_batch_size=getattr(settings, 'GRAMMAR_BATCH_MAX_SIZE', 16),
+                    max_wait_ms=getattr(settings, 'GRAMMAR_BATCH_WAIT_MS', 10),
+                    timeout=getattr(settings, 'GRAMMAR_BATCH_TIMEOUT_SECONDS', 60),
+                )
+    return _batcher
+
+
+def correct_grammar(text: str) -> str:
+    """
+    Grammar-correct one text, batching it with other in-flight requests when enabled
+    """
+    if getattr(settings, 'GRAMMAR_BATCHING_ENABLED', False) and supports_batching():
+        return get_batcher().correct(text)
+    return ModelRegistry.get_model().correct_grammar_t5(text)
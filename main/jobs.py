@@ -0,0 +1,210 @@
+"""
+Database-backed generation job queue for Lgram Web
+
+Jobs live in the GenerationJob table. Web requests only enqueue; workers
+started with ``manage.py run_generation_worker`` claim queued jobs with a
+conditional UPDATE, so any number of workers can share the SQLite file
+without an external broker.
+
+Jobs queued for the streaming view are reserved (worker_id ``stream``): the
+view claims and runs them itself so it can send each sentence as it is
+produced. Workers leave them alone for GENERATION_STREAM_CLAIM_SECONDS, then
+run them like any other job if no stream picked them up. A stream whose
+client disconnects puts its job back on the queue for the workers.
+"""
+import logging
+import os
+import socket
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .generation import generate_corrected_text
+from .generation_cache import GenerationCache
+from .models import GeneratedText, GenerationJob
+from .utils import get_client_ip, get_user_agent, log_text_generation
+
+logger = logging.getLogger(__name__)
+
+STREAM_RESERVED = 'stream'
+
+
+def enqueue_generation(request, session_key: str, text: str, num_sentences: int, length: int,
+                       use_cache: bool = True, stream: bool = False) -> GenerationJob:
+    """
+    Queue a generation request and return the job
+
+    On a cache hit the job is completed immediately and never reaches a worker.
+    ``stream`` reserves the job for the streaming view (see the module docstring).
+    """
+    job = GenerationJob(
+        user=request.user if request.user.is_authenticated else None,
+        session_key=session_key,
+        input_text=text,
+        num_sentences=num_sentences,
+        length=length,
+        ip_address=get_client_ip(request),
+        user_agent=get_user_agent(request),
+        worker_id=STREAM_RESERVED if stream else '',
+    )
+    cached_text = GenerationCache.get(text, num_sentences, length) if use_cache else None
+    if cached_text is None:
+        job.save()
+        return job
+
+    job.started_at = job.finished_at = timezone.now()
+    _complete_job(job, cached_text, cache_hit=True)
+    return job
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_job(job_id: int, worker_id: str) -> bool:
+    """
+    Move one queued job to running; only one worker (or stream) can win
+    """
+    return bool(GenerationJob.objects.filter(
+        id=job_id,
+        status=GenerationJob.STATUS_QUEUED
+    ).update(
+        status=GenerationJob.STATUS_RUNNING,
+        worker_id=worker_id,
+        started_at=timezone.now()
+    ))
+
+
+def claim_next_job(worker_id: str) -> Optional[GenerationJob]:
+    """
+    Atomically move the oldest queued job to running and return it
+    """
+    grace = getattr(settings, 'GENERATION_STREAM_CLAIM_SECONDS', 30)
+    stream_cutoff = timezone.now() - timedelta(seconds=grace)
+    while True:
+        job_id = GenerationJob.objects.filter(
+            status=GenerationJob.STATUS_QUEUED
+        ).exclude(
+            # Give the streaming view time to connect and claim its own job
+            worker_id=STREAM_RESERVED, created_at__gte=stream_cutoff
+        ).order_by('created_at', 'id').values_list('id', flat=True).first()
+        if job_id is None:
+            return None
+        if claim_job(job_id, worker_id):
+            return GenerationJob.objects.select_related('user').get(id=job_id)
+
+
+def fail_job(job: GenerationJob, error: str) -> None:
+    """
+    Record a job as failed, in its own transaction
+
+    Also used after a failed result write, so only the status columns are
+    written and a rolled-back GeneratedText is never referenced.
+    """
+    job.status = GenerationJob.STATUS_FAILED
+    job.error = error
+    job.finished_at = timezone.now()
+    job.generated_text = None
+    with transaction.atomic():
+        GenerationJob.objects.filter(id=job.id).update(
+            status=job.status, error=error, finished_at=job.finished_at, generated_text=None
+        )
+
+
+def finish_job(job: GenerationJob, corrected_text: str) -> None:
+    """
+    Cache and save the result of a job that ran to completion
+    """
+    GenerationCache.set(job.input_text, job.num_sentences, job.length, corrected_text)
+    job.finished_at = timezone.now()
+    _complete_job(job, corrected_text)
+
+
+def run_job(job: GenerationJob) -> GenerationJob:
+    """
+    Run a claimed job and record its result or error
+    """
+    try:
+        corrected_text = generate_corrected_text(job.input_text, job.num_sentences, job.length)
+    except Exception as e:
+        fail_job(job, str(e))
+        return job
+
+    try:
+        finish_job(job, corrected_text)
+    except Exception as e:
+        # The result write rolled back; without this the job would stay running and the page poll forever
+        logger.exception('Saving the result of generation job %s failed', job.id)
+        fail_job(job, f'Could not save the result: {e}')
+    return job
+
+
+def _complete_job(job: GenerationJob, corrected_text: str, cache_hit: bool = False) -> None:
+    """
+    Mark a job done and save its GeneratedText row and activity log
+    """
+    with transaction.atomic():
+        job.generated_text = GeneratedText.objects.create(
+            user=job.user,
+            session_key=job.session_key,
+            input_text=job.input_text,
+            generated_text=corrected_text,
+            ip_address=job.ip_address
+        )
+        job.status = GenerationJob.STATUS_DONE
+        job.result_text = corrected_text
+        job.save()
+
+        log_text_generation(
+            user=job.user,
+            session_key=job.session_key,
+            input_text=job.input_text,
+            generated_text=corrected_text,
+            ip_address=job.ip_address,
+            user_agent=job.user_agent,
+            cache_hit=cache_hit
+        )
+
+
+def release_job(job: GenerationJob) -> bool:
+    """
+    Put a job this process claimed but stopped running (stream client disconnected) back on the queue
+    """
+    return bool(GenerationJob.objects.filter(
+        id=job.id,
+        status=GenerationJob.STATUS_RUNNING,
+        worker_id=job.worker_id
+    ).update(status=GenerationJob.STATUS_QUEUED, worker_id='', started_at=None))
+
+
+def requeue_stale_jobs(older_than_seconds: int) -> int:
+    """
+    Put running jobs whose worker vanished back on the queue
+    """
+    cutoff = timezone.now() - timedelta(seconds=older_than_seconds)
+    return GenerationJob.objects.filter(
+        status=GenerationJob.STATUS_RUNNING,
+        started_at__lt=cutoff
+    ).update(status=GenerationJob.STATUS_QUEUED, worker_id='', started_at=None)
+
+
+def job_to_dict(job: GenerationJob) -> dict:
+    """
+    JSON-serializable view of a job for the polling endpoint
+    """
+    return {
+        'id': job.id,
+        'status': job.status,
+        'finished': job.is_finished,
+        'input_text': job.input_text,
+        'num_sentences': job.num_sentences,
+        'length': job.length,
+        'result': job.result_text if job.status == GenerationJob.STATUS_DONE else None,
+        'error': job.error or None,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
@@ -0,0 +1,247 @@
+"""
+Admin changelists that stay fast on very large log tables
+
+LargeTableAdminMixin replaces the parts of the stock changelist whose cost
+grows with the table:
+
+* related users are joined in the page query (list_select_related);
+* the paginator counts at most ADMIN_COUNT_CAP rows (on PostgreSQL an
+  unfiltered changelist uses the planner's row estimate instead), and the
+  second, unfiltered COUNT(*) is switched off;
+* pages are navigated by keyset ("newer" / "older" links carrying the
+  last row's time and id) instead of OFFSET, so page 10,000 costs the
+  same as page 1; full-text searches (search.FullTextSearchMixin) are
+  paged the same way by rank, best match first;
+* UserAutocompleteFilter picks a user through the admin autocomplete
+  endpoint instead of listing every user in the sidebar.
+
+PartitionedLogAdminMixin lists, counts and searches partitioned log models
+through their combined view, so rows in monthly partitions are shown too;
+a row is opened and deleted in the table its id belongs to.
+"""
+from datetime import datetime
+from typing import Optional, Tuple
+
+from django import forms
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+AFTER_VAR = 'after'
+BEFORE_VAR = 'before'
+
+
+def _count_cap() -> int:
+    return getattr(settings, 'ADMIN_COUNT_CAP', 10_000)
+
+
+class CappedCountPaginator(Paginator):
+    """
+    Counts at most ADMIN_COUNT_CAP rows; ``capped`` tells that the count is a lower bound or an estimate
+    """
+
+    capped = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        cap = _count_cap()
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                               [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] > cap:
+                self.capped = True
+                return row[0]
+        count = queryset.order_by()[:cap + 1].count()
+        self.capped = count > cap
+        return min(count, cap)
+
+
+RANK_FIELD = 'search_rank'
+
+
+def _encode_cursor(value, pk: int) -> str:
+    return f'{value.isoformat() if isinstance(value, datetime) else repr(value)}_{pk}'
+
+
+def _decode_cursor(value: Optional[str], parse=datetime.fromisoformat) -> Optional[Tuple[object, int]]:
+    if not value:
+        return None
+    try:
+        key, pk = value.rsplit('_', 1)
+        return parse(key), int(pk)
+    except ValueError:
+        raise IncorrectLookupParameters(f'Invalid cursor {value!r}')
+
+
+class KeysetChangeList(ChangeList):
+    """
+    ChangeList paged by (keyset_field, pk) cursors instead of page numbers
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        # Decoded in get_results, once it is known whether results are ranked
+        self.after = request.GET.get(AFTER_VAR)
+        self.before = request.GET.get(BEFORE_VAR)
+        super().__init__(request, *args, **kwargs)
+        for var in (AFTER_VAR, BEFORE_VAR):
+            self.params.pop(var, None)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        for var in (AFTER_VAR, BEFORE_VAR):
+            lookup_params.pop(var, None)
+        return lookup_params
+
+    def get_results(self, request):
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_count = paginator.count
+        self.count_capped = paginator.capped
+        self.paginator = paginator
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = self.result_count > self.list_per_page
+
+        self.ranked = RANK_FIELD in self.queryset.query.annotations
+        if self.ranked:
+            # Best (lowest bm25) first
+            field, descending, parse = RANK_FIELD, False, float
+        else:
+            field, descending, parse = self.model_admin.keyset_field, True, datetime.fromisoformat
+        self.after = _decode_cursor(self.after, parse)
+        self.before = _decode_cursor(self.before, parse)
+        forward = (f'-{field}', '-pk') if descending else (field, 'pk')
+        backward = (field, 'pk') if descending else (f'-{field}', '-pk')
+        past, behind = ('lt', 'gt') if descending else ('gt', 'lt')
+
+        per_page = self.list_per_page
+        if self.before is not None:
+            value, pk = self.before
+            previous = self.queryset.filter(
+                Q(**{f'{field}__{behind}': value}) | Q(**{field: value, f'pk__{behind}': pk})
+            )
+            rows = list(previous.order_by(*backward)[:per_page + 1])
+            self.has_newer = len(rows) > per_page
+            self.has_older = True
+            rows = rows[:per_page][::-1]
+        else:
+            following = self.queryset.order_by(*forward)
+            if self.after is not None:
+                value, pk = self.after
+                following = following.filter(
+                    Q(**{f'{field}__{past}': value}) | Q(**{field: value, f'pk__{past}': pk})
+                )
+            rows = list(following[:per_page + 1])
+            self.has_older = len(rows) > per_page
+            self.has_newer = self.after is not None
+            rows = rows[:per_page]
+        self.result_list = rows
+
+        self.newest_url = self.get_query_string(remove=[AFTER_VAR, BEFORE_VAR])
+        self.newer_url = self.older_url = None
+        if rows and self.has_newer:
+            first = rows[0]
+            self.newer_url = self.get_query_string(
+                {BEFORE_VAR: _encode_cursor(getattr(first, field), first.pk)}, remove=[AFTER_VAR]
+            )
+        if rows and self.has_older:
+            last = rows[-1]
+            self.older_url = self.get_query_string(
+                {AFTER_VAR: _encode_cursor(getattr(last, field), last.pk)}, remove=[BEFORE_VAR]
+            )
+
+
+class UserAutocompleteFilter(admin.FieldListFilter):
+    """
+    User filter backed by the admin autocomplete view; only the selected user is loaded
+    """
+
+    template = 'admin/main/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f'{field_path}__{field.target_field.name}__exact'
+        value = params.get(self.lookup_kwarg)
+        self.lookup_val = value[-1] if isinstance(value, list) else value
+        super().__init__(field, request, params, model, model_admin, field_path)
+        form = forms.Form()
+        form.fields[self.lookup_kwarg] = forms.ModelChoiceField(
+            queryset=field.remote_field.model._default_manager.all(),
+            widget=AutocompleteSelect(field, model_admin.admin_site, attrs={'style': 'width: 100%'}),
+            required=False,
+            initial=self.lookup_val,
+        )
+        self.bound_field = form[self.lookup_kwarg]
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def choices(self, changelist):
+        self.base_query_string = changelist.get_query_string(remove=[self.lookup_kwarg, AFTER_VAR, BEFORE_VAR])
+        yield {
+            'selected': self.lookup_val is None,
+            'query_string': self.base_query_string,
+            'display': 'All',
+        }
+
+
+class LargeTableAdminMixin:
+    """
+    ModelAdmin mixin for log tables; set ``keyset_field`` to the indexed time column
+    """
+
+    keyset_field = None
+    paginator = CappedCountPaginator
+    show_full_result_count = False
+    list_select_related = ('user',)
+    sortable_by = ()
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_ordering(self, request):
+        return (f'-{self.keyset_field}', '-pk')
+
+    @property
+    def media(self):
+        user_field = self.model._meta.get_field('user')
+        return super().media + AutocompleteSelect(user_field, self.admin_site).media
+
+
+class PartitionedLogAdminMixin:
+    """
+    ModelAdmin mixin for log models with monthly partitions (PartitionedLogManager)
+    """
+
+    def get_queryset(self, request):
+        queryset = self.model.objects.combined()
+        ordering = self.get_ordering(request)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+    def get_object(self, request, object_id, from_field=None):
+        try:
+            pk = int(object_id)
+        except (TypeError, ValueError):
+            return None
+        model = self.model.objects.partitions().model_for_pk(pk)
+        return model._base_manager.select_related('user').filter(pk=pk).first()
+
+    def delete_queryset(self, request, queryset):
+        # The view is read-only; delete from the table each id belongs to
+        log_partitions = self.model.objects.partitions()
+        by_model = {}
+        for pk in queryset.values_list('pk', flat=True):
+            by_model.setdefault(log_partitions.model_for_pk(pk), []).append(pk)
+        for model, pks in by_model.items():
+            model._base_manager.filter(pk__in=pks).delete()
@@ -0,0 +1,302 @@
+"""
+Cold archive of old login and activity logs
+
+``archive_logs`` moves log rows older than N days out of the database into
+append-only segment files under LOG_ARCHIVE_DIR, one directory per log
+kind ('activity', 'login'). A segment is a gzip file of JSON lines in
+which every user's rows form their own gzip member, so one user's history
+can be decompressed without touching the rest. Next to it, a sidecar
+``.idx`` file holds one fixed-size record per user (user id, time range,
+byte offset, length, row count), sorted by user id. Lookups memory-map
+the index and binary-search it.
+
+A segment only counts once its index exists; both are written to temporary
+files and renamed, and rows are deleted from the database only after that.
+Deleting a user rewrites each segment holding their rows without their
+member, under a new name, and then removes the old segment.
+"""
+import bisect
+import gzip
+import json
+import mmap
+import os
+import struct
+import tempfile
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .batch_delete import delete_in_batches
+from .models import UserActivityLog, UserLoginLog
+
+# user id (0 for anonymous), first and last timestamp, member offset, member length, rows
+INDEX_RECORD = struct.Struct('<qddQII')
+
+KINDS = {
+    'activity': {
+        'model': UserActivityLog,
+        'time_field': 'timestamp',
+        'fields': ('id', 'user_id', 'action', 'description', 'ip_address', 'user_agent',
+                   'session_key', 'timestamp', 'additional_data'),
+    },
+    'login': {
+        'model': UserLoginLog,
+        'time_field': 'login_time',
+        'fields': ('id', 'user_id', 'ip_address', 'user_agent', 'session_key', 'login_time',
+                   'logout_time', 'login_successful'),
+    },
+}
+
+
+def archive_dir() -> str:
+    return str(getattr(settings, 'LOG_ARCHIVE_DIR', None) or os.path.join(settings.BASE_DIR, 'log_archive'))
+
+
+class _SegmentIndex:
+    """
+    Memory-mapped sidecar index of one segment
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as handle:
+            size = os.fstat(handle.fileno()).st_size
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self._count = size // INDEX_RECORD.size
+
+    def close(self) -> None:
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, position: int) -> tuple:
+        return INDEX_RECORD.unpack_from(self._map, position * INDEX_RECORD.size)
+
+    def find(self, user_id: int) -> Optional[tuple]:
+        keys = _UserIds(self)
+        position = bisect.bisect_left(keys, user_id)
+        if position < len(self) and self[position][0] == user_id:
+            return self[position]
+        return None
+
+
+class _UserIds:
+    """
+    Sequence view of the user ids in an index, for bisect
+    """
+
+    def __init__(self, index: _SegmentIndex):
+        self.index = index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __getitem__(self, position: int) -> int:
+        return self.index[position][0]
+
+
+class LogArchive:
+    """
+    Segments of one log kind
+    """
+
+    def __init__(self, kind: str, directory: Optional[str] = None):
+        self.kind = kind
+        self.spec = KINDS[kind]
+        self.directory = os.path.join(directory or archive_dir(), kind)
+
+    def segments(self) -> List[str]:
+        """
+        Complete segments (those with an index), oldest first
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            os.path.join(self.directory, name[:-len('.idx')] + '.jsonl.gz')
+            for name in os.listdir(self.directory) if name.endswith('.idx')
+        )
+
+    # Writing
+
+    def archive(self, cutoff: datetime, batch_size: Optional[int] = None, sleep: Optional[float] = None,
+                dry_run: bool = False) -> Dict[str, int]:
+        """
+        Move rows older than ``cutoff`` into a new segment
+        """
+        model = self.spec['model']
+        time_field = self.spec['time_field']
+        old_rows = model.objects.across_partitions(end=cutoff)
+        # Rows written while the segment is being built are left for the next run
+        ceilings = [queryset.order_by('-pk').values_list('pk', flat=True).first() for queryset in old_rows.querysets]
+        querysets = [
+            queryset.filter(pk__lte=ceiling) for queryset, ceiling in zip(old_rows.querysets, ceilings)
+            if ceiling is not None
+        ]
+        user_ids = set()
+        for queryset in querysets:
+            user_ids.update(queryset.order_by().values_list('user_id', flat=True).distinct())
+        if dry_run or not user_ids:
+            return {'rows': sum(queryset.count() for queryset in querysets), 'users': len(user_ids), 'deleted': 0}
+
+        os.makedirs(self.directory, exist_ok=True)
+        rows = 0
+
+        def write(data_file, index_file):
+            nonlocal rows
+            # Anonymous rows are stored under user id 0, which sorts first
+            for user_id in sorted(user_ids, key=lambda value: value or 0):
+                offset = data_file.tell()
+                first, last, count = self._write_member(data_file, querysets, user_id, time_field)
+                length = data_file.tell() - offset
+                index_file.write(INDEX_RECORD.pack(user_id or 0, first, last, offset, length, count))
+                rows += count
+
+        self._write_segment(f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{os.getpid()}", write)
+        deleted = sum(delete_in_batches(queryset, batch_size=batch_size, sleep=sleep) for queryset in querysets)
+        return {'rows': rows, 'users': len(user_ids), 'deleted': deleted}
+
+    def _write_segment(self, name: str, write) -> str:
+        """
+        Write a segment through temporary files filled by ``write(data_file, index_file)``;
+        the index is renamed into place last. Returns the segment path
+        """
+        while os.path.exists(os.path.join(self.directory, f'{name}.idx')):
+            name += 'x'
+        data_handle, data_temp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        index_handle, index_temp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        segment = os.path.join(self.directory, f'{name}.jsonl.gz')
+        try:
+            with os.fdopen(data_handle, 'wb') as data_file, os.fdopen(index_handle, 'wb') as index_file:
+                write(data_file, index_file)
+                data_file.flush()
+                os.fsync(data_file.fileno())
+                index_file.flush()
+                os.fsync(index_file.fileno())
+            os.replace(data_temp, segment)
+            os.replace(index_temp, os.path.join(self.directory, f'{name}.idx'))
+        except BaseException:
+            for path in (data_temp, index_temp):
+                if os.path.exists(path):
+                    os.unlink(path)
+            raise
+        return segment
+
+    def _write_member(self, data_file, querysets: list, user_id: Optional[int], time_field: str):
+        """
+        Stream one user's rows into a gzip member appended to ``data_file``
+        """
+        first = last = None
+        count = 0
+        with gzip.GzipFile(fileobj=data_file, mode='wb') as member:
+            for queryset in querysets:
+                rows = queryset.filter(user_id=user_id).order_by(time_field).values(*self.spec['fields'])
+                for row in rows.iterator(chunk_size=2000):
+                    moment = row[time_field].timestamp()
+                    first = moment if first is None else min(first, moment)
+                    last = moment if last is None else max(last, moment)
+                    member.write(json.dumps(row, cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8'))
+                    member.write(b'\n')
+                    count += 1
+        return first, last, count
+
+    def delete_user(self, user_id: int) -> int:
+        """
+        Remove one user's rows from every segment; returns how many
+        """
+        deleted = 0
+        for segment, record in list(self.entries(user_id)):
+            stem = segment[:-len('.jsonl.gz')]
+            index = _SegmentIndex(stem + '.idx')
+            try:
+                kept = [entry for entry in (index[position] for position in range(len(index))) if entry[0] != user_id]
+            finally:
+                index.close()
+            if kept:
+                self._copy_members(segment, kept)
+            # Until the old index is gone both copies count; readers see the kept rows twice at worst
+            os.unlink(stem + '.idx')
+            os.unlink(segment)
+            deleted += record[5]
+        return deleted
+
+    def _copy_members(self, segment: str, records: List[tuple]) -> str:
+        """
+        Copy the listed members of a segment into a new one that sorts right after it
+        """
+        def write(data_file, index_file):
+            with open(segment, 'rb') as source:
+                for user_id, first, last, offset, length, count in records:
+                    source.seek(offset)
+                    index_file.write(INDEX_RECORD.pack(user_id, first, last, data_file.tell(), length, count))
+                    data_file.write(source.read(length))
+
+        return self._write_segment(os.path.basename(segment)[:-len('.jsonl.gz')] + 'x', write)
+
+    # Reading
+
+    def entries(self, user_id: Optional[int]) -> Iterator[tuple]:
+        """
+        (segment path, index record) for every segment holding rows of this user
+        """
+        for segment in self.segments():
+            index = _SegmentIndex(segment[:-len('.jsonl.gz')] + '.idx')
+            try:
+                record = index.find(user_id or 0)
+            finally:
+                index.close()
+            if record is not None:
+                yield segment, record
+
+    def count(self, user_id: Optional[int]) -> int:
+        """
+        Archived rows of this user, from the indexes alone
+        """
+        return sum(record[5] for _, record in self.entries(user_id))
+
+    def rows(self, user_id: Optional[int], start: Optional[datetime] = None,
+             end: Optional[datetime] = None) -> Iterator[dict]:
+        """
+        Archived rows of this user in [start, end), oldest segment first
+        """
+        time_field = self.spec['time_field']
+        low = start.timestamp() if start else None
+        high = end.timestamp() if end else None
+        for segment, (_, first, last, offset, length, _) in self.entries(user_id):
+            if (low is not None and last < low) or (high is not None and first >= high):
+                continue
+            with open(segment, 'rb') as handle:
+                handle.seek(offset)
+                member = handle.read(length)
+            for line in gzip.decompress(member).splitlines():
+                row = json.loads(line)
+                for field in ('timestamp', 'login_time', 'logout_time'):
+                    if row.get(field):
+                        row[field] = datetime.fromisoformat(row[field])
+                moment = row[time_field].timestamp()
+                if (low is None or moment >= low) and (high is None or moment < high):
+                    yield row
+
+    def newest(self, user_id: Optional[int], limit: int) -> List[dict]:
+        time_field = self.spec['time_field']
+        rows = sorted(self.rows(user_id), key=lambda row: row[time_field], reverse=True)
+        return rows[:limit]
+
+
+def archived_summary(user_id: int) -> Dict[str, object]:
+    """
+    Archived totals of one user, in the shape get_user_statistics adds them
+    """
+    activity = LogArchive('activity')
+    action_counts = Counter(row['action'] for row in activity.rows(user_id))
+    logins = [row for row in LogArchive('login').rows(user_id) if row['login_successful']]
+    return {
+        'activities': sum(action_counts.values()),
+        'logins': len(logins),
+        'last_login': max((row['login_time'] for row in logins), default=None),
+        'action_counts': action_counts,
+    }
@@ -0,0 +1,84 @@
+"""
+Move old login and activity logs into the compressed cold archive
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from main.log_archive import KINDS, LogArchive, archive_dir
+
+
+class Command(BaseCommand):
+    help = 'Archive log records older than N days to gzip JSONL segments and remove them from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=90,
+            help='Archive records older than N days (default: 90)'
+        )
+        parser.add_argument(
+            '--kind',
+            choices=sorted(KINDS),
+            action='append',
+            help='Only archive this log kind (repeatable; default: all)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Rows deleted per transaction once archived (default: CLEANUP_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=None,
+            help='Seconds to sleep between delete batches (default: CLEANUP_BATCH_SLEEP)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count what would be archived'
+        )
+        parser.add_argument(
+            '--list',
+            action='store_true',
+            help='List the archive segments and exit'
+        )
+
+    def handle(self, *args, **options):
+        kinds = options['kind'] or sorted(KINDS)
+        if options['list']:
+            self.list_segments(kinds)
+            return
+
+        dry_run = options['dry_run']
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        self.stdout.write(
+            f"{'[DRY RUN] ' if dry_run else ''}Archiving logs older than {options['days']} days to {archive_dir()}..."
+        )
+        for kind in kinds:
+            result = LogArchive(kind).archive(
+                cutoff,
+                batch_size=options['batch_size'],
+                sleep=options['sleep'],
+                dry_run=dry_run
+            )
+            if dry_run:
+                self.stdout.write(self.style.WARNING(
+                    f"Would archive {result['rows']} {kind} logs of {result['users']} users"
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Archived {result['rows']} {kind} logs of {result['users']} users "
+                    f"({result['deleted']} removed from the database)"
+                ))
+
+    def list_segments(self, kinds):
+        for kind in kinds:
+            segments = LogArchive(kind).segments()
+            self.stdout.write(f'\n=== {kind} ({len(segments)} segments) ===')
+            for segment in segments:
+                self.stdout.write(f'  {segment}')
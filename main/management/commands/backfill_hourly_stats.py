@@ -0,0 +1,47 @@
+"""
+Recompute the hourly aggregates from the log tables
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from main.aggregates import backfill, complete_logs_from, earliest_source_time
+
+
+class Command(BaseCommand):
+    help = 'Rebuild HourlyBucket and HourlyUserActivity rows from existing data, one day per transaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Only rebuild the last N days (default: everything in the database)'
+        )
+
+    def handle(self, *args, **options):
+        # Up to the end of the current hour, so the rebuilt range includes today
+        end = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        if options['days'] is not None:
+            start = end - timedelta(days=options['days'])
+        else:
+            start = earliest_source_time()
+            if start is None:
+                self.stdout.write(self.style.WARNING('No data to aggregate'))
+                return
+
+        self.stdout.write(f'Rebuilding hourly aggregates from {start:%Y-%m-%d %H:00} to {end:%Y-%m-%d %H:00}...')
+        complete_from = complete_logs_from()
+        if complete_from is None or complete_from > start:
+            until = 'every hour' if complete_from is None else f'hours before {complete_from:%Y-%m-%d %H:00}'
+            self.stdout.write(self.style.WARNING(
+                f'Login/activity logs are incomplete (archived or deleted) for {until}; '
+                'existing counts there are only raised, never lowered'
+            ))
+
+        def progress(day, rows):
+            self.stdout.write(f'  {day:%Y-%m-%d}: {rows} rows')
+
+        written = backfill(start, end, progress=progress)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} hourly aggregate rows'))
@@ -0,0 +1,117 @@
+"""
+Management command to measure coherence report latency for each analysis depth
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from main.analysis import extract_entities
+from main.coherence import DEPTH_LEVELS, score_coherence
+
+
+SENTENCE_TEMPLATES = [
+    'The {0} handed the {1} to the {2}.',
+    'The {0} studied the {1} near the {2}.',
+    'A {0} followed the {1}.',
+    'It was close to the {0}.',
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the spaCy parse and entity-grid coherence scoring on synthetic documents'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sentences',
+            type=int,
+            nargs='+',
+            default=[100, 1_000, 5_000],
+            help='Document sizes in sentences (default: 100 1000 5000)'
+        )
+        parser.add_argument(
+            '--entities',
+            type=int,
+            default=400,
+            help='Distinct entities in the synthetic vocabulary (default: 400)'
+        )
+        parser.add_argument(
+            '--no-parse',
+            action='store_true',
+            help='Score synthetic entity lists and skip the spaCy parse'
+        )
+
+    def build_sentences(self, sentence_count, vocabulary_size):
+        # Topics drift slowly so neighbouring sentences share entities, as in real text
+        rng = random.Random(sentence_count)
+        sentences = []
+        for index in range(sentence_count):
+            topic = index // 5
+            nouns = [f'entity{(topic + rng.randint(0, 8)) % vocabulary_size}' for _ in range(3)]
+            sentences.append(rng.choice(SENTENCE_TEMPLATES).format(*nouns))
+        return sentences
+
+    def build_entities(self, sentence_count, vocabulary_size):
+        # Stand-in for the parse when spaCy is skipped
+        rng = random.Random(sentence_count)
+        entities = []
+        for index in range(sentence_count):
+            topic = index // 5
+            mentions = []
+            for _ in range(rng.randint(2, 5)):
+                lemma = f'entity{(topic + rng.randint(0, 8)) % vocabulary_size}'
+                mentions.append((lemma, rng.choice('SOXX'), False))
+            if rng.random() < 0.3:
+                mentions.append(('it', 'S', True))
+            entities.append(mentions)
+        return entities
+
+    def parse(self, sentences):
+        started = time.perf_counter()
+        entities = extract_entities(sentences)
+        return entities, time.perf_counter() - started
+
+    def handle(self, *args, **options):
+        parse = not options['no_parse']
+        if parse:
+            try:
+                # First call pays for loading the spaCy pipeline
+                self.parse(self.build_sentences(10, options['entities']))
+            except (ImportError, OSError) as exc:
+                self.stderr.write(self.style.WARNING(
+                    f'spaCy pipeline unavailable ({exc}); scoring synthetic entities without the parse'
+                ))
+                parse = False
+        # First call pays for the NumPy import
+        score_coherence(self.build_entities(10, options['entities']))
+
+        self.stdout.write(
+            f"\n{'sentences':>9} {'depth':>14} {'scored':>7} {'parse ms':>9} {'grid ms':>8} "
+            f"{'score ms':>9} {'total ms':>9}"
+        )
+        for sentence_count in options['sentences']:
+            parsed = {}
+            if parse:
+                sentences = self.build_sentences(sentence_count, options['entities'])
+            else:
+                entities = self.build_entities(sentence_count, options['entities'])
+            for depth, level in DEPTH_LEVELS.items():
+                parse_seconds = None
+                if parse:
+                    # The view only parses the sentences within the depth's budget
+                    scored = min(sentence_count, level['max_sentences'])
+                    if scored not in parsed:
+                        parsed[scored] = self.parse(sentences[:scored])
+                    entities, parse_seconds = parsed[scored]
+                report = score_coherence(entities, analysis_depth=depth)
+                timings = report['timings']
+                total = timings['total_seconds'] + (parse_seconds or 0)
+                parse_column = f'{parse_seconds * 1000:>9.1f}' if parse_seconds is not None else f"{'-':>9}"
+                self.stdout.write(
+                    f"{sentence_count:>9} {depth:>14} {report['sentence_count']:>7} {parse_column} "
+                    f"{timings['grid_seconds'] * 1000:>8.1f} {timings['scoring_seconds'] * 1000:>9.1f} "
+                    f"{total * 1000:>9.1f}"
+                )
+        self.stdout.write(self.style.SUCCESS(
+            '\nTotals include the parse when it ran. Centering transitions (standard and above) '
+            'are not included; see benchmark_transitions.'
+        ))
@@ -0,0 +1,110 @@
+"""
+Management command to measure grammar correction throughput with and without batching
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from main.grammar_batcher import GrammarBatcher, correct_batch_with_model, supports_batching
+from main.model_registry import ModelRegistry
+
+
+DEFAULT_TEXT = 'the student have finish his assignment before the professor arrive to class.'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark correct_grammar_t5 throughput at several concurrency levels'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            nargs='+',
+            default=[1, 4, 16],
+            help='Concurrent request counts to measure (default: 1 4 16)'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=4,
+            help='Corrections issued by each concurrent client (default: 4)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=getattr(settings, 'GRAMMAR_BATCH_MAX_SIZE', 16),
+            help='Maximum batch size for the batched run'
+        )
+        parser.add_argument(
+            '--wait-ms',
+            type=float,
+            default=getattr(settings, 'GRAMMAR_BATCH_WAIT_MS', 10),
+            help='Batching window in milliseconds for the batched run'
+        )
+        parser.add_argument(
+            '--text',
+            type=str,
+            default=DEFAULT_TEXT,
+            help='Sentence to correct'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Loading language model...')
+        model = ModelRegistry.get_model()
+        text = options['text']
+        per_client = options['requests']
+
+        self.stdout.write(
+            f"\n{'clients':>8} {'mode':>8} {'texts':>6} {'seconds':>8} {'texts/s':>8} "
+            f"{'p50 ms':>8} {'avg batch':>9}"
+        )
+        batching = supports_batching()
+        if not batching:
+            self.stdout.write(self.style.WARNING(
+                'Batching is unavailable for this model (see the logged warning); only measuring direct calls'
+            ))
+        for clients in options['concurrency']:
+            elapsed, latencies = self.run_clients(clients, per_client, lambda: model.correct_grammar_t5(text))
+            self.report(clients, 'direct', elapsed, latencies, None)
+            if not batching:
+                continue
+
+            batcher = GrammarBatcher(
+                correct_batch_with_model,
+                max_batch_size=options['batch_size'],
+                max_wait_ms=options['wait_ms'],
+            )
+            elapsed, latencies = self.run_clients(clients, per_client, lambda: batcher.correct(text))
+            self.report(clients, 'batched', elapsed, latencies, batcher.get_stats()['average_batch'])
+
+    def run_clients(self, clients, per_client, call):
+        latencies = []
+        lock = threading.Lock()
+        start = threading.Barrier(clients + 1)
+
+        def client():
+            start.wait()
+            for _ in range(per_client):
+                began = time.perf_counter()
+                call()
+                with lock:
+                    latencies.append(time.perf_counter() - began)
+
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        began = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - began, sorted(latencies)
+
+    def report(self, clients, mode, elapsed, latencies, average_batch):
+        count = len(latencies)
+        p50 = latencies[count // 2] * 1000 if latencies else 0
+        batch = f'{average_batch:.1f}' if average_batch else '-'
+        self.stdout.write(
+            f'{clients:>8} {mode:>8} {count:>6} {elapsed:>8.2f} {count / elapsed:>8.1f} '
+            f'{p50:>8.0f} {batch:>9}'
+        )
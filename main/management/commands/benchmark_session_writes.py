@@ -0,0 +1,74 @@
+"""
+Management command to count django_session writes per page view for each session backend
+
+Requests go through settings.MIDDLEWARE as configured; the only write
+throttling measured is main.session_backend's (unchanged data is not
+saved, expire_date moves at most once per SESSION_EXPIRY_REFRESH_SECONDS).
+The page views run against a throwaway test database, so the sessions,
+activity rows and rollups they write never reach the configured one.
+main.tests asserts the same count for main.session_backend.
+"""
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment
+)
+
+
+ENGINES = [
+    'django.contrib.sessions.backends.db',
+    'main.session_backend',
+]
+
+PAGES = ['/', '/transition-analysis/', '/coherence-report/', '/session-info/']
+
+
+def count_session_writes(engine: str, views: int) -> int:
+    """
+    django_session INSERT/UPDATE statements for ``views`` page views of a returning anonymous visitor
+    """
+    table = Session._meta.db_table
+    with override_settings(SESSION_ENGINE=engine, ALLOWED_HOSTS=['testserver'], ACTIVITY_LOG_ASYNC=False):
+        client = Client()
+        # A returning visitor whose session already holds generation settings
+        session = client.session
+        session['generation_settings'] = {'num_sentences': 5, 'length': 13}
+        session.save()
+
+        with CaptureQueriesContext(connection) as queries:
+            for index in range(views):
+                client.get(PAGES[index % len(PAGES)])
+
+    return sum(
+        1 for query in queries.captured_queries
+        if table in query['sql'] and query['sql'].lstrip().upper().startswith(('INSERT', 'UPDATE'))
+    )
+
+
+class Command(BaseCommand):
+    help = 'Count django_session INSERT/UPDATE statements per 1,000 anonymous page views (on a test database)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--views',
+            type=int,
+            default=1000,
+            help='Page views per session backend (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        views = options['views']
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.stdout.write(f"\n{'engine':<40} {'views':>6} {'writes':>7} {'per 1000':>9}")
+            for engine in ENGINES:
+                writes = count_session_writes(engine, views)
+                per_thousand = writes * 1000 / views if views else 0
+                self.stdout.write(f'{engine:<40} {views:>6} {writes:>7} {per_thousand:>9.1f}')
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
@@ -0,0 +1,72 @@
+"""
+Management command to measure transition analysis latency by input size
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from main.analysis import run_analyze_transitions, summarize_transitions
+
+
+SAMPLE_SENTENCES = [
+    'The student finished the assignment late at night.',
+    'She handed it to the professor the next morning.',
+    'The professor read the assignment carefully.',
+    'He was impressed by the depth of the argument.',
+    'The library closed early because of the storm.',
+    'Its windows were covered with wooden boards.',
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark transition analysis on synthetic texts of increasing size'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[1_000, 10_000, 100_000],
+            help='Input sizes in characters (default: 1000 10000 100000)'
+        )
+        parser.add_argument(
+            '--sentence-window',
+            type=int,
+            default=3,
+            help='Sentence window passed to the summary step (default: 3)'
+        )
+
+    def build_text(self, size):
+        sentences = []
+        total = 0
+        while total < size:
+            sentence = SAMPLE_SENTENCES[len(sentences) % len(SAMPLE_SENTENCES)]
+            sentences.append(sentence)
+            total += len(sentence) + 1
+        return ' '.join(sentences)[:size]
+
+    def handle(self, *args, **options):
+        budget = getattr(settings, 'TRANSITION_ANALYSIS_BUDGET_SECONDS', 10.0)
+        self.stdout.write(f'Latency budget: {budget:.1f}s')
+        self.stdout.write(
+            f"\n{'chars':>8} {'transitions':>11} {'parse s':>8} {'summary s':>9} {'total s':>8} {'chars/s':>9}  status"
+        )
+
+        for size in options['sizes']:
+            text = self.build_text(size)
+            started = time.perf_counter()
+            try:
+                frame = run_analyze_transitions(text)
+                parsed = time.perf_counter()
+                results = summarize_transitions(frame, options['sentence_window'])
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'{size:>8} failed after {time.perf_counter() - started:.2f}s: {e}'))
+                continue
+            finished = time.perf_counter()
+
+            total = finished - started
+            status = self.style.ERROR('OVER BUDGET') if total > budget else self.style.SUCCESS('ok')
+            self.stdout.write(
+                f"{size:>8} {results['transition_count']:>11} {parsed - started:>8.2f} "
+                f"{finished - parsed:>9.3f} {total:>8.2f} {size / total:>9.0f}  {status}"
+            )
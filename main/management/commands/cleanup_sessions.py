@@ -6,6 +6,7 @@ from django.utils import timezone
 from datetime import timedelta
 from main.session_manager import SessionManager
 from main.models import GeneratedText, UserActivityLog
+from main.batch_delete import delete_in_batches
 
 
 class Command(BaseCommand):
@@ -24,11 +25,26 @@ class Command(BaseCommand):
             action='store_true',
             help='Show what would be deleted without actually deleting'
         )
+        
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Rows deleted per transaction (default: CLEANUP_BATCH_SIZE)'
+        )
+        
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=None,
+            help='Seconds to sleep between batches (default: CLEANUP_BATCH_SLEEP)'
+        )
 
     def handle(self, *args, **options):
         days = options['days']
         dry_run = options['dry_run']
         cutoff_date = timezone.now() - timedelta(days=days)
+        batch_options = {'batch_size': options['batch_size'], 'sleep': options['sleep']}
         
         self.stdout.write(
             self.style.SUCCESS(
@@ -37,14 +53,17 @@ class Command(BaseCommand):
         )
         
         # Clean up expired sessions
-        expired_sessions_count = SessionManager.cleanup_expired_sessions()
         if not dry_run:
+            expired_sessions_count = SessionManager.cleanup_expired_sessions(
+                progress=self.progress('expired sessions'), **batch_options
+            )
             self.stdout.write(
                 self.style.SUCCESS(
                     f"Deleted {expired_sessions_count} expired sessions"
                 )
             )
         else:
+            expired_sessions_count = SessionManager.cleanup_expired_sessions(dry_run=True)
             self.stdout.write(
                 self.style.WARNING(
                     f"Would delete {expired_sessions_count} expired sessions"
@@ -56,10 +75,12 @@ class Command(BaseCommand):
             created_at__lt=cutoff_date,
             user__isnull=True  # Only delete anonymous user data
         )
-        old_texts_count = old_generated_texts.count()
         
         if not dry_run:
-            old_generated_texts.delete()
+            old_texts_count = delete_in_batches(
+                old_generated_texts, progress=self.progress('anonymous generated texts'),
+                order_field='-created_at', **batch_options
+            )
             self.stdout.write(
                 self.style.SUCCESS(
                     f"Deleted {old_texts_count} old anonymous generated texts"
@@ -68,19 +89,22 @@ class Command(BaseCommand):
         else:
             self.stdout.write(
                 self.style.WARNING(
-                    f"Would delete {old_texts_count} old anonymous generated texts"
+                    f"Would delete {old_generated_texts.count()} old anonymous generated texts"
                 )
             )
         
         # Clean up old activity logs (keep user logs, clean anonymous)
-        old_activity_logs = UserActivityLog.objects.filter(
-            timestamp__lt=cutoff_date,
+        old_activity_logs = UserActivityLog.objects.across_partitions(end=cutoff_date).filter(
             user__isnull=True
         )
-        old_logs_count = old_activity_logs.count()
         
         if not dry_run:
-            old_activity_logs.delete()
+            old_logs_count = sum(
+                delete_in_batches(
+                    queryset, progress=self.progress('anonymous activity logs'), order_field='-timestamp', **batch_options
+                )
+                for queryset in old_activity_logs.querysets
+            )
             self.stdout.write(
                 self.style.SUCCESS(
                     f"Deleted {old_logs_count} old anonymous activity logs"
@@ -89,7 +113,7 @@ class Command(BaseCommand):
         else:
             self.stdout.write(
                 self.style.WARNING(
-                    f"Would delete {old_logs_count} old anonymous activity logs"
+                    f"Would delete {old_activity_logs.count()} old anonymous activity logs"
                 )
             )
         
@@ -100,6 +124,12 @@ class Command(BaseCommand):
                 f"\nCurrent statistics:"
                 f"\n- Active sessions: {active_sessions}"
                 f"\n- Total generated texts: {GeneratedText.objects.count()}"
-                f"\n- Total activity logs: {UserActivityLog.objects.count()}"
+                f"\n- Total activity logs: {UserActivityLog.objects.across_partitions().count()}"
             )
         )
+
+    def progress(self, label):
+        """Print a line per batch; an interrupted run can simply be started again"""
+        def report(deleted, batches, last_pk):
+            self.stdout.write(f"  {label}: {deleted} deleted after {batches} batches (last id {last_pk})")
+        return report
@@ -0,0 +1,47 @@
+"""
+Create the monthly log partition tables ahead of time
+
+Also gives the existing partitions any index added to the log models since
+they were created, moves rows of partitions created before per-partition id
+ranges into their range, and recreates the combined view and the full-text
+triggers; run it after migrating as well as from cron.
+"""
+from django.core.management.base import BaseCommand
+
+from main import search
+from main.models import UserActivityLog, UserLoginLog
+from main.partitions import is_enabled
+
+
+class Command(BaseCommand):
+    help = 'Create the login and activity log partitions of this month and the next ones (run daily from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months',
+            type=int,
+            default=1,
+            help='Months ahead of the current one to create (default: 1)'
+        )
+
+    def handle(self, *args, **options):
+        if not is_enabled():
+            self.stdout.write(self.style.WARNING('LOG_PARTITIONING_ENABLED is off; creating the tables anyway'))
+        for model in (UserLoginLog, UserActivityLog):
+            log_partitions = model.objects.partitions()
+            created = log_partitions.create_ahead(options['months'])
+            for suffix in created:
+                self.stdout.write(self.style.SUCCESS(f'Created {log_partitions.prefix}{suffix}'))
+            indexed = log_partitions.add_missing_indexes()
+            if indexed:
+                self.stdout.write(self.style.SUCCESS(f'{model._meta.db_table}: added {indexed} missing partition indexes'))
+            moved = sum(log_partitions.assign_ids(suffix) for suffix in log_partitions.suffixes())
+            if moved:
+                self.stdout.write(self.style.SUCCESS(f'{model._meta.db_table}: moved {moved} rows into their id range'))
+            log_partitions.refresh_view()
+            if not created and not indexed and not moved:
+                self.stdout.write(f'{model._meta.db_table}: partitions up to date')
+
+        # Partitions created before they were indexed have no sync triggers
+        if not search.is_available(refresh=True) and search.rebuild():
+            self.stdout.write(self.style.SUCCESS('Rebuilt the full-text indexes with the partition rows'))
@@ -0,0 +1,37 @@
+"""
+Check the query plans of the hot queries against the configured database
+
+The checks themselves live in main/query_plans.py and also run in the test
+suite; this command runs them against a real database (e.g. production
+sized) and prints the plans.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from main.query_plans import hot_queries, is_supported, plan_problem, planning
+
+
+class Command(BaseCommand):
+    help = 'Fail if a hot query is planned as a full scan, a sort or without its index (run after migrating)'
+
+    def handle(self, *args, **options):
+        if not is_supported():
+            raise CommandError(f'Query plan checks are not supported on {connection.vendor}')
+
+        failures = []
+        with planning():
+            for name, queryset, index in hot_queries():
+                plan = queryset.explain()
+                problem = plan_problem(plan, index)
+                if problem:
+                    failures.append(name)
+                    self.stdout.write(self.style.ERROR(f'{name}: {problem}'))
+                else:
+                    used = index if isinstance(index, str) else ' or '.join(index)
+                    self.stdout.write(self.style.SUCCESS(f'{name}: uses {used}'))
+                if problem or options['verbosity'] > 1:
+                    for line in plan.splitlines():
+                        self.stdout.write(f'    {line}')
+
+        if failures:
+            raise CommandError(f'{len(failures)} hot queries are not served by their index: {", ".join(failures)}')
@@ -0,0 +1,123 @@
+"""
+Export every user's data to gzip NDJSON shards with a manifest
+"""
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from main.bulk_export import export_shard, load_shard_status, worker_init
+
+
+class Command(BaseCommand):
+    help = 'Export all user data to gzip NDJSON shards (restartable per shard)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output',
+            help='Directory for the shards and manifest.json'
+        )
+        parser.add_argument(
+            '--shards',
+            type=int,
+            default=8,
+            help='Number of shards users are split into (default: 8)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Worker processes (default: CPU count, at most --shards)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help='Rows per keyset page (default: EXPORT_CHUNK_SIZE)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Re-export shards that are already finished'
+        )
+
+    def handle(self, *args, **options):
+        output = options['output']
+        shards = options['shards']
+        if shards < 1:
+            raise CommandError('--shards must be at least 1')
+        os.makedirs(output, exist_ok=True)
+
+        manifest_path = os.path.join(output, 'manifest.json')
+        previous = self.read_manifest(manifest_path)
+        if previous and previous.get('shards') != shards:
+            raise CommandError(
+                f"{output} holds an export with {previous.get('shards')} shards; use another directory"
+            )
+
+        statuses = {}
+        pending = []
+        for shard in range(shards):
+            status = None if options['force'] else load_shard_status(output, shard)
+            if status is not None:
+                statuses[shard] = status
+            else:
+                pending.append(shard)
+        if statuses:
+            self.stdout.write(f'Skipping {len(statuses)} finished shards')
+
+        started = time.perf_counter()
+        workers = max(1, min(options['workers'] or os.cpu_count() or 1, len(pending) or 1))
+        if pending:
+            self.stdout.write(f'Exporting {len(pending)} shards with {workers} workers...')
+            # Forked workers must open their own database connections
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=worker_init) as pool:
+                futures = {
+                    pool.submit(export_shard, output, shard, shards, options['chunk_size']): shard
+                    for shard in pending
+                }
+                for future in as_completed(futures):
+                    status = future.result()
+                    statuses[status['shard']] = status
+                    self.stdout.write(
+                        f"  {status['file']}: {status['rows']} rows in {status['seconds']}s "
+                        f"({status['rows_per_second']} rows/s)"
+                    )
+        elapsed = time.perf_counter() - started
+
+        totals = {}
+        for status in statuses.values():
+            for table, count in status['counts'].items():
+                totals[table] = totals.get(table, 0) + count
+        manifest = {
+            'created_at': timezone.now().isoformat(),
+            'database': str(settings.DATABASES['default']['NAME']),
+            'shards': shards,
+            'rows': sum(totals.values()),
+            'counts': totals,
+            'files': [statuses[shard] for shard in range(shards)],
+        }
+        with open(manifest_path + '.tmp', 'w') as handle:
+            json.dump(manifest, handle, indent=2)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+        exported = sum(statuses[shard]['rows'] for shard in pending)
+        rate = f'{exported / elapsed:.1f}' if elapsed and exported else '0'
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {exported} rows in {elapsed:.1f}s ({rate} rows/s); "
+            f"{manifest['rows']} rows in total, manifest written to {manifest_path}"
+        ))
+
+    @staticmethod
+    def read_manifest(path):
+        try:
+            with open(path) as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return None
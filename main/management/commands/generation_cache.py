@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from main.generation_cache import GenerationCache
+
+
+class Command(BaseCommand):
+    help = 'Inspect or clear the generation result cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Delete every cached result',
+        )
+        parser.add_argument(
+            '--evict',
+            action='store_true',
+            help='Trim the database tier to GENERATION_CACHE_DB_BYTES',
+        )
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            deleted = GenerationCache.clear()
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} cached results'))
+            return
+        if options['evict']:
+            evicted = GenerationCache.evict_db()
+            self.stdout.write(self.style.SUCCESS(f'Evicted {evicted} cached results'))
+
+        stats = GenerationCache.get_stats()
+        self.stdout.write('\n=== Generation Cache ===')
+        self.stdout.write(f'Enabled: {stats["enabled"]}')
+        self.stdout.write(f'Entries: {stats["db_entries"]}')
+        self.stdout.write(f'Size: {stats["db_bytes"]} bytes')
+        self.stdout.write(f'Database Tier Hits: {stats["db_total_hits"]}')
@@ -1,7 +1,8 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from django.db import models
 from main.utils import clean_old_logs, get_user_statistics
+from main.log_archive import LogArchive
+from main import aggregates
 from main.models import UserLoginLog, UserActivityLog, GeneratedText
 from django.contrib.auth.models import User
 
@@ -33,10 +34,27 @@ class Command(BaseCommand):
             metavar='USERNAME',
             help='Export all data for a specific user',
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Rows deleted per transaction with --clean-logs (default: CLEANUP_BATCH_SIZE)',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=None,
+            help='Seconds to sleep between delete batches (default: CLEANUP_BATCH_SLEEP)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='With --clean-logs, only count what would be deleted',
+        )
 
     def handle(self, *args, **options):
         if options['clean_logs']:
-            self.clean_old_logs(options['clean_logs'])
+            self.clean_old_logs(options['clean_logs'], options)
         elif options['user_stats']:
             self.show_user_stats(options['user_stats'])
         elif options['summary']:
@@ -48,16 +66,31 @@ class Command(BaseCommand):
                 self.style.WARNING('No action specified. Use --help to see available options.')
             )
 
-    def clean_old_logs(self, days):
+    def clean_old_logs(self, days, options):
         """Clean old log records"""
-        self.stdout.write(f'Cleaning logs older than {days} days...')
+        dry_run = options['dry_run']
+        self.stdout.write(f"{'[DRY RUN] ' if dry_run else ''}Cleaning logs older than {days} days...")
         
-        result = clean_old_logs(days)
+        def progress(key, deleted, batches, last_pk):
+            self.stdout.write(f'  {key}: {deleted} deleted after {batches} batches (last id {last_pk})')
+        
+        result = clean_old_logs(
+            days,
+            batch_size=options['batch_size'],
+            sleep=options['sleep'],
+            progress=progress,
+            dry_run=dry_run
+        )
         
+        for table, rows in result.get('dropped_partitions', []):
+            self.stdout.write(f'  dropped partition {table} ({rows} rows)')
+        
+        verb = 'Would delete' if dry_run else 'Cleaned'
         self.stdout.write(
-            self.style.SUCCESS(
-                f'Cleaned {result["deleted_logins"]} login logs and '
-                f'{result["deleted_activities"]} activity logs'
+            (self.style.WARNING if dry_run else self.style.SUCCESS)(
+                f'{verb} {result["deleted_logins"]} login logs, '
+                f'{result["deleted_activities"]} activity logs and '
+                f'{result["deleted_rollups"]} hourly activity rollups'
             )
         )
 
@@ -65,11 +98,11 @@ class Command(BaseCommand):
         """Show statistics for a specific user"""
         try:
             user = User.objects.get(username=username)
-            stats = get_user_statistics(user)
+            stats = get_user_statistics(user, include_archive=True)
             
             self.stdout.write(f'\n=== Statistics for {username} ===')
             self.stdout.write(f'Total Logins: {stats["total_logins"]}')
-            self.stdout.write(f'Total Activities: {stats["total_activities"]}')
+            self.stdout.write(f'Total Activities: {stats["total_activities"]} ({stats["archived_activities"]} archived)')
             self.stdout.write(f'Text Generations: {stats["text_generations"]}')
             self.stdout.write(f'Last Login: {stats["last_login"]}')
             
@@ -84,42 +117,39 @@ class Command(BaseCommand):
 
     def show_summary(self):
         """Show overall system statistics"""
+        # Everything below sums the hourly aggregates; run backfill_hourly_stats once for older data
+        from datetime import timedelta
         total_users = User.objects.count()
-        total_logins = UserLoginLog.objects.filter(login_successful=True).count()
-        total_activities = UserActivityLog.objects.count()
-        total_texts = GeneratedText.objects.count()
+        overall = aggregates.totals()
         
         # Recent activity (last 24 hours)
-        from datetime import timedelta
         yesterday = timezone.now() - timedelta(days=1)
-        recent_logins = UserLoginLog.objects.filter(
-            login_time__gte=yesterday,
-            login_successful=True
-        ).count()
-        recent_activities = UserActivityLog.objects.filter(
-            timestamp__gte=yesterday
-        ).count()
+        recent = aggregates.totals(start=yesterday)
+        recent_users = aggregates.distinct_users(start=yesterday)
         
-        # Most active users (by total activities)
-        active_users = UserActivityLog.objects.values('user__username').annotate(
-            activity_count=models.Count('id')
-        ).order_by('-activity_count')[:5]
+        active_users = aggregates.most_active_users(limit=5)
+        anonymous = overall['activities'] - aggregates.user_activities()
         
         self.stdout.write('\n=== System Summary ===')
         self.stdout.write(f'Total Users: {total_users}')
-        self.stdout.write(f'Total Successful Logins: {total_logins}')
-        self.stdout.write(f'Total Activities: {total_activities}')
-        self.stdout.write(f'Total Generated Texts: {total_texts}')
+        self.stdout.write(f'Total Successful Logins: {overall["logins"]}')
+        self.stdout.write(f'Total Activities: {overall["activities"]}')
+        self.stdout.write(f'Total Generated Texts: {overall["generations"]}')
         
         self.stdout.write(f'\n=== Recent Activity (24 hours) ===')
-        self.stdout.write(f'Recent Logins: {recent_logins}')
-        self.stdout.write(f'Recent Activities: {recent_activities}')
+        self.stdout.write(f'Recent Logins: {recent["logins"]}')
+        self.stdout.write(f'Recent Activities: {recent["activities"]}')
+        self.stdout.write(f'Active Users: {recent_users}')
+        
+        self.stdout.write(f'\n=== Activities by Action ===')
+        for action, total in overall['activities_by_action'].most_common():
+            self.stdout.write(f'  {action}: {total}')
         
         self.stdout.write(f'\n=== Most Active Users ===')
-        for user_data in active_users:
-            username = user_data['user__username'] or 'Anonymous'
-            count = user_data['activity_count']
+        for username, count in active_users:
             self.stdout.write(f'  {username}: {count} activities')
+        if anonymous:
+            self.stdout.write(f'  Anonymous: {anonymous} activities')
 
     def export_user_data(self, username):
         """Export all data for a specific user"""
@@ -127,14 +157,14 @@ class Command(BaseCommand):
             user = User.objects.get(username=username)
             
             # Get all user data
-            login_logs = UserLoginLog.objects.filter(user=user)
-            activity_logs = UserActivityLog.objects.filter(user=user)
+            login_logs = UserLoginLog.objects.across_partitions().filter(user=user)
+            activity_logs = UserActivityLog.objects.across_partitions().filter(user=user)
             generated_texts = GeneratedText.objects.filter(user=user)
             
             self.stdout.write(f'\n=== Data Export for {username} ===')
             
             self.stdout.write(f'\n--- Login History ({login_logs.count()} records) ---')
-            for log in login_logs.order_by('-login_time')[:10]:  # Last 10
+            for log in login_logs.newest(10):
                 status = "Success" if log.login_successful else "Failed"
                 duration = ""
                 if log.logout_time and log.login_time:
@@ -148,12 +178,23 @@ class Command(BaseCommand):
                 )
             
             self.stdout.write(f'\n--- Activity History ({activity_logs.count()} records) ---')
-            for log in activity_logs.order_by('-timestamp')[:10]:  # Last 10
+            for log in activity_logs.newest(10):
                 self.stdout.write(
                     f'  {log.timestamp.strftime("%Y-%m-%d %H:%M:%S")} - '
                     f'{log.get_action_display()}: {log.description}'
                 )
             
+            activity_archive = LogArchive('activity')
+            login_archive = LogArchive('login')
+            self.stdout.write(
+                f'\n--- Archived History ({login_archive.count(user.pk)} logins, '
+                f'{activity_archive.count(user.pk)} activities) ---'
+            )
+            for row in activity_archive.newest(user.pk, 10):
+                self.stdout.write(
+                    f'  {row["timestamp"].strftime("%Y-%m-%d %H:%M:%S")} - {row["action"]}: {row["description"]}'
+                )
+            
             self.stdout.write(f'\n--- Generated Texts ({generated_texts.count()} records) ---')
             for text in generated_texts.order_by('-created_at')[:5]:  # Last 5
                 self.stdout.write(
@@ -0,0 +1,32 @@
+"""
+Rebuild the FTS5 full-text indexes from their tables
+
+Also recreates the sync triggers, which SQLite drops when a migration
+remakes a content table; run it after such migrations.
+"""
+from django.core.management.base import BaseCommand
+
+from django.db import connection
+
+from main.search import INDEXES, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search indexes of generated texts and activity descriptions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--optimize',
+            action='store_true',
+            help='Also merge the index segments after rebuilding'
+        )
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild(optimize=options['optimize'])
+        for table in rebuilt:
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {table} and its triggers'))
+        if connection.vendor != 'sqlite' or len(rebuilt) < len(INDEXES):
+            self.stdout.write(self.style.WARNING(
+                'Full-text indexes are not available (SQLite with FTS5 and migration 0008 required); '
+                'searches use icontains'
+            ))
@@ -0,0 +1,46 @@
+"""
+Recompute the per-user statistics table from the source tables
+"""
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from main.user_stats import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Recompute UserStats from generated texts, log tables, rollups and the log archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=str,
+            metavar='USERNAME',
+            action='append',
+            help='Only reconcile this user (repeatable; default: everyone)'
+        )
+        parser.add_argument(
+            '--missing',
+            action='store_true',
+            help='Only create rows for users that have none yet (cheap enough to run from cron)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report rows that are missing or out of date'
+        )
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['user']:
+            user_ids = list(User.objects.filter(username__in=options['user']).values_list('pk', flat=True))
+            if len(user_ids) != len(set(options['user'])):
+                raise CommandError('Unknown username in --user')
+
+        dry_run = options['dry_run']
+        result = reconcile(user_ids, dry_run=dry_run, missing_only=options['missing'])
+        style = self.style.WARNING if dry_run else self.style.SUCCESS
+        verb = 'would be' if dry_run else 'were'
+        self.stdout.write(style(
+            f"Checked {result['checked']} users: {result['created']} rows {verb} created, "
+            f"{result['corrected']} {verb} corrected"
+        ))
@@ -0,0 +1,98 @@
+"""
+Management command that processes queued text generation jobs
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from main.jobs import claim_next_job, default_worker_id, requeue_stale_jobs, run_job
+from main.model_registry import ModelRegistry
+from main.models import GenerationJob
+
+
+class Command(BaseCommand):
+    help = 'Run a worker that pulls text generation jobs from the database queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to sleep when the queue is empty (default: 1.0)'
+        )
+        parser.add_argument(
+            '--max-jobs',
+            type=int,
+            default=0,
+            help='Exit after processing N jobs (default: 0, run forever)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process the jobs currently queued and exit'
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=3600,
+            help='Requeue running jobs started more than N seconds ago (default: 3600)'
+        )
+        parser.add_argument(
+            '--stale-check-interval',
+            type=float,
+            default=60.0,
+            help='Seconds between checks for stale running jobs (default: 60)'
+        )
+        parser.add_argument(
+            '--no-warmup',
+            action='store_true',
+            help='Load the model on the first job instead of at startup'
+        )
+
+    def handle(self, *args, **options):
+        worker_id = default_worker_id()
+        max_jobs = options['max_jobs']
+        processed = 0
+
+        self.requeue_stale(options['stale_after'])
+        last_stale_check = time.monotonic()
+
+        if not options['no_warmup']:
+            self.stdout.write('Loading language model...')
+            ModelRegistry.warm_up(background=False)
+            stats = ModelRegistry.get_stats()
+            self.stdout.write(f"Model loaded in {stats['load_seconds']:.1f}s")
+
+        self.stdout.write(self.style.SUCCESS(f"Worker {worker_id} waiting for jobs"))
+
+        try:
+            while not max_jobs or processed < max_jobs:
+                # Jobs of workers or streams that died are picked up while this worker runs
+                if time.monotonic() - last_stale_check >= options['stale_check_interval']:
+                    self.requeue_stale(options['stale_after'])
+                    last_stale_check = time.monotonic()
+
+                job = claim_next_job(worker_id)
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                started = time.perf_counter()
+                job = run_job(job)
+                processed += 1
+                elapsed = time.perf_counter() - started
+
+                if job.status == GenerationJob.STATUS_DONE:
+                    self.stdout.write(self.style.SUCCESS(f"Job {job.id} done in {elapsed:.1f}s"))
+                else:
+                    self.stdout.write(self.style.ERROR(f"Job {job.id} failed: {job.error}"))
+        except KeyboardInterrupt:
+            self.stdout.write('Interrupted')
+
+        self.stdout.write(f"Processed {processed} jobs")
+
+    def requeue_stale(self, stale_after):
+        requeued = requeue_stale_jobs(stale_after)
+        if requeued:
+            self.stdout.write(self.style.WARNING(f"Requeued {requeued} stale jobs"))
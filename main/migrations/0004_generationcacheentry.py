@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:26
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_generationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('input_text', models.TextField()),
+                ('num_sentences', models.PositiveIntegerField()),
+                ('length', models.PositiveIntegerField()),
+                ('model_version', models.CharField(max_length=100)),
+                ('result_text', models.TextField()),
+                ('size_bytes', models.PositiveIntegerField(default=0)),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Generation Cache Entry',
+                'verbose_name_plural': 'Generation Cache Entries',
+                'ordering': ['-last_used_at'],
+                'indexes': [models.Index(fields=['last_used_at'], name='main_genera_last_us_4bcbc4_idx')],
+            },
+        ),
+    ]
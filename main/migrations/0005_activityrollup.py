@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_generationcacheentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('login', 'Login'), ('logout', 'Logout'), ('generate_text', 'Generate Text'), ('view_history', 'View History'), ('view_transition_analysis', 'View Transition Analysis'), ('view_coherence_report', 'View Coherence Report'), ('register', 'Register'), ('profile_update', 'Profile Update'), ('password_change', 'Password Change')], max_length=50)),
+                ('subject', models.CharField(max_length=60)),
+                ('session_key', models.CharField(blank=True, max_length=40)),
+                ('hour', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='activity_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Activity Rollup',
+                'verbose_name_plural': 'Activity Rollups',
+                'ordering': ['-hour'],
+                'indexes': [models.Index(fields=['hour', 'action'], name='main_activi_hour_efe283_idx'), models.Index(fields=['user', '-hour'], name='main_activi_user_id_3a0dae_idx')],
+                'constraints': [models.UniqueConstraint(fields=('action', 'subject', 'hour'), name='unique_activity_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('main', '0005_activityrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_generations', models.PositiveIntegerField(default=0)),
+                ('total_activities', models.PositiveIntegerField(default=0)),
+                ('total_logins', models.PositiveIntegerField(default=0)),
+                ('action_counts', models.JSONField(blank=True, default=dict)),
+                ('last_login_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'User Statistics',
+                'verbose_name_plural': 'User Statistics',
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_userstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HourlyBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('metric', models.CharField(choices=[('login', 'Successful Logins'), ('activity', 'Activities'), ('generation', 'Generated Texts')], max_length=20)),
+                ('action', models.CharField(blank=True, max_length=50)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Hourly Bucket',
+                'verbose_name_plural': 'Hourly Buckets',
+                'ordering': ['-hour'],
+                'constraints': [models.UniqueConstraint(fields=('hour', 'metric', 'action'), name='unique_hourly_bucket')],
+            },
+        ),
+        migrations.CreateModel(
+            name='HourlyUserActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_activity', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Hourly User Activity',
+                'verbose_name_plural': 'Hourly User Activity',
+                'ordering': ['-hour'],
+                'indexes': [models.Index(fields=['user', 'hour'], name='main_hourly_user_id_cef9e9_idx')],
+                'constraints': [models.UniqueConstraint(fields=('hour', 'user'), name='unique_hourly_user_activity')],
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+from django.db import migrations
+
+# (FTS table, content table, columns); SQLite only, see main/search.py
+FTS_TABLES = (
+    ('main_generatedtext_fts', 'main_generatedtext', ('input_text', 'generated_text')),
+    ('main_useractivitylog_fts', 'main_useractivitylog', ('description',)),
+)
+
+
+def create_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, content, columns in FTS_TABLES:
+        names = ', '.join(columns)
+        new_values = ', '.join(f'new.{column}' for column in columns)
+        old_values = ', '.join(f'old.{column}' for column in columns)
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {table} USING fts5({names}, content='{content}', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {table}_ai AFTER INSERT ON {content} BEGIN "
+            f"INSERT INTO {table}(rowid, {names}) VALUES (new.id, {new_values}); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {table}_ad AFTER DELETE ON {content} BEGIN "
+            f"INSERT INTO {table}({table}, rowid, {names}) VALUES ('delete', old.id, {old_values}); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {table}_au AFTER UPDATE ON {content} BEGIN "
+            f"INSERT INTO {table}({table}, rowid, {names}) VALUES ('delete', old.id, {old_values}); "
+            f"INSERT INTO {table}(rowid, {names}) VALUES (new.id, {new_values}); END"
+        )
+        # Index the rows that already exist
+        schema_editor.execute(f"INSERT INTO {table}({table}) VALUES('rebuild')")
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, content, _ in FTS_TABLES:
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_{suffix}')
+        # Triggers added to monthly log partitions (main/partitions.py)
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name LIKE %s",
+                [f'{content}_p%']
+            )
+            for name, in cursor.fetchall():
+                schema_editor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {table}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_hourly_buckets'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
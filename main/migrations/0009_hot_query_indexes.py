@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_fulltext_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userloginlog',
+            index=models.Index(condition=models.Q(('login_successful', True)), fields=['user', '-login_time'], name='login_user_success_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userloginlog',
+            index=models.Index(condition=models.Q(('login_successful', True), ('logout_time__isnull', True)), fields=['user', '-login_time'], name='login_open_session_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_action_counts(apps, schema_editor):
+    UserStats = apps.get_model('main', 'UserStats')
+    UserActionCount = apps.get_model('main', 'UserActionCount')
+    rows = []
+    for user_id, counts in UserStats.objects.values_list('user_id', 'action_counts').iterator():
+        rows.extend(
+            UserActionCount(user_id=user_id, action=action, count=count)
+            for action, count in (counts or {}).items() if count
+        )
+    UserActionCount.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_cache_table'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserActionCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(max_length=50)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='action_counts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'User Action Count',
+                'verbose_name_plural': 'User Action Counts',
+                'constraints': [models.UniqueConstraint(fields=('user', 'action'), name='unique_user_action_count')],
+            },
+        ),
+        migrations.RunPython(copy_action_counts, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='userstats',
+            name='action_counts',
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_user_action_counts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='generatedtext',
+            index=models.Index(condition=models.Q(('user__isnull', True)), fields=['-created_at'], name='generated_anon_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useractivitylog',
+            index=models.Index(condition=models.Q(('user__isnull', True)), fields=['-timestamp'], name='activity_anon_time_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_anonymous_cleanup_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='useractivitylog',
+            index=models.Index(fields=['ip_address', '-timestamp'], name='main_userac_ip_addr_128b8a_idx'),
+        ),
+    ]
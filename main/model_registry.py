@@ -0,0 +1,167 @@
+"""
+Process-wide language model registry for Lgram Web
+"""
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+
+
+class ModelRegistry:
+    """
+    Loads the lgram language model once per worker process and hands the
+    shared instance out to every request thread
+    """
+
+    _lock = threading.Lock()
+    _model = None
+    _load_count = 0
+    _load_seconds: Optional[float] = None
+    _loaded_at: Optional[float] = None
+    _rss_before: Optional[int] = None
+    _rss_after: Optional[int] = None
+    _warmup_thread: Optional[threading.Thread] = None
+    _version: Optional[str] = None
+
+    @classmethod
+    def get_model(cls):
+        """
+        Return the shared language model, loading it on first use
+        """
+        model = cls._model
+        if model is not None:
+            return model
+
+        with cls._lock:
+            # Another thread may have finished loading while we waited
+            if cls._model is None:
+                cls._load()
+            return cls._model
+
+    @classmethod
+    def _load(cls) -> None:
+        """
+        Load the model; caller must hold the registry lock
+        """
+        from lgram.models.chunk import create_language_model
+
+        cls._rss_before = cls.get_rss_bytes()
+        started = time.perf_counter()
+        model = create_language_model()
+        cls._load_seconds = time.perf_counter() - started
+        cls._rss_after = cls.get_rss_bytes()
+        cls._loaded_at = time.time()
+        cls._load_count += 1
+        cls._model = model
+
+    @classmethod
+    def warm_up(cls, background: bool = True) -> None:
+        """
+        Start loading the model ahead of the first request
+        """
+        if cls._model is not None:
+            return
+        if not background:
+            cls.get_model()
+            return
+        with cls._lock:
+            if cls._warmup_thread is not None and cls._warmup_thread.is_alive():
+                return
+            cls._warmup_thread = threading.Thread(
+                target=cls._warm_up_quietly,
+                name='lgram-model-warmup',
+                daemon=True,
+            )
+            cls._warmup_thread.start()
+
+    @classmethod
+    def _warm_up_quietly(cls) -> None:
+        # A failed warm-up is retried by the first request that needs the model
+        try:
+            cls.get_model()
+            if getattr(settings, 'GRAMMAR_BATCHING_ENABLED', False):
+                # Check the batched grammar path before requests depend on it
+                from .grammar_batcher import supports_batching
+                supports_batching()
+        except Exception:
+            pass
+
+    @classmethod
+    def get_model_version(cls) -> str:
+        """
+        Identify the model build, so cached results are not reused across upgrades
+        """
+        if cls._version is None:
+            version = getattr(settings, 'LGRAM_MODEL_VERSION', None)
+            if not version:
+                try:
+                    from importlib.metadata import version as package_version
+                    version = package_version('centering-lgram')
+                except Exception:
+                    version = 'unknown'
+            cls._version = version
+        return cls._version
+
+    @classmethod
+    def is_loaded(cls) -> bool:
+        return cls._model is not None
+
+    @classmethod
+    def reset(cls) -> None:
+        """
+        Drop the loaded model so the next get_model() reloads it
+        """
+        with cls._lock:
+            cls._model = None
+            cls._load_seconds = None
+            cls._loaded_at = None
+            cls._rss_before = None
+            cls._rss_after = None
+
+    @staticmethod
+    def get_rss_bytes() -> Optional[int]:
+        """
+        Current resident set size of this process in bytes
+        """
+        try:
+            with open('/proc/self/statm') as statm:
+                resident_pages = int(statm.read().split()[1])
+            return resident_pages * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, IndexError):
+            pass
+        # Fall back to peak RSS where /proc is not available (KB on Linux, bytes on macOS)
+        try:
+            import resource
+        except ImportError:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Any]:
+        """
+        Load time and memory figures for the current worker
+        """
+        model_rss = None
+        if cls._rss_before is not None and cls._rss_after is not None:
+            model_rss = cls._rss_after - cls._rss_before
+        return {
+            'loaded': cls.is_loaded(),
+            'load_count': cls._load_count,
+            'load_seconds': cls._load_seconds,
+            'loaded_at': cls._loaded_at,
+            'model_rss_bytes': model_rss,
+            'process_rss_bytes': cls.get_rss_bytes(),
+            'pid': os.getpid(),
+        }
+
+
+def warm_up_if_enabled() -> None:
+    """
+    Called from MainConfig.ready(); honours the LGRAM_MODEL_WARMUP setting
+    """
+    if getattr(settings, 'LGRAM_MODEL_WARMUP', False):
+        ModelRegistry.warm_up(background=True)
@@ -1,6 +1,96 @@
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import Q
 from django.contrib.auth.models import User
 from django.utils import timezone
+from django.utils.functional import cached_property
+
+from . import partitions
+
+
+def _record_writes(model, rows):
+    """Yeni satırları UserStats ve saatlik toplamlara işler"""
+    from . import aggregates, user_stats
+    user_stats.record_rows(model, rows)
+    aggregates.record_rows(model, rows)
+
+
+class PartitionedLogManager(models.Manager):
+    """LOG_PARTITIONING_ENABLED açıkken yeni kayıtları aylık tablolara yazar"""
+
+    def __init__(self, time_field):
+        super().__init__()
+        self.time_field = time_field
+
+    def partitions(self):
+        return partitions.get_partitions(self.model, self.time_field)
+
+    def create(self, **kwargs):
+        if partitions.is_enabled():
+            row = self.partitions().create(**kwargs)
+        else:
+            row = super().create(**kwargs)
+        _record_writes(self.model, [row])
+        return row
+
+    def bulk_create(self, objs, *args, **kwargs):
+        if partitions.is_enabled():
+            rows = self.partitions().bulk_create(objs, **kwargs)
+        else:
+            rows = super().bulk_create(objs, *args, **kwargs)
+        _record_writes(self.model, rows)
+        return rows
+
+    def across_partitions(self, start=None, end=None):
+        """Aralıkla kesişen tüm aylık tablolar ve ana tablo üzerinde sorgu"""
+        log_partitions = self.partitions()
+        return partitions.PartitionSet(log_partitions, log_partitions.querysets(start, end))
+
+    def combined(self):
+        """Ana tablo ve tüm aylık tablolar üzerinde tek bir QuerySet (görünüm); admin ve arama için"""
+        return self.partitions().combined()
+
+
+def delete_partitioned_logs(sender, instance, **kwargs):
+    """Silinen kullanıcının aylık tablolardaki log kayıtlarını siler (silme toplayıcısı bu tabloları görmez)"""
+    for model in (UserLoginLog, UserActivityLog):
+        model.objects.partitions().delete_user_rows(instance.pk)
+
+
+def delete_archived_logs(sender, instance, **kwargs):
+    """Silinen kullanıcının arşivlenmiş log kayıtlarını, silme işlemi kalıcılaşınca arşiv dosyalarından siler"""
+    from .log_archive import KINDS, LogArchive
+
+    user_id = instance.pk
+    transaction.on_commit(lambda: [LogArchive(kind).delete_user(user_id) for kind in KINDS])
+
+
+def drop_log_views(sender, **kwargs):
+    """Migrasyonlardan önce birleşik log görünümlerini kaldırır (SQLite tabloyu yeniden oluştururken görünüm hata verir)"""
+    for model in (UserLoginLog, UserActivityLog):
+        model.objects.partitions().drop_view()
+
+
+def create_log_views(sender, **kwargs):
+    """Migrasyonlardan sonra aylık tablo varsa birleşik log görünümlerini yeniden oluşturur"""
+    tables = connection.introspection.table_names()
+    for model in (UserLoginLog, UserActivityLog):
+        log_partitions = model.objects.partitions()
+        if model._meta.db_table in tables and log_partitions.suffixes(refresh=True):
+            log_partitions.refresh_view()
+
+
+class GeneratedTextManager(models.Manager):
+    """Yeni metinleri UserStats ve saatlik toplamlara işler"""
+
+    def create(self, **kwargs):
+        row = super().create(**kwargs)
+        _record_writes(self.model, [row])
+        return row
+
+    def bulk_create(self, objs, *args, **kwargs):
+        rows = super().bulk_create(objs, *args, **kwargs)
+        _record_writes(self.model, rows)
+        return rows
 
 
 class UserLoginLog(models.Model):
@@ -13,10 +103,19 @@ class UserLoginLog(models.Model):
     login_successful = models.BooleanField(default=True)
     logout_time = models.DateTimeField(null=True, blank=True)
     
+    objects = PartitionedLogManager('login_time')
+    
     class Meta:
         ordering = ['-login_time']
         verbose_name = 'User Login Log'
         verbose_name_plural = 'User Login Logs'
+        indexes = [
+            models.Index(fields=['user', '-login_time'], name='login_user_success_idx',
+                         condition=Q(login_successful=True)),
+            # Sessions still open, for log_user_logout
+            models.Index(fields=['user', '-login_time'], name='login_open_session_idx',
+                         condition=Q(login_successful=True, logout_time__isnull=True)),
+        ]
     
     def __str__(self):
         status = "Successful" if self.login_successful else "Failed"
@@ -46,6 +145,8 @@ class UserActivityLog(models.Model):
     timestamp = models.DateTimeField(default=timezone.now)
     additional_data = models.JSONField(default=dict, blank=True)  # Ekstra veri için
     
+    objects = PartitionedLogManager('timestamp')
+    
     class Meta:
         ordering = ['-timestamp']
         verbose_name = 'User Activity Log'
@@ -54,6 +155,10 @@ class UserActivityLog(models.Model):
             models.Index(fields=['user', '-timestamp']),
             models.Index(fields=['action', '-timestamp']),
             models.Index(fields=['session_key', '-timestamp']),
+            # Exact IP searches in the admin
+            models.Index(fields=['ip_address', '-timestamp']),
+            # Anonymous rows, for cleanup_sessions
+            models.Index(fields=['-timestamp'], name='activity_anon_time_idx', condition=Q(user__isnull=True)),
         ]
     
     def __str__(self):
@@ -70,6 +175,8 @@ class GeneratedText(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     
+    objects = GeneratedTextManager()
+    
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Generated Text'
@@ -77,8 +184,198 @@ class GeneratedText(models.Model):
         indexes = [
             models.Index(fields=['user', '-created_at']),
             models.Index(fields=['session_key', '-created_at']),
+            # Anonymous rows, for cleanup_sessions
+            models.Index(fields=['-created_at'], name='generated_anon_time_idx', condition=Q(user__isnull=True)),
         ]
 
     def __str__(self):
         user_info = self.user.username if self.user else f"Session: {self.session_key[:8]}..."
         return f"{user_info} - {self.input_text[:30]}... -> {self.generated_text[:30]}..."
+
+
+class GenerationJob(models.Model):
+    """Arka planda çalışan metin üretim işleri"""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='generation_jobs', null=True, blank=True)
+    session_key = models.CharField(max_length=40, db_index=True)
+    input_text = models.TextField()
+    num_sentences = models.PositiveIntegerField(default=5)
+    length = models.PositiveIntegerField(default=13)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    result_text = models.TextField(blank=True)
+    error = models.TextField(blank=True)
+    generated_text = models.ForeignKey(GeneratedText, on_delete=models.SET_NULL, related_name='jobs', null=True, blank=True)
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    user_agent = models.TextField(blank=True)
+    worker_id = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Generation Job'
+        verbose_name_plural = 'Generation Jobs'
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        user_info = self.user.username if self.user else f"Session: {self.session_key[:8]}..."
+        return f"{user_info} - {self.get_status_display()} - {self.input_text[:30]}..."
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+
+class GenerationCacheEntry(models.Model):
+    """Aynı girdi ve ayarlar için önceden üretilmiş metinler"""
+    key = models.CharField(max_length=64, unique=True)
+    input_text = models.TextField()
+    num_sentences = models.PositiveIntegerField()
+    length = models.PositiveIntegerField()
+    model_version = models.CharField(max_length=100)
+    result_text = models.TextField()
+    size_bytes = models.PositiveIntegerField(default=0)
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    last_used_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-last_used_at']
+        verbose_name = 'Generation Cache Entry'
+        verbose_name_plural = 'Generation Cache Entries'
+        indexes = [
+            models.Index(fields=['last_used_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.key[:12]}... - {self.input_text[:30]}... ({self.hit_count} hits)"
+
+
+class ActivityRollup(models.Model):
+    """Sayfa ziyareti gibi sık olayların saatlik sayaçları"""
+    action = models.CharField(max_length=50, choices=UserActivityLog.ACTION_CHOICES)
+    # 'user:<id>' ya da 'session:<key>'; benzersizlik kısıtı NULL kullanıcılarla da çalışsın diye
+    subject = models.CharField(max_length=60)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activity_rollups', null=True, blank=True)
+    session_key = models.CharField(max_length=40, blank=True)
+    hour = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-hour']
+        verbose_name = 'Activity Rollup'
+        verbose_name_plural = 'Activity Rollups'
+        constraints = [
+            models.UniqueConstraint(fields=['action', 'subject', 'hour'], name='unique_activity_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['hour', 'action']),
+            models.Index(fields=['user', '-hour']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} - {self.get_action_display()} - {self.hour.strftime('%Y-%m-%d %H:00')} ({self.count})"
+
+
+class HourlyBucket(models.Model):
+    """Saatlik toplamlar: girişler, eyleme göre aktiviteler ve metin üretimleri"""
+    METRIC_LOGIN = 'login'
+    METRIC_ACTIVITY = 'activity'
+    METRIC_GENERATION = 'generation'
+    METRIC_CHOICES = [
+        (METRIC_LOGIN, 'Successful Logins'),
+        (METRIC_ACTIVITY, 'Activities'),
+        (METRIC_GENERATION, 'Generated Texts'),
+    ]
+
+    hour = models.DateTimeField()
+    metric = models.CharField(max_length=20, choices=METRIC_CHOICES)
+    action = models.CharField(max_length=50, blank=True)  # Yalnızca aktiviteler için
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-hour']
+        verbose_name = 'Hourly Bucket'
+        verbose_name_plural = 'Hourly Buckets'
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'metric', 'action'], name='unique_hourly_bucket'),
+        ]
+
+    def __str__(self):
+        label = f"{self.metric}:{self.action}" if self.action else self.metric
+        return f"{self.hour.strftime('%Y-%m-%d %H:00')} - {label} ({self.count})"
+
+
+class HourlyUserActivity(models.Model):
+    """Kullanıcı başına saatlik aktivite sayısı (tekil kullanıcı ve en aktif kullanıcılar için)"""
+    hour = models.DateTimeField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='hourly_activity')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-hour']
+        verbose_name = 'Hourly User Activity'
+        verbose_name_plural = 'Hourly User Activity'
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'user'], name='unique_hourly_user_activity'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'hour']),
+        ]
+
+    def __str__(self):
+        return f"{self.hour.strftime('%Y-%m-%d %H:00')} - {self.user.username} ({self.count})"
+
+class UserStats(models.Model):
+    """Kullanıcı başına sürekli güncellenen toplamlar; reconcile_user_stats kaynak tablolardan yeniden hesaplar"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    total_generations = models.PositiveIntegerField(default=0)
+    total_activities = models.PositiveIntegerField(default=0)  # Saatlik sayaçlardaki sayfa ziyaretleri dahil
+    total_logins = models.PositiveIntegerField(default=0)  # Yalnızca başarılı girişler
+    last_login_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'User Statistics'
+        verbose_name_plural = 'User Statistics'
+
+    def __str__(self):
+        return f"{self.user.username} - {self.total_activities} activities, {self.total_generations} generations"
+
+    @cached_property
+    def action_counts(self):
+        return dict(UserActionCount.objects.filter(user_id=self.pk).values_list('action', 'count'))
+
+    @property
+    def text_generations(self):
+        return self.action_counts.get('generate_text', 0)
+
+
+class UserActionCount(models.Model):
+    """Kullanıcı ve eylem başına etkinlik sayısı; eşzamanlı yazarlar count = count + n ile artırır"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='action_counts')
+    action = models.CharField(max_length=50)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'User Action Count'
+        verbose_name_plural = 'User Action Counts'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'action'], name='unique_user_action_count'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.action} ({self.count})"
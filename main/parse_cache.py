@@ -0,0 +1,340 @@
+"""
+Parse-artifact cache shared by the analysis views
+
+Documents are keyed by a hash of their text. Each ParsedDocument computes
+its artifacts (transition frame, per-sentence entities) on first use, so a
+text posted to /transition-analysis/ and then /coherence-report/ is only
+parsed once. The transition frame is one artifact per document, whatever
+sentence window a view summarizes it with. Entities need dependency roles,
+which analyze_transitions does not return, so they come from a spaCy pass
+over the same sentences. The memory tier is an LRU bounded by entry
+count and total text size; an optional on-disk tier (PARSE_CACHE_DIR)
+keeps documents across worker restarts.
+
+Artifacts are also cached per sentence (SentenceCache), so an edited
+draft only re-parses the changed sentences and, for transitions, the
+pairs whose context window contains them.
+"""
+import bisect
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+
+from .analysis import (
+    SENTENCE_COLUMNS, check_transition_columns, extract_entities, run_analyze_transitions, split_sentences
+)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def sentence_hash(sentence: str) -> str:
+    return hashlib.blake2b(sentence.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _runs(indices):
+    """
+    Group sorted indices into (first, last) runs of consecutive values
+    """
+    runs = []
+    for index in indices:
+        if runs and index == runs[-1][1] + 1:
+            runs[-1][1] = index
+        else:
+            runs.append([index, index])
+    return runs
+
+
+class SentenceCache:
+    """
+    LRU of per-sentence artifacts keyed by sentence (or sentence window) hash
+    """
+
+    _lock = threading.Lock()
+    _entries: 'OrderedDict[str, Any]' = OrderedDict()
+    _counters = {'hits': 0, 'misses': 0}
+
+    @classmethod
+    def get_many(cls, keys) -> Dict[str, Any]:
+        found = {}
+        with cls._lock:
+            for key in keys:
+                if key in cls._entries:
+                    cls._entries.move_to_end(key)
+                    found[key] = cls._entries[key]
+            cls._counters['hits'] += len(found)
+            cls._counters['misses'] += len(keys) - len(found)
+        return found
+
+    @classmethod
+    def set_many(cls, values: Dict[str, Any]) -> None:
+        max_entries = getattr(settings, 'PARSE_CACHE_MAX_SENTENCES', 20_000)
+        with cls._lock:
+            for key, value in values.items():
+                cls._entries[key] = value
+                cls._entries.move_to_end(key)
+            while len(cls._entries) > max_entries:
+                cls._entries.popitem(last=False)
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            cls._entries.clear()
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Any]:
+        with cls._lock:
+            stats = dict(cls._counters)
+            stats['entries'] = len(cls._entries)
+        return stats
+
+
+class ParsedDocument:
+    """
+    A text plus the parse artifacts computed for it so far
+    """
+
+    def __init__(self, text: str):
+        self.key = content_hash(text)
+        self.text = text
+        self.sentences = split_sentences(text)
+        self.sentence_hashes = [sentence_hash(sentence) for sentence in self.sentences]
+        self.artifacts: Dict[str, Any] = {}
+        self.dirty = True
+
+    def _artifact(self, name, compute):
+        if name not in self.artifacts:
+            self.artifacts[name] = compute()
+            self.dirty = True
+        return self.artifacts[name]
+
+    def get_transitions(self):
+        """
+        Centering transitions DataFrame from lgram's analyze_transitions
+
+        One artifact per document, shared by every view and sentence window:
+        the window only changes how the rows are summarized. The row for
+        sentence pair (i, i+1) is reused from any earlier text whose
+        PARSE_CACHE_TRANSITION_CONTEXT preceding sentences and the pair
+        itself are identical.
+        """
+        return self._artifact('transitions', lambda: self._incremental_transitions(self._context()))
+
+    def get_entities(self):
+        """
+        Per-sentence (lemma, role, is_pronoun) entity mentions
+        """
+        return self._artifact('entities', self._incremental_entities)
+
+    def get_transition_stats(self) -> Dict[str, int]:
+        """
+        How many transition rows were reused versus recomputed for this document
+        """
+        return self.artifacts.get('transition_stats', {})
+
+    @staticmethod
+    def _context() -> int:
+        return max(0, int(getattr(settings, 'PARSE_CACHE_TRANSITION_CONTEXT', 3)))
+
+    def _pair_key(self, index: int, context: int) -> str:
+        window = self.sentence_hashes[max(0, index - context):index + 2]
+        return 'pair:' + sentence_hash(':'.join(window))
+
+    def _incremental_transitions(self, context: int):
+        import pandas as pd
+
+        keys = [self._pair_key(index, context) for index in range(max(0, len(self.sentences) - 1))]
+        rows = SentenceCache.get_many(keys)
+        missing = [index for index, key in enumerate(keys) if key not in rows]
+
+        for first, last in _runs(missing):
+            chunk_start = max(0, first - context)
+            whole_text = chunk_start == 0 and last + 2 >= len(self.sentences)
+            frame = run_analyze_transitions(self.text if whole_text else ' '.join(self.sentences[chunk_start:last + 2]))
+            if len(frame) != last + 1 - chunk_start:
+                # lgram split the text differently from split_sentences: use its rows for the whole
+                # text as they are, and cache those of the pairs both splits agree on
+                if not whole_text:
+                    frame = run_analyze_transitions(self.text)
+                SentenceCache.set_many(self._aligned_rows(frame, keys))
+                self.artifacts['transition_stats'] = {'pairs': len(keys), 'recomputed': len(keys)}
+                return frame
+            computed = dict(zip(keys[first:last + 1], frame.iloc[first - chunk_start:].to_dict('records')))
+            rows.update(computed)
+            SentenceCache.set_many(computed)
+
+        self.artifacts['transition_stats'] = {'pairs': len(keys), 'recomputed': len(missing)}
+        return pd.DataFrame([rows[key] for key in keys])
+
+    def _aligned_rows(self, frame, keys) -> Dict[str, Any]:
+        """
+        Rows of a whole-text frame keyed like ``keys``, for the pairs whose sentences match split_sentences
+        """
+        check_transition_columns(frame)
+        if frame.empty:
+            return {}
+        positions: Dict[tuple, list] = {}
+        for index in range(len(keys)):
+            positions.setdefault((self.sentences[index], self.sentences[index + 1]), []).append(index)
+
+        current_column, next_column = SENTENCE_COLUMNS
+        aligned = {}
+        start = 0
+        for row in frame.to_dict('records'):
+            candidates = positions.get((str(row[current_column]).strip(), str(row[next_column]).strip()), [])
+            found = bisect.bisect_left(candidates, start)
+            if found < len(candidates):
+                aligned[keys[candidates[found]]] = row
+                start = candidates[found] + 1
+        return aligned
+
+    def _incremental_entities(self):
+        keys = ['entities:' + digest for digest in self.sentence_hashes]
+        mentions = SentenceCache.get_many(keys)
+        missing = [index for index, key in enumerate(keys) if key not in mentions]
+        if missing:
+            extracted = extract_entities([self.sentences[index] for index in missing])
+            computed = {keys[index]: sentence_mentions for index, sentence_mentions in zip(missing, extracted)}
+            mentions.update(computed)
+            SentenceCache.set_many(computed)
+        return [mentions[key] for key in keys]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['dirty'] = False
+        return state
+
+
+class ParseCache:
+    """
+    Content-addressed LRU of ParsedDocument objects with an optional disk tier
+    """
+
+    _lock = threading.Lock()
+    _memory: 'OrderedDict[str, ParsedDocument]' = OrderedDict()
+    _memory_chars = 0
+    _counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+    @classmethod
+    def get_or_parse(cls, text: str, max_sentences: Optional[int] = None) -> ParsedDocument:
+        """
+        Cached document for this text, or a fresh one whose artifacts are computed on demand
+
+        With ``max_sentences`` the document holds only the first sentences of the text, so nothing
+        past them is ever parsed; its per-sentence artifacts are shared with the full text's.
+        """
+        if max_sentences is not None:
+            sentences = split_sentences(text)
+            if len(sentences) > max_sentences:
+                text = ' '.join(sentences[:max_sentences])
+        key = content_hash(text)
+        with cls._lock:
+            document = cls._memory.get(key)
+            if document is not None:
+                cls._memory.move_to_end(key)
+                cls._counters['memory_hits'] += 1
+                return document
+
+        document = cls._load_from_disk(key)
+        with cls._lock:
+            if document is not None:
+                cls._counters['disk_hits'] += 1
+            else:
+                cls._counters['misses'] += 1
+                document = ParsedDocument(text)
+            cls._remember(document)
+        return document
+
+    @classmethod
+    def _remember(cls, document: ParsedDocument) -> None:
+        """
+        Insert into the memory tier and evict least recently used documents;
+        caller must hold the lock
+        """
+        max_entries = getattr(settings, 'PARSE_CACHE_MAX_ENTRIES', 64)
+        max_chars = getattr(settings, 'PARSE_CACHE_MAX_CHARS', 2_000_000)
+
+        previous = cls._memory.pop(document.key, None)
+        if previous is not None:
+            cls._memory_chars -= len(previous.text)
+        cls._memory[document.key] = document
+        cls._memory_chars += len(document.text)
+
+        while len(cls._memory) > 1 and (len(cls._memory) > max_entries or cls._memory_chars > max_chars):
+            _, evicted = cls._memory.popitem(last=False)
+            cls._memory_chars -= len(evicted.text)
+            cls._counters['evictions'] += 1
+
+    @staticmethod
+    def _disk_dir() -> Optional[str]:
+        return getattr(settings, 'PARSE_CACHE_DIR', None)
+
+    @classmethod
+    def _load_from_disk(cls, key: str) -> Optional[ParsedDocument]:
+        directory = cls._disk_dir()
+        if not directory:
+            return None
+        path = os.path.join(directory, f'{key}.pkl')
+        try:
+            with open(path, 'rb') as handle:
+                document = pickle.load(handle)
+            os.utime(path)  # Mark as recently used for eviction
+            return document
+        except Exception:
+            # Missing, truncated or stale files are treated as a miss
+            return None
+
+    @classmethod
+    def save(cls, document: ParsedDocument) -> None:
+        """
+        Write a document with newly computed artifacts to the disk tier
+        """
+        directory = cls._disk_dir()
+        if not directory or not document.dirty:
+            return
+        os.makedirs(directory, exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as temp_file:
+                pickle.dump(document, temp_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, os.path.join(directory, f'{document.key}.pkl'))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            return
+        document.dirty = False
+        cls._evict_disk(directory)
+
+    @classmethod
+    def _evict_disk(cls, directory: str) -> None:
+        max_files = getattr(settings, 'PARSE_CACHE_DISK_MAX_FILES', 1000)
+        entries = [entry for entry in os.scandir(directory) if entry.name.endswith('.pkl')]
+        if len(entries) <= max_files:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - max_files]:
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            cls._memory.clear()
+            cls._memory_chars = 0
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Any]:
+        with cls._lock:
+            stats = dict(cls._counters)
+            stats['memory_entries'] = len(cls._memory)
+            stats['memory_chars'] = cls._memory_chars
+        return stats
@@ -0,0 +1,481 @@
+"""
+Monthly partitions for the login and activity log tables
+
+With LOG_PARTITIONING_ENABLED, rows written through UserActivityLog.objects
+and UserLoginLog.objects go to one table per calendar month, e.g.
+main_useractivitylog_p202610, cloned from the base model as an unmanaged
+model. Tables are created ahead of time by ``create_log_partitions`` (run it
+from cron, e.g. daily, and after migrating: it also adds indexes new in the
+base model to existing partitions); the write path never runs DDL, and rows
+for a month whose table does not exist yet are written to the base table.
+Reads go through
+``Model.objects.across_partitions(start, end)``, which fans out over the
+partitions overlapping the range plus the base table, where rows written
+before partitioning stay. Retention drops whole partition tables, so its
+cost depends on the number of months rather than the number of rows.
+
+Each partition numbers its rows from its own id range (YYYYMM * ID_SPAN),
+so a primary key is unique across the base table and every partition and
+tells which table holds the row (``model_for_pk``). The view
+``<base table>_all`` (UNION ALL of the base table and the partitions,
+recreated whenever a partition is created or dropped) gives the admin and
+full-text search one queryset over every row: ``Model.objects.combined()``.
+SQLite answers ordered, limited queries on it by merging the per-table
+indexes, without a sort.
+
+Partition models are built lazily and are not part of the migrations, so
+Django's delete collector does not see partition rows; deleting a User
+removes them through a pre_delete handler (models.delete_partitioned_logs).
+"""
+import heapq
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DatabaseError, connection, models
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Ids per partition; partition 'YYYYMM' numbers its rows from YYYYMM * ID_SPAN
+ID_SPAN = 10 ** 10
+
+
+def is_enabled() -> bool:
+    return getattr(settings, 'LOG_PARTITIONING_ENABLED', False)
+
+
+def month_start(moment: datetime) -> datetime:
+    moment = timezone.localtime(moment) if timezone.is_aware(moment) else moment
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(start: datetime) -> datetime:
+    return start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+
+
+class LogPartitions:
+    """
+    Partition tables of one log model, keyed by 'YYYYMM'
+    """
+
+    def __init__(self, base_model, time_field: str):
+        self.base_model = base_model
+        self.time_field = time_field
+        self.prefix = f'{base_model._meta.db_table}_p'
+        self.view_name = f'{base_model._meta.db_table}_all'
+        self._pattern = re.compile(re.escape(self.prefix) + r'(\d{6})$')
+        self._lock = threading.Lock()
+        self._models: Dict[str, type] = {}
+        self._existing: Optional[set] = None
+        self._has_view = False
+        self._view_model = None
+        self._listed_at = 0.0
+        self._warned: set = set()
+
+    # Partition models and tables
+
+    def suffix_for(self, moment: datetime) -> str:
+        return month_start(moment).strftime('%Y%m')
+
+    def model_for(self, suffix: str):
+        """
+        Unmanaged model class mapped to the partition table for 'YYYYMM'
+        """
+        with self._lock:
+            model = self._models.get(suffix)
+            if model is None:
+                model = self._build_model(suffix)
+                self._models[suffix] = model
+            return model
+
+    def _build_model(self, suffix: str):
+        base = self.base_model
+        return self._clone(
+            f'{base.__name__}P{suffix}',
+            f'{self.prefix}{suffix}',
+            f'{base._meta.verbose_name} {suffix}',
+            [
+                *(models.Index(fields=[field.name]) for field in base._meta.local_fields if field.db_index),
+                *(self._partition_index(index, suffix) for index in base._meta.indexes),
+            ],
+        )
+
+    def _clone(self, name: str, db_table: str, verbose_name: str, indexes: list):
+        """
+        Unmanaged copy of the base model mapped to ``db_table``
+        """
+        base = self.base_model
+        registered = apps.all_models[base._meta.app_label].get(name.lower())
+        if registered is not None:
+            return registered
+
+        attrs = {'__module__': base.__module__, '__str__': base.__str__}
+        for field in base._meta.local_fields:
+            _, path, args, kwargs = field.deconstruct()
+            if field.is_relation:
+                kwargs['related_name'] = '+'
+            attrs[field.name] = field.__class__(*args, **kwargs)
+        attrs['Meta'] = type('Meta', (), {
+            'app_label': base._meta.app_label,
+            'db_table': db_table,
+            'managed': False,
+            'ordering': base._meta.ordering,
+            'indexes': indexes,
+            'verbose_name': verbose_name,
+        })
+        return type(name, (models.Model,), attrs)
+
+    def model_for_pk(self, pk: int):
+        """
+        Model of the table holding the row with this primary key (see ID_SPAN)
+        """
+        suffix = pk // ID_SPAN
+        return self.model_for(f'{suffix:06d}') if suffix else self.base_model
+
+    @staticmethod
+    def _partition_index(index, suffix: str):
+        if index.condition is None:
+            return models.Index(fields=index.fields)
+        # Partial indexes need an explicit name, unique across the database
+        return models.Index(fields=index.fields, condition=index.condition, name=f'{index.name[:23]}_{suffix}')
+
+    def suffixes(self, refresh: bool = False) -> List[str]:
+        """
+        Existing partitions, oldest first (table list is re-read every LOG_PARTITION_LIST_SECONDS)
+        """
+        ttl = getattr(settings, 'LOG_PARTITION_LIST_SECONDS', 60)
+        with self._lock:
+            if refresh or self._existing is None or time.monotonic() - self._listed_at > ttl:
+                found = set()
+                tables = connection.introspection.table_names(include_views=True)
+                for table in tables:
+                    match = self._pattern.match(table)
+                    if match:
+                        found.add(match.group(1))
+                self._existing = found
+                self._has_view = self.view_name in tables
+                self._listed_at = time.monotonic()
+            return sorted(self._existing)
+
+    def ensure(self, suffix: str):
+        """
+        Partition model for 'YYYYMM', creating its table if needed
+
+        Runs DDL, which SQLite refuses inside a transaction; only call it from
+        commands (create_log_partitions), never on the request write path.
+        """
+        model = self.model_for(suffix)
+        if suffix in self.suffixes():
+            return model
+        try:
+            with connection.schema_editor() as editor:
+                editor.create_model(model)
+                # create_model() skips the indexes of unmanaged models
+                for index in model._meta.indexes:
+                    editor.add_index(model, index)
+        except DatabaseError:
+            # Another worker created it first
+            if model._meta.db_table not in connection.introspection.table_names():
+                raise
+        from . import search
+        self.assign_ids(suffix)
+        search.index_partition(self.base_model, model)
+        with self._lock:
+            self._existing.add(suffix)
+        self.refresh_view()
+        return model
+
+    def assign_ids(self, suffix: str) -> int:
+        """
+        Move the partition's rows into its id range and start its sequence there; returns how many rows moved
+
+        Partitions created before id ranges existed numbered their rows from 1,
+        like the base table; create_log_partitions renumbers them.
+        """
+        table = connection.ops.quote_name(f'{self.prefix}{suffix}')
+        first = int(suffix) * ID_SPAN
+        with connection.cursor() as cursor:
+            cursor.execute(f'UPDATE {table} SET id = id + %s WHERE id < %s', [first, first])
+            moved = cursor.rowcount
+            if connection.vendor == 'sqlite':
+                cursor.execute('DELETE FROM sqlite_sequence WHERE name = %s', [f'{self.prefix}{suffix}'])
+                cursor.execute(
+                    f'INSERT INTO sqlite_sequence (name, seq) SELECT %s, max(coalesce(max(id), 0), %s) FROM {table}',
+                    [f'{self.prefix}{suffix}', first]
+                )
+            elif connection.vendor == 'postgresql':
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence(%s, 'id'), greatest(coalesce(max(id), 0), %s)) FROM {table}",
+                    [f'{self.prefix}{suffix}', first]
+                )
+            else:
+                logger.warning('Cannot set the id range of %s%s on %s', self.prefix, suffix, connection.vendor)
+        return moved
+
+    # The combined view
+
+    def view_model(self):
+        """
+        Unmanaged model mapped to the view over the base table and every partition
+        """
+        with self._lock:
+            if self._view_model is None:
+                base = self.base_model
+                self._view_model = self._clone(f'{base.__name__}All', self.view_name, base._meta.verbose_name, [])
+            return self._view_model
+
+    def refresh_view(self) -> None:
+        """
+        Recreate the view so it covers the current partitions (and the base model's current columns)
+        """
+        columns = ', '.join(
+            connection.ops.quote_name(field.column) for field in self.base_model._meta.concrete_fields
+        )
+        tables = [self.base_model._meta.db_table] + [f'{self.prefix}{suffix}' for suffix in self.suffixes(refresh=True)]
+        view = connection.ops.quote_name(self.view_name)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP VIEW IF EXISTS {view}')
+            cursor.execute(f'CREATE VIEW {view} AS ' + ' UNION ALL '.join(
+                f'SELECT {columns} FROM {connection.ops.quote_name(table)}' for table in tables
+            ))
+        with self._lock:
+            self._has_view = True
+
+    def drop_view(self) -> None:
+        """
+        Drop the view; SQLite refuses to rename or drop a table a view refers to (migrations remaking the base table)
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP VIEW IF EXISTS {connection.ops.quote_name(self.view_name)}')
+        with self._lock:
+            self._has_view = False
+
+    def combined(self):
+        """
+        Queryset over the base table and every partition (the view), or the base table before the view exists
+        """
+        self.suffixes()
+        if self._has_view:
+            return self.view_model()._default_manager.all()
+        return self.base_model._default_manager.get_queryset()
+
+    def create_ahead(self, months: int = 1) -> List[str]:
+        """
+        Create the partitions of the current month and the next ``months``; returns the new ones
+        """
+        start = month_start(timezone.now())
+        existing = set(self.suffixes())
+        created = []
+        for _ in range(months + 1):
+            suffix = start.strftime('%Y%m')
+            if suffix not in existing:
+                self.ensure(suffix)
+                created.append(suffix)
+            start = next_month(start)
+        return created
+
+    def add_missing_indexes(self, schema_editor=None) -> int:
+        """
+        Create indexes the existing partition tables lack (new in the base model); returns how many
+        """
+        added = 0
+        for suffix in self.suffixes():
+            model = self.model_for(suffix)
+            with connection.cursor() as cursor:
+                existing = set(connection.introspection.get_constraints(cursor, model._meta.db_table))
+            missing = [index for index in model._meta.indexes if index.name not in existing]
+            if not missing:
+                continue
+            if schema_editor is None:
+                with connection.schema_editor() as editor:
+                    for index in missing:
+                        editor.add_index(model, index)
+            else:
+                for index in missing:
+                    schema_editor.add_index(model, index)
+            added += len(missing)
+        return added
+
+    # Writes
+
+    def _copy(self, model, instance):
+        values = {
+            field.attname: getattr(instance, field.attname)
+            for field in self.base_model._meta.concrete_fields if not field.primary_key
+        }
+        return model(**values)
+
+    def _target(self, suffix: str):
+        """
+        Partition model for 'YYYYMM', or None if its table has not been created yet
+        """
+        if suffix in self.suffixes():
+            return self.model_for(suffix)
+        if suffix not in self._warned:
+            self._warned.add(suffix)
+            logger.warning('Partition %s%s does not exist; writing to the base table (run create_log_partitions)',
+                           self.prefix, suffix)
+        return None
+
+    def create(self, **kwargs):
+        moment = kwargs.get(self.time_field) or timezone.now()
+        kwargs[self.time_field] = moment
+        model = self._target(self.suffix_for(moment))
+        if model is None:
+            return self.base_model._base_manager.create(**kwargs)
+        return model.objects.create(**kwargs)
+
+    def bulk_create(self, instances, **kwargs) -> list:
+        by_suffix: Dict[str, list] = {}
+        for instance in instances:
+            moment = getattr(instance, self.time_field) or timezone.now()
+            by_suffix.setdefault(self.suffix_for(moment), []).append(instance)
+        created = []
+        for suffix, group in by_suffix.items():
+            model = self._target(suffix)
+            if model is None:
+                created.extend(self.base_model._base_manager.bulk_create(group, **kwargs))
+            else:
+                created.extend(model.objects.bulk_create([self._copy(model, instance) for instance in group], **kwargs))
+        return created
+
+    def delete_user_rows(self, user_id: int) -> int:
+        """
+        Delete one user's rows from every partition; returns how many
+        """
+        deleted = 0
+        for suffix in self.suffixes(refresh=True):
+            count, _ = self.model_for(suffix)._base_manager.filter(user_id=user_id).delete()
+            deleted += count
+        return deleted
+
+    # Reads and retention
+
+    def querysets(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> list:
+        """
+        One queryset per partition overlapping [start, end), newest first, then the base table
+        """
+        querysets = []
+        for suffix in reversed(self.suffixes()):
+            first = datetime.strptime(suffix, '%Y%m')
+            if settings.USE_TZ:
+                first = timezone.make_aware(first)
+            if end is not None and first >= end:
+                continue
+            if start is not None and next_month(first) <= start:
+                continue
+            querysets.append(self.model_for(suffix).objects.all())
+        querysets.append(self.base_model._default_manager.get_queryset())
+
+        bounds = {}
+        if start is not None:
+            bounds[f'{self.time_field}__gte'] = start
+        if end is not None:
+            bounds[f'{self.time_field}__lt'] = end
+        return [queryset.filter(**bounds) if bounds else queryset for queryset in querysets]
+
+    def drop_before(self, cutoff: datetime) -> List[Tuple[str, int]]:
+        """
+        Drop every partition whose whole month is older than ``cutoff``
+        """
+        from . import search
+        limit = self.suffix_for(cutoff)
+        dropped = []
+        for suffix in self.suffixes():
+            if suffix >= limit:
+                break
+            model = self.model_for(suffix)
+            rows = model.objects.count()
+            search.unindex_partition(self.base_model, model)
+            # The view must not refer to the table while it is dropped
+            self.drop_view()
+            with connection.schema_editor() as editor:
+                editor.delete_model(model)
+            with self._lock:
+                self._existing.discard(suffix)
+            dropped.append((model._meta.db_table, rows))
+        if dropped:
+            self.refresh_view()
+        return dropped
+
+
+class PartitionSet:
+    """
+    The same filter applied to every partition of a log model
+    """
+
+    def __init__(self, partitions: LogPartitions, querysets: list):
+        self.partitions = partitions
+        self.querysets = querysets
+        self.model = partitions.base_model
+
+    def filter(self, *args, **kwargs) -> 'PartitionSet':
+        return PartitionSet(self.partitions, [queryset.filter(*args, **kwargs) for queryset in self.querysets])
+
+    def exclude(self, *args, **kwargs) -> 'PartitionSet':
+        return PartitionSet(self.partitions, [queryset.exclude(*args, **kwargs) for queryset in self.querysets])
+
+    def count(self) -> int:
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def exists(self) -> bool:
+        return any(queryset.exists() for queryset in self.querysets)
+
+    def newest(self, limit: int) -> list:
+        """
+        The ``limit`` most recent rows across all partitions
+        """
+        time_field = self.partitions.time_field
+        candidates = []
+        for queryset in self.querysets:
+            candidates.extend(queryset.order_by(f'-{time_field}')[:limit])
+        return heapq.nlargest(limit, candidates, key=lambda row: getattr(row, time_field))
+
+    def latest(self):
+        rows = self.newest(1)
+        if not rows:
+            raise self.model.DoesNotExist(f'No {self.model._meta.object_name} matches the given query.')
+        return rows[0]
+
+    def first(self):
+        rows = self.newest(1)
+        return rows[0] if rows else None
+
+    def iterator(self, chunk_size: int = 2000):
+        """
+        Rows newest partition first; within a partition in the model's default order
+        """
+        for queryset in self.querysets:
+            yield from queryset.iterator(chunk_size=chunk_size)
+
+    def values(self, *fields, chunk_size: int = 2000):
+        for queryset in self.querysets:
+            yield from queryset.values(*fields).iterator(chunk_size=chunk_size)
+
+    def count_by(self, *fields: str) -> Counter:
+        """
+        Row counts per value of ``fields`` (a tuple key when there are several)
+        """
+        counts = Counter()
+        for queryset in self.querysets:
+            for *values, total in queryset.order_by().values_list(*fields).annotate(total=models.Count('pk')):
+                counts[values[0] if len(values) == 1 else tuple(values)] += total
+        return counts
+
+
+_registry: Dict[type, LogPartitions] = {}
+_registry_lock = threading.Lock()
+
+
+def get_partitions(model, time_field: str) -> LogPartitions:
+    with _registry_lock:
+        if model not in _registry:
+            _registry[model] = LogPartitions(model, time_field)
+        return _registry[model]
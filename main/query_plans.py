@@ -0,0 +1,99 @@
+"""
+Query plan checks for the hot queries
+
+Each query is built the way its call site builds it and passed to
+QuerySet.explain() (EXPLAIN QUERY PLAN on SQLite). A plan fails if it reads
+a whole table, sorts the rows (e.g. searches the user_id foreign key index
+and sorts the result), or does not use the index meant for it. On
+PostgreSQL sequential scans are disabled for the check, so a small test
+table does not hide a missing index. Used by main.tests and the
+explain_hot_queries command.
+"""
+import re
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Optional, Sequence, Union
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import GeneratedText, UserActivityLog, UserLoginLog
+
+FULL_SCAN = {
+    # SQLite: "SCAN <table>", with or without "USING [COVERING] INDEX" (a full index walk)
+    'sqlite': re.compile(r'\bSCAN (\w+)'),
+    'postgresql': re.compile(r'\bSeq Scan on (\w+)'),
+}
+
+SORT = {
+    'sqlite': re.compile(r'USE TEMP B-TREE'),
+    'postgresql': re.compile(r'\bSort\b'),
+}
+
+TABLES = {model._meta.db_table for model in (GeneratedText, UserActivityLog, UserLoginLog)}
+
+
+def is_supported() -> bool:
+    return connection.vendor in FULL_SCAN
+
+
+def _index_name(model, *fields: str) -> str:
+    return next(index.name for index in model._meta.indexes if index.fields == list(fields) and index.condition is None)
+
+
+def hot_queries():
+    """
+    (name, queryset, expected index or indexes) for every query that has to be served by an index
+    """
+    user_id = 0
+    cutoff = timezone.now() - timedelta(days=30)
+    return [
+        # utils.log_user_logout: the user's newest open session
+        ('log_user_logout', UserLoginLog.objects.filter(
+            user_id=user_id, logout_time__isnull=True, login_successful=True
+        ).order_by('-login_time')[:1], 'login_open_session_idx'),
+        # cleanup_sessions: one delete_in_batches page of anonymous rows (user IS NULL)
+        ('cleanup_sessions generated texts', GeneratedText.objects.filter(
+            created_at__lt=cutoff, user__isnull=True
+        ).order_by('-created_at', 'pk').values_list('created_at', 'pk')[:500],
+            # Either serves it without a sort; the planner picks by table statistics
+            ('generated_anon_time_idx', _index_name(GeneratedText, 'user', '-created_at'))),
+        ('cleanup_sessions activity logs', UserActivityLog.objects.filter(
+            timestamp__lt=cutoff, user__isnull=True
+        ).order_by('-timestamp', 'pk').values_list('timestamp', 'pk')[:500],
+            ('activity_anon_time_idx', _index_name(UserActivityLog, 'user', '-timestamp'))),
+        # profile_view statistics (user_stats.compute): successful logins and the last one
+        ('profile_view login count', UserLoginLog.objects.filter(
+            user_id=user_id, login_successful=True
+        ).order_by().values('pk'), 'login_user_success_idx'),
+        ('profile_view last login', UserLoginLog.objects.filter(
+            user_id=user_id, login_successful=True
+        ).order_by('-login_time')[:1], 'login_user_success_idx'),
+    ]
+
+
+@contextmanager
+def planning():
+    """
+    Transaction in which plans are explained; turns sequential scans off on PostgreSQL
+    """
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        yield
+
+
+def plan_problem(plan: str, index: Union[str, Sequence[str]]) -> Optional[str]:
+    """
+    Why ``plan`` is not an index-served plan using ``index`` (or one of them), or None if it is
+    """
+    indexes = [index] if isinstance(index, str) else list(index)
+    scanned = sorted(set(FULL_SCAN[connection.vendor].findall(plan)) & TABLES)
+    if scanned:
+        return f'full scan of {", ".join(scanned)}'
+    if SORT[connection.vendor].search(plan):
+        return 'sorts the rows'
+    if not any(re.search(rf'\b{re.escape(name)}\b', plan) for name in indexes):
+        return f'does not use {" or ".join(indexes)}'
+    return None
@@ -0,0 +1,42 @@
+"""
+Per-user / per-IP rate limit for the generation endpoints
+
+Every generation costs a multi-second model run, so the form, the stream
+and the batch API all draw from one budget: GENERATION_RATE_LIMIT =
+(generations, seconds) per signed-in user, or per client IP for anonymous
+visitors. Counters are fixed windows kept in the RATE_LIMIT_CACHE cache
+alias; use a cache shared by all workers so the limit is not per process.
+"""
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .utils import get_client_ip
+
+
+def _identity(request) -> str:
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return f'ip:{get_client_ip(request)}'
+
+
+def check_rate(request, scope: str = 'generation', cost: int = 1) -> Optional[int]:
+    """
+    Count ``cost`` requests against the caller's budget; returns seconds to wait if it is exhausted, else None
+    """
+    limit, window = getattr(settings, 'GENERATION_RATE_LIMIT', (30, 60))
+    cache = caches[getattr(settings, 'RATE_LIMIT_CACHE', 'default')]
+    now = time.time()
+    key = f'ratelimit:{scope}:{_identity(request)}:{int(now // window)}'
+    cache.add(key, 0, timeout=window)
+    try:
+        count = cache.incr(key, cost)
+    except ValueError:
+        # Expired between add() and incr()
+        cache.set(key, cost, timeout=window)
+        count = cost
+    if count > limit:
+        return max(1, int(window - now % window))
+    return None
@@ -0,0 +1,71 @@
+"""
+Hourly counters for high-volume activity
+
+Page visits are counted per (action, user or session, hour) in
+ActivityRollup instead of writing one UserActivityLog row each. Counts
+are added with a single INSERT ... ON CONFLICT DO UPDATE statement, so
+concurrent workers never lose increments.
+"""
+from typing import Dict, Optional, Tuple
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+from .models import ActivityRollup
+
+RollupKey = Tuple[str, Optional[int], str, object]  # (action, user_id, session_key, hour)
+
+
+def hour_bucket(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def rollup_subject(user_id: Optional[int], session_key: str) -> str:
+    return f'user:{user_id}' if user_id else f'session:{session_key}'
+
+
+def add_rollup_counts(counts: Dict[RollupKey, int]) -> None:
+    """
+    Add each count to its hourly rollup row, creating rows as needed
+    """
+    if not counts:
+        return
+    if connection.vendor in ('sqlite', 'postgresql'):
+        _upsert(counts)
+    else:
+        for key, count in counts.items():
+            _increment(key, count)
+
+    from . import aggregates, user_stats
+    user_stats.record_visits(counts)
+    aggregates.record_visits(counts)
+
+
+def _upsert(counts: Dict[RollupKey, int]) -> None:
+    table = connection.ops.quote_name(ActivityRollup._meta.db_table)
+    rows = []
+    for (action, user_id, session_key, hour), count in counts.items():
+        rows.append((
+            action, rollup_subject(user_id, session_key), user_id, session_key,
+            connection.ops.adapt_datetimefield_value(hour), count,
+        ))
+    sql = (
+        f'INSERT INTO {table} (action, subject, user_id, session_key, hour, count) '
+        f'VALUES (%s, %s, %s, %s, %s, %s) '
+        f'ON CONFLICT (action, subject, hour) DO UPDATE SET count = {table}.count + excluded.count'
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def _increment(key: RollupKey, count: int) -> None:
+    action, user_id, session_key, hour = key
+    lookup = {'action': action, 'subject': rollup_subject(user_id, session_key), 'hour': hour}
+    if ActivityRollup.objects.filter(**lookup).update(count=F('count') + count):
+        return
+    try:
+        with transaction.atomic():
+            ActivityRollup.objects.create(user_id=user_id, session_key=session_key, count=count, **lookup)
+    except IntegrityError:
+        # Another worker created the row first
+        ActivityRollup.objects.filter(**lookup).update(count=F('count') + count)
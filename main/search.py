@@ -0,0 +1,317 @@
+"""
+Full-text search over generated texts and activity descriptions
+
+On SQLite, migration 0008 creates FTS5 tables (external content, kept in
+sync by triggers) for GeneratedText.input_text/generated_text and
+UserActivityLog.description. Searches here MATCH against those tables and
+rank by bm25, instead of running LIKE '%term%' over every row. On other
+databases, or before the migration has run, they fall back to icontains.
+Migrations that remake a content table (SQLite ALTER TABLE) drop its sync
+triggers; searches then fall back to icontains until rebuild_search_index
+recreates the triggers and re-indexes the rows.
+
+Activity rows written to monthly partition tables (LOG_PARTITIONING_ENABLED)
+go into the same index: each partition gets its own sync triggers when it is
+created, and partition ids never collide with base table ids (see
+main/partitions.py). Admin searches run against the combined view.
+"""
+import html
+import re
+import time
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.text import smart_split, unescape_string_literal
+
+from .models import GeneratedText, UserActivityLog
+
+# model -> (FTS table, indexed columns)
+INDEXES = {
+    GeneratedText: ('main_generatedtext_fts', ('input_text', 'generated_text')),
+    UserActivityLog: ('main_useractivitylog_fts', ('description',)),
+}
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+_TRIGGERS = ('ai', 'ad', 'au')
+_available: Optional[bool] = None
+_checked_at = 0.0
+
+
+def _trigger_name(table: str, content: str) -> str:
+    # The base table's triggers keep the names migration 0008 gave them
+    return table if content == table[:-len('_fts')] else f'{content}_fts'
+
+
+def _trigger_sql(table: str, content: str, columns) -> List[str]:
+    """
+    CREATE TRIGGER statements keeping ``table`` in sync with ``content`` (as in migration 0008)
+    """
+    name = _trigger_name(table, content)
+    names = ', '.join(columns)
+    new_values = ', '.join(f'new.{column}' for column in columns)
+    old_values = ', '.join(f'old.{column}' for column in columns)
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {name}_ai AFTER INSERT ON {content} BEGIN "
+        f"INSERT INTO {table}(rowid, {names}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_ad AFTER DELETE ON {content} BEGIN "
+        f"INSERT INTO {table}({table}, rowid, {names}) VALUES ('delete', old.id, {old_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_au AFTER UPDATE ON {content} BEGIN "
+        f"INSERT INTO {table}({table}, rowid, {names}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {table}(rowid, {names}) VALUES (new.id, {new_values}); END",
+    ]
+
+
+def _partition_tables(model) -> List[str]:
+    """
+    Monthly partition tables of ``model``, if it is a partitioned log model
+    """
+    manager = model._default_manager
+    if not hasattr(manager, 'partitions'):
+        return []
+    log_partitions = manager.partitions()
+    return [f'{log_partitions.prefix}{suffix}' for suffix in log_partitions.suffixes()]
+
+
+def _check() -> bool:
+    if connection.vendor != 'sqlite':
+        return False
+    tables = set(connection.introspection.table_names())
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        triggers = {name for name, in cursor.fetchall()}
+    return all(
+        table in tables and all(
+            f'{_trigger_name(table, content)}_{suffix}' in triggers
+            for content in [model._meta.db_table, *_partition_tables(model)]
+            for suffix in _TRIGGERS
+        )
+        for model, (table, _) in INDEXES.items()
+    )
+
+
+def is_available(refresh: bool = False) -> bool:
+    """
+    True when the FTS5 tables and their sync triggers exist (SQLite, migrated)
+
+    Re-checked every SEARCH_INDEX_CHECK_SECONDS, so a migration that drops the triggers is noticed.
+    """
+    global _available, _checked_at
+    ttl = getattr(settings, 'SEARCH_INDEX_CHECK_SECONDS', 60)
+    if refresh or _available is None or time.monotonic() - _checked_at > ttl:
+        _available = _check()
+        _checked_at = time.monotonic()
+    return _available
+
+
+def match_query(text: str) -> Optional[str]:
+    """
+    FTS5 query matching every word of ``text``, the last one as a prefix; None if there are no words
+
+    User input is never passed through as FTS5 syntax, so quotes or operators cannot cause errors.
+    """
+    tokens = _TOKEN.findall(text)
+    if not tokens:
+        return None
+    quoted = [f'"{token}"' for token in tokens]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def matching_ids(model, text: str) -> Optional[RawSQL]:
+    """
+    Subquery of primary keys whose indexed text matches, for ``pk__in``; None without a usable index or query
+    """
+    query = match_query(text)
+    if query is None or model not in INDEXES or not is_available():
+        return None
+    table, _ = INDEXES[model]
+    return RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [query])
+
+
+def _fallback_filter(model, text: str) -> Q:
+    condition = Q()
+    for token in _TOKEN.findall(text):
+        token_condition = Q()
+        for column in INDEXES[model][1]:
+            token_condition |= Q(**{f'{column}__icontains': token})
+        condition &= token_condition
+    return condition
+
+
+def _highlight(snippet: str) -> str:
+    # Markers chosen so they survive escaping and never occur in normal text
+    return html.escape(snippet).replace('\x02', '<mark>').replace('\x03', '</mark>')
+
+
+def search_history(user, text: str, limit: int = 50) -> List[GeneratedText]:
+    """
+    The user's generated texts matching ``text``, best match first
+
+    Each result has ``input_snippet`` and ``snippet``: HTML-escaped input and generated text around
+    the match, with matches in <mark>.
+    """
+    query = match_query(text)
+    if query is None:
+        return []
+
+    if not is_available():
+        results = list(
+            GeneratedText.objects.filter(user=user).filter(_fallback_filter(GeneratedText, text))
+            .order_by('-created_at')[:limit]
+        )
+        for item in results:
+            item.input_snippet = html.escape(item.input_text)
+            item.snippet = html.escape(item.generated_text[:200])
+        return results
+
+    table, columns = INDEXES[GeneratedText]
+    # One snippet per column, so a match in the input is not shown as output
+    input_column, output_column = columns.index('input_text'), columns.index('generated_text')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT {table}.rowid, snippet({table}, {input_column}, char(2), char(3), '…', 16), "
+            f"snippet({table}, {output_column}, char(2), char(3), '…', 16) "
+            f"FROM {table} JOIN main_generatedtext ON main_generatedtext.id = {table}.rowid "
+            f"WHERE {table} MATCH %s AND main_generatedtext.user_id = %s "
+            f"ORDER BY bm25({table}) LIMIT %s",
+            [query, user.pk, limit]
+        )
+        ranked = cursor.fetchall()
+
+    rows = GeneratedText.objects.in_bulk([row_id for row_id, _, _ in ranked])
+    results = []
+    for row_id, input_snippet, snippet in ranked:
+        item = rows.get(row_id)
+        if item is not None:
+            item.input_snippet = _highlight(input_snippet)
+            item.snippet = _highlight(snippet)
+            results.append(item)
+    return results
+
+
+def _has_index(model) -> bool:
+    return (
+        connection.vendor == 'sqlite' and model in INDEXES
+        and INDEXES[model][0] in connection.introspection.table_names()
+    )
+
+
+def index_partition(base_model, partition_model) -> None:
+    """
+    Add sync triggers to a new, empty partition table of ``base_model``
+    """
+    if not _has_index(base_model):
+        return
+    table, columns = INDEXES[base_model]
+    with connection.cursor() as cursor:
+        for statement in _trigger_sql(table, partition_model._meta.db_table, columns):
+            cursor.execute(statement)
+
+
+def unindex_partition(base_model, partition_model) -> None:
+    """
+    Remove a partition's rows from the index before the partition table is dropped
+    """
+    if not _has_index(base_model):
+        return
+    table, columns = INDEXES[base_model]
+    names = ', '.join(columns)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table}({table}, rowid, {names}) "
+            f"SELECT 'delete', id, {names} FROM {partition_model._meta.db_table}"
+        )
+
+
+def rebuild(optimize: bool = False) -> List[str]:
+    """
+    Recreate missing sync triggers and rebuild every FTS index from its content tables; returns the rebuilt tables
+    """
+    if connection.vendor != 'sqlite':
+        return []
+    tables = set(connection.introspection.table_names())
+    rebuilt = []
+    with connection.cursor() as cursor:
+        for model, (table, columns) in INDEXES.items():
+            if table not in tables:
+                continue
+            partitions = _partition_tables(model)
+            for content in [model._meta.db_table, *partitions]:
+                for statement in _trigger_sql(table, content, columns):
+                    cursor.execute(statement)
+            # 'rebuild' reads the base table only; partition rows are added after it
+            cursor.execute(f"INSERT INTO {table}({table}) VALUES('rebuild')")
+            names = ', '.join(columns)
+            for content in partitions:
+                cursor.execute(f"INSERT INTO {table}(rowid, {names}) SELECT id, {names} FROM {content}")
+            if optimize:
+                cursor.execute(f"INSERT INTO {table}({table}) VALUES('optimize')")
+            rebuilt.append(table)
+    is_available(refresh=True)
+    return rebuilt
+
+
+def rank_sql(model, text: str, db_table: Optional[str] = None) -> Optional[RawSQL]:
+    """
+    bm25 score of each row of ``model`` against ``text`` (lower is better; rows the index does not match get 0)
+
+    ``db_table`` is the table or view the outer query reads, if not the model's own (a combined log view).
+    """
+    query = match_query(text)
+    if query is None or model not in INDEXES or not is_available():
+        return None
+    table, _ = INDEXES[model]
+    content = connection.ops.quote_name(db_table or model._meta.db_table)
+    return RawSQL(
+        f'COALESCE((SELECT bm25({table}) FROM {table} WHERE {table} MATCH %s AND {table}.rowid = {content}.id), 0)',
+        [query]
+    )
+
+
+class FullTextSearchMixin:
+    """
+    ModelAdmin mixin: words in the search box are matched through the FTS index
+
+    ``fulltext_search_fields`` are the short columns still searched directly,
+    with lookups an index can serve: '=field' (exact) and, across a relation,
+    '^relation__field' (prefix, as a subquery on the related table, e.g. user
+    ids). As in Django's own search, every word must match: each word
+    matches through the index or those fields, and a row is shown only if
+    all words match. Results are annotated with ``search_rank`` (bm25), which
+    the keyset changelist orders by.
+    """
+
+    fulltext_search_fields = ()
+
+    def get_search_fields(self, request):
+        if is_available():
+            return self.fulltext_search_fields
+        return super().get_search_fields(request)
+
+    def _field_condition(self, field: str, bit: str) -> Q:
+        if field.startswith('^'):
+            relation, name = field[1:].split('__', 1)
+            related = self.model._meta.get_field(relation).related_model
+            return Q(**{f'{relation}__in': related._default_manager.filter(**{f'{name}__istartswith': bit}).values('pk')})
+        return Q(**{field.lstrip('='): bit})
+
+    def get_search_results(self, request, queryset, search_term):
+        if not is_available():
+            return super().get_search_results(request, queryset, search_term)
+        condition = Q()
+        for bit in smart_split(search_term):
+            if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+                bit = unescape_string_literal(bit)
+            matches = matching_ids(self.model, bit)
+            bit_condition = Q(pk__in=matches) if matches is not None else Q(pk__in=[])
+            for field in self.fulltext_search_fields:
+                bit_condition |= self._field_condition(field, bit)
+            condition &= bit_condition
+        queryset = queryset.filter(condition)
+        rank = rank_sql(self.model, search_term, queryset.model._meta.db_table)
+        if rank is not None:
+            queryset = queryset.annotate(search_rank=rank)
+        return queryset, False
@@ -0,0 +1,58 @@
+"""
+Database session backend that only writes when something changed
+
+With SESSION_SAVE_EVERY_REQUEST = True the stock backend rewrites the
+django_session row on every page view just to push expire_date forward.
+This store remembers the serialized data it loaded and skips the UPDATE
+when the data is unchanged. The expiry is then refreshed at most once
+per SESSION_EXPIRY_REFRESH_SECONDS, so a session can expire up to that
+much earlier than its cookie.
+
+Enable with SESSION_ENGINE = 'main.session_backend'.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore as DBSessionStore
+
+
+class SessionStore(DBSessionStore):
+    """
+    DB session store that coalesces no-op saves
+    """
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._loaded_fingerprint = None
+        self._loaded_expiry = None
+
+    def _fingerprint(self, data) -> bytes:
+        return hashlib.blake2b(self.serializer().dumps(data), digest_size=16).digest()
+
+    def load(self):
+        session = self._get_session_from_db()
+        if session is None:
+            self._loaded_fingerprint = None
+            self._loaded_expiry = None
+            return {}
+        data = self.decode(session.session_data)
+        self._loaded_fingerprint = self._fingerprint(data)
+        self._loaded_expiry = session.expire_date
+        return data
+
+    def _is_unchanged(self) -> bool:
+        data = self._get_session()
+        if self._loaded_fingerprint is None or self._fingerprint(data) != self._loaded_fingerprint:
+            return False
+        refresh = timedelta(seconds=getattr(settings, 'SESSION_EXPIRY_REFRESH_SECONDS', 300))
+        return self.get_expiry_date() - self._loaded_expiry < refresh
+
+    def save(self, must_create=False):
+        if not must_create and self.session_key is not None and self._is_unchanged():
+            return
+        super().save(must_create=must_create)
+        if self.session_key is not None:
+            # What is in the database now
+            self._loaded_fingerprint = self._fingerprint(self._get_session(no_load=True))
+            self._loaded_expiry = self.get_expiry_date()
@@ -8,6 +8,10 @@ from django.utils import timezone
 from datetime import timedelta
 from typing import Optional, Dict, Any
 
+from .activity_buffer import RecentActivityBuffer
+from .batch_delete import delete_in_batches
+from .visitor import get_visitor_id
+
 
 class SessionManager:
     """
@@ -15,25 +19,43 @@ class SessionManager:
     """
     
     @staticmethod
-    def get_session_key(request) -> str:
+    def get_session_key(request, create_session: bool = False) -> str:
         """
         Get consistent session key for both authenticated and anonymous users
+        
+        Anonymous visitors are identified by the signed visitor cookie; a
+        session row is only created when ``create_session`` is true or
+        something is stored in the session.
         """
         if request.user.is_authenticated:
             return f"user_{request.user.id}"
-        else:
-            # Ensure session exists for anonymous users
-            if not request.session.session_key:
-                request.session.create()
-            return request.session.session_key
+        if request.session.session_key:
+            # Sessions created before visitor cookies keep their own key as identity
+            return request.session.get('visitor_id') or request.session.session_key
+        visitor_id = get_visitor_id(request)
+        if create_session:
+            SessionManager._bind_visitor(request)
+        return visitor_id
+    
+    @staticmethod
+    def _bind_visitor(request) -> None:
+        """
+        Copy the visitor id into a session that is about to be created
+        """
+        if request.user.is_authenticated or request.session.session_key:
+            return
+        if 'visitor_id' not in request.session:
+            request.session['visitor_id'] = get_visitor_id(request)
     
     @staticmethod
     def store_user_preference(request, key: str, value: Any) -> None:
         """
         Store user preference in session
         """
-        request.session[f"pref_{key}"] = value
-        request.session.modified = True
+        # Assigning marks the session modified; skip it when nothing changes
+        if request.session.get(f"pref_{key}") != value:
+            SessionManager._bind_visitor(request)
+            request.session[f"pref_{key}"] = value
     
     @staticmethod
     def get_user_preference(request, key: str, default: Any = None) -> Any:
@@ -47,8 +69,9 @@ class SessionManager:
         """
         Store text generation settings in session
         """
-        request.session['generation_settings'] = settings
-        request.session.modified = True
+        if request.session.get('generation_settings') != settings:
+            SessionManager._bind_visitor(request)
+            request.session['generation_settings'] = settings
     
     @staticmethod
     def get_generation_settings(request) -> Dict[str, Any]:
@@ -65,46 +88,33 @@ class SessionManager:
     @staticmethod
     def track_activity(request, activity_type: str, metadata: Dict[str, Any] = None) -> None:
         """
-        Track user activity in session
+        Track user activity in the recent-activity ring buffer
         """
-        activities = request.session.get('recent_activities', [])
+        RecentActivityBuffer.record(request, activity_type, metadata)
         
-        activity = {
-            'type': activity_type,
-            'timestamp': timezone.now().isoformat(),
-            'metadata': metadata or {}
-        }
-        
-        # Keep only last 20 activities
-        activities.append(activity)
-        activities = activities[-20:]
-        
-        request.session['recent_activities'] = activities
-        request.session.modified = True
+        # Drop the list older versions kept inside the session
+        if 'recent_activities' in request.session:
+            del request.session['recent_activities']
     
     @staticmethod
     def get_recent_activities(request, activity_type: str = None) -> list:
         """
-        Get recent activities from session
+        Get recent activities from the ring buffer, oldest first
         """
-        activities = request.session.get('recent_activities', [])
-        
-        if activity_type:
-            activities = [a for a in activities if a['type'] == activity_type]
-        
-        return activities
+        return RecentActivityBuffer.get_activities(request, activity_type)
     
     @staticmethod
-    def cleanup_expired_sessions() -> int:
+    def cleanup_expired_sessions(batch_size: int = None, sleep: float = None, progress=None,
+                                 dry_run: bool = False) -> int:
         """
-        Clean up expired sessions (to be called by management command)
+        Clean up expired sessions in short batches (to be called by management command)
         """
         expired_sessions = Session.objects.filter(
             expire_date__lt=timezone.now()
         )
-        count = expired_sessions.count()
-        expired_sessions.delete()
-        return count
+        if dry_run:
+            return expired_sessions.count()
+        return delete_in_batches(expired_sessions, batch_size=batch_size, sleep=sleep, progress=progress)
     
     @staticmethod
     def get_active_sessions_count() -> int:
@@ -163,7 +173,7 @@ class SessionManager:
             'username': request.user.username if request.user.is_authenticated else None,
             'session_age': request.session.get_expiry_age(),
             'session_expires': request.session.get_expiry_date(),
-            'recent_activities_count': len(request.session.get('recent_activities', [])),
+            'recent_activities_count': RecentActivityBuffer.count(request),
             'stored_preferences': [
                 key for key in request.session.keys() 
                 if key.startswith('pref_')
@@ -171,43 +181,22 @@ class SessionManager:
         }
 
 
-class SessionMiddleware:
+class RecentActivityMiddleware:
     """
-    Custom middleware to enhance session handling
+    Records each page view in the recent-activity ring buffer
+
+    Installed after AuthenticationMiddleware, which buffer_key needs. It
+    never writes to the session: the ring keeps its own timestamps, so
+    unchanged sessions stay unsaved (see session_backend).
     """
     
     def __init__(self, get_response):
         self.get_response = get_response
     
     def __call__(self, request):
-        # Pre-processing
-        self._pre_process(request)
-        
-        response = self.get_response(request)
-        
-        # Post-processing
-        self._post_process(request, response)
-        
-        return response
-    
-    def _pre_process(self, request):
-        """
-        Pre-process request to set up session
-        """
-        # Ensure session exists for all requests
-        if not request.session.session_key and not request.user.is_authenticated:
-            request.session.create()
-        
-        # Track page views
+        # Track page views (anonymous visitors are tracked once they have a session or visitor cookie)
         SessionManager.track_activity(request, 'page_view', {
             'path': request.path,
             'method': request.method
         })
-    
-    def _post_process(self, request, response):
-        """
-        Post-process response
-        """
-        # Update last activity timestamp
-        request.session['last_activity'] = timezone.now().isoformat()
-        request.session.modified = True
+        return self.get_response(request)
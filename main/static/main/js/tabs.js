@@ -98,9 +98,95 @@ function submitForm() {
     // Add visual feedback
     input.style.borderColor = '#28a745';
     
+    // Stream sentences over Server-Sent Events when the browser supports it
+    const streamToggle = document.getElementById('stream_output');
+    if (streamToggle && streamToggle.checked && window.EventSource) {
+        streamGeneration(document.getElementById('textForm'));
+        return false;
+    }
+    
     return true;
 }
 
+// Restore the submit button after a streamed generation
+function resetSubmitButton() {
+    const submitBtn = document.getElementById('submitBtn');
+    const loading = document.getElementById('loading');
+    submitBtn.disabled = false;
+    submitBtn.innerHTML = 'Generate Text';
+    loading.style.display = 'none';
+}
+
+// Show each generated sentence as soon as the server sends it
+function streamGeneration(form) {
+    const inputText = document.getElementById('input_text').value;
+    
+    const output = document.getElementById('output');
+    output.innerHTML = `
+        <div class="result-box">
+            <div class="d-flex justify-content-between align-items-start mb-2">
+                <strong>Generated Text:</strong>
+                <button type="button" class="btn btn-primary btn-sm" id="streamCopy" disabled>📋 Copy</button>
+            </div>
+            <p><strong>Input:</strong> <span id="streamInput"></span></p>
+            <p><strong>Output:</strong> <span id="streamOutput"></span></p>
+        </div>
+    `;
+    document.getElementById('streamInput').textContent = inputText;
+    const streamOutput = document.getElementById('streamOutput');
+    const copyBtn = document.getElementById('streamCopy');
+    
+    // The generation is started by a CSRF-protected POST; the event stream only follows that job
+    fetch(form.dataset.streamUrl, {
+        method: 'POST',
+        body: new FormData(form),
+        headers: {'Accept': 'application/json'},
+        credentials: 'same-origin'
+    }).then(function(response) {
+        return response.json().then(function(data) {
+            if (!response.ok) {
+                throw new Error(data.error || 'Generation could not be started.');
+            }
+            return data;
+        });
+    }).then(function(job) {
+        const source = new EventSource(job.stream_url);
+        
+        source.addEventListener('sentence', function(e) {
+            const data = JSON.parse(e.data);
+            streamOutput.textContent += (data.index > 0 ? ' ' : '') + data.text;
+        });
+        
+        source.addEventListener('done', function(e) {
+            const data = JSON.parse(e.data);
+            source.close();
+            streamOutput.textContent = data.text;
+            copyBtn.disabled = false;
+            copyBtn.onclick = function() { copyText(data.text, copyBtn); };
+            resetSubmitButton();
+            showAlert('Text generated successfully!', 'success');
+        });
+        
+        source.addEventListener('failed', function(e) {
+            const data = JSON.parse(e.data);
+            source.close();
+            streamOutput.textContent = 'Error: ' + data.error;
+            resetSubmitButton();
+            showAlert('Generation failed!', 'danger');
+        });
+        
+        // Connection dropped; reconnecting would only follow the same job, so stop here
+        source.onerror = function() {
+            source.close();
+            resetSubmitButton();
+        };
+    }).catch(function(err) {
+        streamOutput.textContent = 'Error: ' + err.message;
+        resetSubmitButton();
+        showAlert(err.message, 'danger');
+    });
+}
+
 // Enhanced copy function with better feedback
 function copyText(text, button) {
     navigator.clipboard.writeText(text).then(function() {
@@ -315,3 +401,38 @@ function autoSaveDraft() {
 
 // Initialize auto-save
 document.addEventListener('DOMContentLoaded', autoSaveDraft);
+
+// Poll a queued generation job until the worker finishes it
+function pollGenerationJob() {
+    const box = document.getElementById('jobResult');
+    if (!box || box.dataset.status === 'done' || box.dataset.status === 'failed') {
+        return;
+    }
+    
+    fetch(box.dataset.statusUrl, { headers: { 'Accept': 'application/json' } })
+        .then(function(response) {
+            return response.json();
+        })
+        .then(function(job) {
+            const output = document.getElementById('jobOutput');
+            box.dataset.status = job.status;
+            
+            if (job.status === 'done') {
+                output.textContent = job.result;
+                showAlert('Text generated successfully!', 'success');
+            } else if (job.status === 'failed') {
+                output.textContent = 'Error: ' + job.error;
+                showAlert('Generation failed!', 'danger');
+            } else {
+                const state = document.getElementById('jobState');
+                if (state) state.textContent = job.status.charAt(0).toUpperCase() + job.status.slice(1);
+                setTimeout(pollGenerationJob, 2000);
+            }
+        })
+        .catch(function(err) {
+            console.error('Job status error: ', err);
+            setTimeout(pollGenerationJob, 5000);
+        });
+}
+
+document.addEventListener('DOMContentLoaded', pollGenerationJob);
@@ -0,0 +1,149 @@
+"""
+Server-Sent Events streams for sentence-by-sentence text generation
+"""
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+
+from .generation import iter_corrected_sentences
+from .models import GenerationJob
+
+
+def sse_event(event: str, data: dict) -> str:
+    """
+    Format one Server-Sent Events message
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _sentence_source(text, num_sentences, length, cached_text):
+    if cached_text is not None:
+        return iter([cached_text])
+    return iter_corrected_sentences(text, num_sentences, length)
+
+
+def stream_generation(text, num_sentences, length, on_complete, cached_text=None, on_error=None, on_abort=None):
+    """
+    Blocking SSE stream used under WSGI
+
+    ``on_complete`` receives the full corrected text once every sentence has
+    been sent, and is responsible for persisting it; ``on_error`` receives
+    the message if generating or persisting fails, and ``on_abort`` is
+    called if the client disconnects first. A ``cached_text`` is sent as a
+    single chunk without touching the model.
+    """
+    started = time.perf_counter()
+    yield sse_event('start', {'num_sentences': num_sentences, 'length': length, 'cached': cached_text is not None})
+
+    sentences = []
+    try:
+        sentence_iter = _sentence_source(text, num_sentences, length, cached_text)
+        for index, sentence in enumerate(sentence_iter):
+            sentences.append(sentence)
+            yield sse_event('sentence', {
+                'index': index,
+                'text': sentence,
+                'elapsed': round(time.perf_counter() - started, 3),
+            })
+        result = ' '.join(sentences)
+        on_complete(result)
+    except GeneratorExit:
+        # The server closes the stream when the client goes away
+        if on_abort is not None:
+            on_abort()
+        raise
+    except Exception as e:
+        if on_error is not None:
+            on_error(str(e))
+        yield sse_event('failed', {'error': str(e)})
+        return
+
+    yield sse_event('done', {'text': result, 'elapsed': round(time.perf_counter() - started, 3)})
+
+
+async def astream_generation(text, num_sentences, length, on_complete, cached_text=None, on_error=None,
+                             on_abort=None):
+    """
+    Async SSE stream used under ASGI
+
+    Model calls run in the thread pool so the event loop keeps serving
+    other connections; ``on_complete`` runs in the thread that owns the
+    database connection.
+    """
+    started = time.perf_counter()
+    yield sse_event('start', {'num_sentences': num_sentences, 'length': length, 'cached': cached_text is not None})
+
+    sentences = []
+    try:
+        sentence_iter = _sentence_source(text, num_sentences, length, cached_text)
+        # next() with a default, since StopIteration cannot cross into a Future
+        next_sentence = sync_to_async(next, thread_sensitive=False)
+        while True:
+            sentence = await next_sentence(sentence_iter, None)
+            if sentence is None:
+                break
+            yield sse_event('sentence', {
+                'index': len(sentences),
+                'text': sentence,
+                'elapsed': round(time.perf_counter() - started, 3),
+            })
+            sentences.append(sentence)
+        result = ' '.join(sentences)
+        await sync_to_async(on_complete)(result)
+    except (GeneratorExit, asyncio.CancelledError):
+        # Cancelled or closed when the client disconnects
+        if on_abort is not None:
+            await sync_to_async(on_abort)()
+        raise
+    except Exception as e:
+        if on_error is not None:
+            await sync_to_async(on_error)(str(e))
+        yield sse_event('failed', {'error': str(e)})
+        return
+
+    yield sse_event('done', {'text': result, 'elapsed': round(time.perf_counter() - started, 3)})
+
+
+def _job_events(job):
+    if job.status == GenerationJob.STATUS_DONE:
+        return [sse_event('done', {'text': job.result_text})]
+    if job.status == GenerationJob.STATUS_FAILED:
+        return [sse_event('failed', {'error': job.error})]
+    return None
+
+
+def follow_job(job_id, poll_interval=1.0, timeout=600.0):
+    """
+    SSE stream for a job run elsewhere (by a worker): waits for it and sends its result in one piece
+    """
+    yield sse_event('start', {'job_id': job_id, 'cached': False})
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        events = _job_events(GenerationJob.objects.get(id=job_id))
+        if events:
+            yield from events
+            return
+        # Comment line keeps proxies from closing an idle connection
+        yield ': waiting\n\n'
+        time.sleep(poll_interval)
+    yield sse_event('failed', {'error': 'Still generating; the result will appear in your history.'})
+
+
+async def afollow_job(job_id, poll_interval=1.0, timeout=600.0):
+    """
+    Async version of follow_job used under ASGI
+    """
+    yield sse_event('start', {'job_id': job_id, 'cached': False})
+    deadline = time.monotonic() + timeout
+    load = sync_to_async(lambda: GenerationJob.objects.get(id=job_id))
+    while time.monotonic() < deadline:
+        events = _job_events(await load())
+        if events:
+            for event in events:
+                yield event
+            return
+        yield ': waiting\n\n'
+        await asyncio.sleep(poll_interval)
+    yield sse_event('failed', {'error': 'Still generating; the result will appear in your history.'})
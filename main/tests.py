@@ -1,3 +1,274 @@
-from django.test import TestCase
+import contextlib
+import sys
+import tempfile
+import types
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import grammar_batcher, query_plans
+from .management.commands.benchmark_session_writes import PAGES, count_session_writes
+from .jobs import claim_next_job, run_job
+from .log_archive import KINDS, LogArchive
+from .model_registry import ModelRegistry
+from .models import GeneratedText, GenerationJob, UserActivityLog, UserLoginLog, UserStats
+from .user_stats import StatsBackfill, get_stats, reconcile
+from .utils import log_user_activity, log_user_logout
+
+
+class FakeT5Tokenizer:
+    def __call__(self, texts, **kwargs):
+        return FakeEncoding(input_ids=list(texts))
+
+    def batch_decode(self, outputs, skip_special_tokens=False):
+        return [f' {output} ' for output in outputs]
+
+
+class FakeEncoding(dict):
+    def to(self, device):
+        return self
+
+
+class FakeT5Model:
+    device = 'cpu'
+
+    def generate(self, input_ids, max_length):
+        return [text.replace('grammar: ', '').replace(' have ', ' has ') for text in input_ids]
+
+
+class FakeGrammarModel:
+    """
+    Grammar corrector exposing its T5 parts; ``tidy`` adds post-processing the batched path lacks
+    """
+
+    def __init__(self, tidy=False):
+        self.t5_tokenizer = FakeT5Tokenizer()
+        self.t5_model = FakeT5Model()
+        self.tidy = tidy
+
+    def correct_grammar_t5(self, text):
+        inputs = self.t5_tokenizer(['grammar: ' + text])
+        result = self.t5_tokenizer.batch_decode(self.t5_model.generate(**inputs, max_length=256))[0].strip()
+        if self.tidy:
+            result = result[:1].upper() + result[1:]
+        return result
+
+
+class FakeLanguageModel:
+    def generate_text(self, num_sentences, input_words, length, use_progress_bar=False):
+        return ' '.join(input_words) + ' and then some more words.'
+
+    def correct_grammar_t5(self, text):
+        return text
+
+
+@override_settings(ACTIVITY_LOG_ASYNC=False, GENERATION_CACHE_ENABLED=False, GRAMMAR_BATCHING_ENABLED=False)
+class ModelRegistryTests(TestCase):
+    def setUp(self):
+        ModelRegistry.reset()
+        ModelRegistry._load_count = 0
+        self.addCleanup(ModelRegistry.reset)
+
+        # Stand-in for lgram.models.chunk, so the test never loads the real model
+        self.loader = mock.Mock(side_effect=FakeLanguageModel)
+        chunk = types.ModuleType('lgram.models.chunk')
+        chunk.create_language_model = self.loader
+        modules = mock.patch.dict(sys.modules, {
+            'lgram': types.ModuleType('lgram'),
+            'lgram.models': types.ModuleType('lgram.models'),
+            'lgram.models.chunk': chunk,
+        })
+        modules.start()
+        self.addCleanup(modules.stop)
+
+    def generate(self, text):
+        response = self.client.post(reverse('index'), {'input_text': text}, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 202)
+        job = claim_next_job('test-worker')
+        self.assertEqual(job.id, response.json()['job_id'])
+        return run_job(job)
+
+    def test_second_generation_does_not_load_the_model(self):
+        first = self.generate('The cat sat on the mat.')
+        self.assertEqual(first.status, GenerationJob.STATUS_DONE)
+        self.assertEqual(ModelRegistry._load_count, 1)
+
+        second = self.generate('A dog ran in the park.')
+        self.assertEqual(second.status, GenerationJob.STATUS_DONE)
+        self.assertEqual(ModelRegistry._load_count, 1)
+        self.loader.assert_called_once_with()
+
+
+@skipUnless(query_plans.is_supported(), 'query plan checks need SQLite or PostgreSQL')
+class HotQueryPlanTests(TestCase):
+    def test_hot_queries_use_their_index_without_sorting(self):
+        with query_plans.planning():
+            for name, queryset, index in query_plans.hot_queries():
+                with self.subTest(name):
+                    plan = queryset.explain()
+                    self.assertIsNone(query_plans.plan_problem(plan, index), plan)
+
+    def test_primary_key_order_is_rejected(self):
+        # The order delete_in_batches used before walking the created_at index
+        queryset = GeneratedText.objects.filter(
+            created_at__lt=timezone.now(), user__isnull=True
+        ).order_by('pk').values_list('pk', flat=True)[:500]
+        with query_plans.planning():
+            self.assertIsNotNone(query_plans.plan_problem(queryset.explain(), 'generated_anon_time_idx'))
+
+
+@override_settings(SESSION_EXPIRY_REFRESH_SECONDS=3600)
+class SessionWriteTests(TestCase):
+    def test_unchanged_session_is_not_written_within_the_refresh_interval(self):
+        views = 4 * len(PAGES)
+        self.assertEqual(count_session_writes('main.session_backend', views), 0)
+
+    def test_stock_backend_writes_on_every_view(self):
+        # What main.session_backend saves; guards against the count above passing vacuously
+        views = len(PAGES)
+        self.assertEqual(count_session_writes('django.contrib.sessions.backends.db', views), views)
+
+
+@override_settings(GRAMMAR_T5_PREFIX='grammar: ')
+class GrammarBatchingTests(TestCase):
+    texts = ['the cat have a hat.', 'we have finished.', 'Nothing to fix here.']
+
+    def setUp(self):
+        for patcher in (
+            mock.patch.dict(sys.modules, {'torch': types.SimpleNamespace(no_grad=contextlib.nullcontext)}),
+            mock.patch.object(grammar_batcher, '_batcher', None),
+            mock.patch.object(grammar_batcher, '_support', None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(ModelRegistry.reset)
+
+    def correct_all(self, batching):
+        with self.settings(GRAMMAR_BATCHING_ENABLED=batching):
+            return [grammar_batcher.correct_grammar(text) for text in self.texts]
+
+    def test_batched_output_matches_unbatched_output(self):
+        ModelRegistry._model = FakeGrammarModel()
+        unbatched = self.correct_all(batching=False)
+        batched = self.correct_all(batching=True)
+        self.assertEqual(batched, unbatched)
+        self.assertEqual(grammar_batcher.get_batcher().get_stats()['items'], len(self.texts))
+
+    def test_batching_falls_back_when_output_differs(self):
+        ModelRegistry._model = FakeGrammarModel(tidy=True)
+        unbatched = self.correct_all(batching=False)
+        with self.assertLogs('main.grammar_batcher', 'WARNING'):
+            batched = self.correct_all(batching=True)
+        self.assertEqual(batched, unbatched)
+        self.assertIsNone(grammar_batcher._batcher)
+
+    def test_batching_falls_back_without_t5_attributes(self):
+        ModelRegistry._model = FakeLanguageModel()
+        with self.assertLogs('main.grammar_batcher', 'WARNING'):
+            self.assertEqual(self.correct_all(batching=True), self.texts)
+
+
+@override_settings(ACTIVITY_LOG_ASYNC=False, USER_STATS_BACKFILL_ASYNC=False)
+class UserStatsSeedTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('writer', password='unused-password')
+        archive = mock.patch('main.log_archive.archived_summary', return_value={
+            'action_counts': {'generate_text': 2}, 'logins': 3, 'last_login': None,
+        })
+        self.archived_summary = archive.start()
+        self.addCleanup(archive.stop)
+
+    def write(self):
+        GeneratedText.objects.create(user=self.user, session_key='s', input_text='in', generated_text='out')
+        log_user_activity(user=self.user, action='generate_text')
+
+    def test_first_write_does_not_seed_inline(self):
+        self.write()
+        self.assertFalse(UserStats.objects.filter(pk=self.user.pk).exists())
+        self.archived_summary.assert_not_called()
+
+        # Reads count the live tables until the row is seeded
+        stats = get_stats(self.user)
+        self.assertEqual((stats.total_generations, stats.text_generations), (1, 1))
+        self.assertFalse(UserStats.objects.filter(pk=self.user.pk).exists())
+        self.archived_summary.assert_not_called()
+
+        self.assertEqual(reconcile(missing_only=True)['created'], 1)
+        stats = UserStats.objects.get(pk=self.user.pk)
+        self.assertEqual((stats.total_generations, stats.total_logins, stats.text_generations), (1, 3, 3))
+
+        # Later writes increment the seeded row
+        self.write()
+        stats = UserStats.objects.get(pk=self.user.pk)
+        self.assertEqual((stats.total_generations, stats.text_generations), (2, 4))
+
+    def test_background_backfill_seeds_scheduled_users(self):
+        backfill = StatsBackfill()
+        with mock.patch.object(StatsBackfill, '_ensure_worker'):
+            backfill.schedule(self.user.pk)
+        self.assertEqual(backfill.run_pending(), 1)
+        self.assertEqual(backfill.run_pending(), 0)
+        self.assertEqual(UserStats.objects.get(pk=self.user.pk).total_logins, 3)
+
+
+@override_settings(ACTIVITY_LOG_ASYNC=False, USER_STATS_BACKFILL_ASYNC=False)
+class ArchivedLogDeletionTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        archive_settings = self.settings(LOG_ARCHIVE_DIR=directory.name)
+        archive_settings.enable()
+        self.addCleanup(archive_settings.disable)
+        self.leaving = User.objects.create_user('leaving', password='unused-password')
+        self.staying = User.objects.create_user('staying', password='unused-password')
+
+    def archive_all(self):
+        for kind in KINDS:
+            LogArchive(kind).archive(timezone.now() + timedelta(seconds=1))
+
+    def test_deleting_a_user_removes_their_archived_rows(self):
+        for user in (self.leaving, self.staying):
+            UserLoginLog.objects.create(user=user)
+            log_user_activity(user=user, action='generate_text')
+        self.archive_all()
+        leaving_id = self.leaving.pk
+        self.assertEqual(LogArchive('login').count(leaving_id), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.leaving.delete()
+        for kind in KINDS:
+            with self.subTest(kind):
+                archive = LogArchive(kind)
+                self.assertEqual(archive.count(leaving_id), 0)
+                self.assertEqual(len(list(archive.rows(self.staying.pk))), 1)
+                self.assertEqual(len(archive.segments()), 1)
+
+    def test_logout_does_not_restore_an_archived_login(self):
+        login = UserLoginLog.objects.create(user=self.leaving)
+        self.archive_all()
+        # The open login was read just before the archiver removed it
+        request = RequestFactory().post('/logout/')
+        request.session = self.client.session
+        with mock.patch('main.partitions.PartitionSet.latest', return_value=login):
+            log_user_logout(self.leaving, request)
+        self.assertFalse(UserLoginLog.objects.exists())
+        self.assertTrue(UserActivityLog.objects.filter(action='logout').exists())
+
+
+@override_settings(ACTIVITY_LOG_ASYNC=False, USER_STATS_BACKFILL_ASYNC=False)
+class RecentActivityTests(TestCase):
+    def test_page_views_are_recorded_in_the_ring_buffer(self):
+        user = User.objects.create_user('reader', password='unused-password')
+        self.client.force_login(user)
+        self.client.get(reverse('index'))
+        self.client.get(reverse('coherence_report'))
+
+        response = self.client.get(reverse('session_info'))
+        paths = [activity['metadata']['path'] for activity in response.context['recent_activities']]
+        self.assertEqual(paths[-3:], [reverse('index'), reverse('coherence_report'), reverse('session_info')])
+        self.assertEqual({activity['type'] for activity in response.context['recent_activities']}, {'page_view'})
+        self.assertGreaterEqual(response.context['session_info']['recent_activities_count'], 3)
@@ -0,0 +1,327 @@
+"""
+Per-user totals kept current by the logging pipeline
+
+UserStats holds what the profile page and get_user_statistics used to
+count on every request. The GeneratedText and log managers and the rollup
+writer report their writes here, and the matching UserStats rows are
+incremented; deleting history recounts the generation total.
+
+A user without a row is seeded off the request path. Writes and reads for
+such a user schedule it on a background backfill thread
+(USER_STATS_BACKFILL_ASYNC), and reconcile_user_stats --missing creates
+any row still missing. Until then writes leave the totals alone, since
+the seed counts their source rows, and reads count the live tables
+without the log archive.
+
+Every update is a single-statement increment (count = count + n): totals
+with F() expressions and per-action counts as UserActionCount rows upserted
+with ON CONFLICT, as the hourly aggregates are. Concurrent workers never
+read-modify-write a value, so no update is lost and none waits on a row
+lock SQLite cannot take.
+
+Retention (clean_old_logs) does not decrement the totals; the
+reconcile_user_stats command recomputes them from the database and the
+log archive whenever they need to match exactly.
+"""
+import logging
+import os
+import threading
+from collections import Counter
+from typing import Dict, Iterable, Optional, Set
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F, Q, Sum
+
+from .models import ActivityRollup, GeneratedText, UserActionCount, UserActivityLog, UserLoginLog, UserStats
+
+logger = logging.getLogger(__name__)
+
+
+def _new_delta() -> Dict[str, object]:
+    return {'generations': 0, 'logins': 0, 'actions': Counter(), 'last_login': None}
+
+
+def apply_deltas(deltas: Dict[int, Dict[str, object]]) -> None:
+    """
+    Add per-user deltas to their UserStats rows; failures are logged, never raised
+    """
+    for user_id, delta in deltas.items():
+        try:
+            with transaction.atomic():
+                _apply(user_id, delta)
+        except Exception:
+            # The source rows are already written; reconcile_user_stats repairs the totals
+            logger.exception('UserStats update failed for user %s', user_id)
+
+
+def _apply(user_id: int, delta: Dict[str, object]) -> None:
+    actions = delta['actions']
+    # Write first: the transaction takes SQLite's write lock at once instead of upgrading from a read
+    updated = UserStats.objects.filter(pk=user_id).update(
+        total_generations=F('total_generations') + delta['generations'],
+        total_logins=F('total_logins') + delta['logins'],
+        total_activities=F('total_activities') + sum(actions.values()),
+    )
+    if not updated:
+        # The seed is computed from the source tables, which already hold this delta's rows
+        schedule_seed(user_id)
+        return
+
+    if actions:
+        _add_actions(user_id, actions)
+    last_login = delta['last_login']
+    if last_login:
+        UserStats.objects.filter(pk=user_id).filter(
+            Q(last_login_at__isnull=True) | Q(last_login_at__lt=last_login)
+        ).update(last_login_at=last_login)
+
+
+def _add_actions(user_id: int, actions: Dict[str, int]) -> None:
+    if connection.vendor in ('sqlite', 'postgresql'):
+        table = connection.ops.quote_name(UserActionCount._meta.db_table)
+        sql = (
+            f'INSERT INTO {table} (user_id, action, count) VALUES (%s, %s, %s) '
+            f'ON CONFLICT (user_id, action) DO UPDATE SET count = {table}.count + excluded.count'
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, [(user_id, action, count) for action, count in actions.items()])
+        return
+
+    for action, count in actions.items():
+        if UserActionCount.objects.filter(user_id=user_id, action=action).update(count=F('count') + count):
+            continue
+        try:
+            with transaction.atomic():
+                UserActionCount.objects.create(user_id=user_id, action=action, count=count)
+        except IntegrityError:
+            # Another worker created the row first
+            UserActionCount.objects.filter(user_id=user_id, action=action).update(count=F('count') + count)
+
+
+def _create(user_id: int, fields: Dict[str, object]) -> UserStats:
+    fields = dict(fields)
+    actions = fields.pop('action_counts')
+    stats = UserStats.objects.create(user_id=user_id, **fields)
+    UserActionCount.objects.bulk_create([
+        UserActionCount(user_id=user_id, action=action, count=count) for action, count in actions.items() if count
+    ])
+    return stats
+
+
+def _replace_actions(user_id: int, actions: Dict[str, int]) -> None:
+    UserActionCount.objects.filter(user_id=user_id).delete()
+    UserActionCount.objects.bulk_create([
+        UserActionCount(user_id=user_id, action=action, count=count) for action, count in actions.items() if count
+    ])
+
+
+def record_rows(model, rows: Iterable) -> None:
+    """
+    Count newly written GeneratedText, UserActivityLog or UserLoginLog rows
+    """
+    deltas: Dict[int, Dict[str, object]] = {}
+    for row in rows:
+        if row.user_id is None:
+            continue
+        delta = deltas.setdefault(row.user_id, _new_delta())
+        if issubclass(model, GeneratedText):
+            delta['generations'] += 1
+        elif issubclass(model, UserActivityLog):
+            delta['actions'][row.action] += 1
+        elif row.login_successful:
+            delta['logins'] += 1
+            if delta['last_login'] is None or row.login_time > delta['last_login']:
+                delta['last_login'] = row.login_time
+    apply_deltas(deltas)
+
+
+def record_visits(counts: Dict[tuple, int]) -> None:
+    """
+    Count page visits added to the hourly rollups, keyed like rollups.RollupKey
+    """
+    deltas: Dict[int, Dict[str, object]] = {}
+    for (action, user_id, _, _), count in counts.items():
+        if user_id is not None:
+            deltas.setdefault(user_id, _new_delta())['actions'][action] += count
+    apply_deltas(deltas)
+
+
+def recount_generations(user_id: Optional[int]) -> None:
+    """
+    Refresh the generation total after history rows were deleted
+    """
+    if user_id is not None:
+        UserStats.objects.filter(pk=user_id).update(
+            total_generations=GeneratedText.objects.filter(user_id=user_id).count()
+        )
+
+
+def compute(user_id: int, include_archive: bool = True) -> Dict[str, object]:
+    """
+    UserStats fields of one user computed from the source tables
+    """
+    activity_logs = UserActivityLog.objects.across_partitions().filter(user_id=user_id)
+    logins = UserLoginLog.objects.across_partitions().filter(user_id=user_id, login_successful=True)
+    actions = activity_logs.count_by('action')
+    actions.update(dict(
+        ActivityRollup.objects.filter(user_id=user_id).values_list('action').annotate(total=Sum('count'))
+    ))
+    latest = logins.first()
+    fields = {
+        'total_generations': GeneratedText.objects.filter(user_id=user_id).count(),
+        'total_logins': logins.count(),
+        'last_login_at': latest.login_time if latest else None,
+    }
+    if include_archive:
+        from .log_archive import archived_summary
+        archived = archived_summary(user_id)
+        actions.update(archived['action_counts'])
+        fields['total_logins'] += archived['logins']
+        if archived['last_login'] and (fields['last_login_at'] is None or archived['last_login'] > fields['last_login_at']):
+            fields['last_login_at'] = archived['last_login']
+    fields['action_counts'] = dict(actions)
+    fields['total_activities'] = sum(actions.values())
+    return fields
+
+
+def seed(user_id: int) -> bool:
+    """
+    Create a missing UserStats row from the source tables and the log archive
+    """
+    if UserStats.objects.filter(pk=user_id).exists():
+        return False
+    try:
+        with transaction.atomic():
+            _create(user_id, compute(user_id))
+    except IntegrityError:
+        # Another worker seeded it first
+        return False
+    return True
+
+
+class StatsBackfill:
+    """
+    Seeds missing UserStats rows on a background thread
+    """
+
+    def __init__(self):
+        self._pending: Set[int] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def schedule(self, user_id: int) -> None:
+        self._ensure_worker()
+        with self._lock:
+            self._pending.add(user_id)
+        self._wake.set()
+
+    def _ensure_worker(self) -> None:
+        # Threads do not survive fork(), so restart the worker in child processes
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run_forever, name='user-stats-backfill', daemon=True)
+            self._thread.start()
+
+    def _run_forever(self) -> None:
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            self.run_pending()
+
+    def run_pending(self) -> int:
+        """
+        Seed every scheduled user now; returns how many rows were created
+        """
+        with self._lock:
+            user_ids, self._pending = self._pending, set()
+        close_old_connections()
+        created = 0
+        for user_id in sorted(user_ids):
+            try:
+                created += seed(user_id)
+            except Exception:
+                # Retried on the user's next write, or by reconcile_user_stats --missing
+                logger.exception('UserStats backfill failed for user %s', user_id)
+        return created
+
+
+_backfill: Optional[StatsBackfill] = None
+_backfill_lock = threading.Lock()
+
+
+def get_backfill() -> StatsBackfill:
+    global _backfill
+    if _backfill is None:
+        with _backfill_lock:
+            if _backfill is None:
+                _backfill = StatsBackfill()
+    return _backfill
+
+
+def schedule_seed(user_id: int) -> None:
+    """
+    Seed the user's missing UserStats row in the background (if enabled)
+    """
+    if getattr(settings, 'USER_STATS_BACKFILL_ASYNC', True):
+        get_backfill().schedule(user_id)
+
+
+def get_stats(user) -> UserStats:
+    """
+    The user's UserStats row (one primary-key read)
+
+    A missing row is scheduled for seeding and an unsaved one counted from
+    the live tables, without the log archive, is returned meanwhile.
+    """
+    stats = UserStats.objects.filter(pk=user.pk).first()
+    if stats is None:
+        schedule_seed(user.pk)
+        fields = compute(user.pk, include_archive=False)
+        actions = fields.pop('action_counts')
+        stats = UserStats(user_id=user.pk, **fields)
+        stats.action_counts = actions
+    return stats
+
+
+def reconcile(user_ids: Optional[Iterable[int]] = None, dry_run: bool = False,
+              missing_only: bool = False) -> Dict[str, int]:
+    """
+    Recompute UserStats from the source tables; returns how many rows were checked, created and corrected
+
+    With ``missing_only`` only users without a row are seeded.
+    """
+    from django.contrib.auth.models import User
+
+    users = User.objects.order_by('pk')
+    if user_ids is not None:
+        users = users.filter(pk__in=list(user_ids))
+    if missing_only:
+        users = users.filter(stats__isnull=True)
+    result = {'checked': 0, 'created': 0, 'corrected': 0}
+    for user_id in users.values_list('pk', flat=True).iterator():
+        fields = compute(user_id)
+        result['checked'] += 1
+        stats = UserStats.objects.filter(pk=user_id).first()
+        if stats is None:
+            result['created'] += 1
+            if not dry_run:
+                with transaction.atomic():
+                    _create(user_id, fields)
+            continue
+        # Zero counts are not stored as rows
+        fields['action_counts'] = {action: count for action, count in fields['action_counts'].items() if count}
+        if any(getattr(stats, name) != value for name, value in fields.items()):
+            result['corrected'] += 1
+            if not dry_run:
+                actions = fields.pop('action_counts')
+                with transaction.atomic():
+                    UserStats.objects.filter(pk=user_id).update(**fields)
+                    _replace_actions(user_id, actions)
+    return result
@@ -1,7 +1,11 @@
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.db import models
-from .models import UserLoginLog, UserActivityLog
+from django.db import transaction
+from .models import ActivityRollup, UserLoginLog, UserActivityLog
+from .activity_sink import get_sink, is_async_enabled
+from .batch_delete import delete_in_batches
+from .rollups import add_rollup_counts, hour_bucket
+from .visitor import get_visitor_id
 
 
 def get_client_ip(request):
@@ -44,13 +48,13 @@ def log_user_logout(user, request):
     """Kullanıcı çıkışını kaydet"""
     # En son login kaydını bul ve logout zamanını güncelle
     try:
-        login_log = UserLoginLog.objects.filter(
+        login_log = UserLoginLog.objects.across_partitions().filter(
             user=user,
             logout_time__isnull=True,
             login_successful=True
-        ).latest('login_time')
-        login_log.logout_time = timezone.now()
-        login_log.save()
+        ).latest()
+        # update() rather than save(): a row archived since the read must not be inserted again
+        type(login_log)._base_manager.filter(pk=login_log.pk).update(logout_time=timezone.now())
     except UserLoginLog.DoesNotExist:
         pass
     
@@ -63,83 +67,129 @@ def log_user_logout(user, request):
     )
 
 
-def log_user_activity(user=None, action='', description='', request=None, additional_data=None):
-    """Kullanıcı aktivitesini kaydet"""
+def log_user_activity(user=None, action='', description='', request=None, additional_data=None,
+                      session_key=None, ip_address=None, user_agent=None, commit=True):
+    """Kullanıcı aktivitesini kaydet (commit=False kaydedilmemiş nesne döndürür, ACTIVITY_LOG_ASYNC açıkken toplu yazılır)"""
     activity_data = {
         'user': user,
         'action': action,
         'description': description,
-        'additional_data': additional_data or {}
+        'additional_data': additional_data or {},
+        'session_key': session_key or '',
+        'ip_address': ip_address,
+        'user_agent': user_agent or ''
     }
     
     if request:
         activity_data.update({
-            'session_key': request.session.session_key,
+            'session_key': request.session.session_key or get_visitor_id(request, create=False) or '',
             'ip_address': get_client_ip(request),
             'user_agent': get_user_agent(request)
         })
     
+    if not commit:
+        return UserActivityLog(**activity_data)
+    if is_async_enabled():
+        activity = UserActivityLog(**activity_data)
+        # İşlem geri alınırsa kayıt da yazılmaz
+        transaction.on_commit(lambda: get_sink().emit(activity))
+        return activity
     return UserActivityLog.objects.create(**activity_data)
 
 
-def log_text_generation(user, session_key, input_text, generated_text, request=None):
+def log_page_visit(user, action, request):
+    """Sayfa ziyaretini tek tek kaydetmek yerine saatlik sayaca ekle"""
+    key = (
+        action,
+        user.pk if user is not None else None,
+        request.session.session_key or get_visitor_id(request, create=False) or '',
+        hour_bucket(timezone.now())
+    )
+    if is_async_enabled():
+        transaction.on_commit(lambda: get_sink().count(key))
+    else:
+        add_rollup_counts({key: 1})
+
+
+def log_text_generation(user, session_key, input_text, generated_text, request=None,
+                        ip_address=None, user_agent=None, cache_hit=False, commit=True):
     """Metin üretimi aktivitesini kaydet"""
-    log_user_activity(
+    return log_user_activity(
         user=user,
         action='generate_text',
         description=f'Generated text for input: "{input_text[:50]}..."',
         request=request,
+        session_key=session_key,
+        ip_address=ip_address,
+        user_agent=user_agent,
         additional_data={
             'input_length': len(input_text),
             'output_length': len(generated_text),
             'input_preview': input_text[:100],
-            'output_preview': generated_text[:100]
-        }
+            'output_preview': generated_text[:100],
+            'cache_hit': cache_hit
+        },
+        commit=commit
     )
 
 
-def get_user_statistics(user):
-    """Kullanıcı istatistiklerini döndür"""
-    login_logs = UserLoginLog.objects.filter(user=user, login_successful=True)
-    activity_logs = UserActivityLog.objects.filter(user=user)
+def get_user_statistics(user, include_archive=False):
+    """Kullanıcı istatistiklerini UserStats satırından döndür (include_archive arşivdeki aktivite sayısını ekler)"""
+    from .user_stats import get_stats
+    user_stats = get_stats(user)
     
     stats = {
-        'total_logins': login_logs.count(),
-        'total_activities': activity_logs.count(),
-        'text_generations': activity_logs.filter(action='generate_text').count(),
-        'last_login': login_logs.first().login_time if login_logs.exists() else None,
+        'total_logins': user_stats.total_logins,
+        'total_activities': user_stats.total_activities,
+        'text_generations': user_stats.text_generations,
+        'last_login': user_stats.last_login_at,
         'most_common_actions': {}
     }
     
     # En çok yapılan aktiviteleri hesapla
-    action_counts = activity_logs.values('action').annotate(
-        count=models.Count('action')
-    ).order_by('-count')[:5]
+    for action, count in sorted(user_stats.action_counts.items(), key=lambda item: item[1], reverse=True)[:5]:
+        stats['most_common_actions'][action] = count
     
-    for action in action_counts:
-        stats['most_common_actions'][action['action']] = action['count']
+    if include_archive:
+        from .log_archive import LogArchive
+        stats['archived_activities'] = LogArchive('activity').count(user.pk)
     
     return stats
 
 
-def clean_old_logs(days=30):
-    """Eski log kayıtlarını temizle (varsayılan 30 gün)"""
+def clean_old_logs(days=30, batch_size=None, sleep=None, progress=None, dry_run=False):
+    """Eski log kayıtlarını küçük partiler halinde temizle (varsayılan 30 gün)"""
     from django.utils import timezone
     import datetime
     
     cutoff_date = timezone.now() - datetime.timedelta(days=days)
+    log_sets = {
+        'deleted_logins': UserLoginLog.objects.across_partitions(end=cutoff_date),
+        'deleted_activities': UserActivityLog.objects.across_partitions(end=cutoff_date),
+    }
     
-    # Eski login loglarını temizle
-    old_logins = UserLoginLog.objects.filter(login_time__lt=cutoff_date)
-    login_count = old_logins.count()
-    old_logins.delete()
+    # Kuru çalıştırmada yalnızca tek bir sayım yapılır
+    if dry_run:
+        result = {key: log_set.count() for key, log_set in log_sets.items()}
+        result['deleted_rollups'] = ActivityRollup.objects.filter(hour__lt=cutoff_date).count()
+        return result
     
-    # Eski activity loglarını temizle
-    old_activities = UserActivityLog.objects.filter(timestamp__lt=cutoff_date)
-    activity_count = old_activities.count()
-    old_activities.delete()
+    # Tamamen eski aylık tablolar satır satır silinmez, doğrudan kaldırılır
+    result = {'dropped_partitions': []}
+    for key, model in (('deleted_logins', UserLoginLog), ('deleted_activities', UserActivityLog)):
+        dropped = model.objects.partitions().drop_before(cutoff_date)
+        result['dropped_partitions'].extend(dropped)
+        result[key] = sum(rows for _, rows in dropped)
     
-    return {
-        'deleted_logins': login_count,
-        'deleted_activities': activity_count
+    querysets = {
+        'deleted_logins': UserLoginLog.objects.across_partitions(end=cutoff_date).querysets,
+        'deleted_activities': UserActivityLog.objects.across_partitions(end=cutoff_date).querysets,
+        'deleted_rollups': [ActivityRollup.objects.filter(hour__lt=cutoff_date)],
     }
+    for key, queryset_list in querysets.items():
+        report = (lambda deleted, batches, last_pk, key=key: progress(key, deleted, batches, last_pk)) if progress else None
+        result[key] = result.get(key, 0) + sum(
+            delete_in_batches(queryset, batch_size=batch_size, sleep=sleep, progress=report)
+            for queryset in queryset_list
+        )
+    return result
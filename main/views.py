@@ -1,6 +1,8 @@
 from django.shortcuts import render, redirect
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth import authenticate, login as auth_login, logout as auth_logout
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
@@ -9,23 +11,57 @@ from django.contrib import messages
 from django.contrib.auth.models import User
 from django.contrib.auth import update_session_auth_hash
 from django.utils import timezone
+from django.db import transaction
+from django.conf import settings as django_settings
 from datetime import timedelta
 import json
+import time
 
-from lgram.models.chunk import create_language_model
-from .models import GeneratedText, UserActivityLog, UserLoginLog
+from .models import GeneratedText, GenerationJob, UserActivityLog
 from .utils import (
-    log_user_login, log_user_logout, log_user_activity, 
+    log_user_login, log_user_logout, log_user_activity, log_page_visit,
     log_text_generation, get_client_ip
 )
 from .session_manager import SessionManager
+from .visitor import is_new_visitor
+from .model_registry import ModelRegistry
+from .jobs import claim_job, default_worker_id, enqueue_generation, fail_job, finish_job, job_to_dict, release_job
+from .streaming import stream_generation, astream_generation, follow_job, afollow_job
+from .generation_cache import GenerationCache
+from .generation_pool import generate_many
+from .analysis import analyze_text, check_text_size
+from .coherence import DEPTH_LEVELS, score_coherence
+from .parse_cache import ParseCache
+from .data_export import gzip_stream, iter_user_export
+from .user_stats import get_stats, recount_generations
+from .search import search_history
+from .rate_limit import check_rate
+
+def _read_generation_settings(request, data, num_sentences, length):
+	"""Read generation sliders from the request and remember them in the session"""
+	# Get user settings if provided
+	try:
+		num_sentences = int(data.get('num_sentences', num_sentences))
+	except Exception:
+		pass  # Keep default from session
+	try:
+		length = int(data.get('length', length))
+	except Exception:
+		pass  # Keep default from session
+	
+	# Save settings to session for next time
+	SessionManager.store_generation_settings(request, {
+		'num_sentences': num_sentences,
+		'length': length
+	})
+	return num_sentences, length
 
 @csrf_exempt
 def index(request):
 	result = None
 	
-	# Use SessionManager to get consistent session key
-	session_key = SessionManager.get_session_key(request)
+	# Use SessionManager to get consistent session key; read-only visits do not create a session
+	session_key = SessionManager.get_session_key(request, create_session=request.method == 'POST')
 	
 	# Get user's generation settings from session
 	settings = SessionManager.get_generation_settings(request)
@@ -37,6 +73,8 @@ def index(request):
 		if 'clear_history' in request.POST:
 			deleted_count = GeneratedText.objects.filter(session_key=session_key).count()
 			GeneratedText.objects.filter(session_key=session_key).delete()
+			if request.user.is_authenticated:
+				recount_generations(request.user.pk)
 			
 			# Log activity
 			log_user_activity(
@@ -56,84 +94,258 @@ def index(request):
 			messages.error(request, 'Please enter some text to generate.')
 			return redirect('index')
 			
-		# Get user settings if provided
-		try:
-			num_sentences = int(request.POST.get('num_sentences', num_sentences))
-		except Exception:
-			pass  # Keep default from session
-		try:
-			length = int(request.POST.get('length', length))
-		except Exception:
-			pass  # Keep default from session
+		retry_after = check_rate(request)
+		if retry_after is not None:
+			if 'application/json' in request.headers.get('Accept', ''):
+				return _rate_limited_response(retry_after)
+			messages.error(request, f'Too many generation requests, try again in {retry_after} seconds.')
+			return redirect('index')
 		
-		# Save settings to session for next time
-		SessionManager.store_generation_settings(request, {
-			'num_sentences': num_sentences,
-			'length': length
-		})
-		input_words = text.strip().rstrip('.').split()
-		try:
-			model = create_language_model()
-			generated_text = model.generate_text(
-				num_sentences=num_sentences,
-				input_words=input_words,
-				length=length,
-				use_progress_bar=True
-			)
-			corrected_text = model.correct_grammar_t5(generated_text)
-			result = corrected_text
-			# Save to DB
-			generated_text_obj = GeneratedText.objects.create(
-				user=request.user if request.user.is_authenticated else None,
-				session_key=session_key,
-				input_text=text,
-				generated_text=corrected_text,
-				ip_address=get_client_ip(request)
-			)
-			
-			# Log activity
-			log_text_generation(
-				user=request.user if request.user.is_authenticated else None,
-				session_key=session_key,
-				input_text=text,
-				generated_text=corrected_text,
-				request=request
-			)
-			
-			messages.success(request, 'Text generated successfully!')
-		except Exception as e:
-			result = f'Error: {e}'
-			messages.error(request, f'Generation failed: {str(e)}')
+		num_sentences, length = _read_generation_settings(request, request.POST, num_sentences, length)
+		# Users asking for a fresh sample skip the result cache
+		use_cache = 'fresh_sample' not in request.POST
+		job = enqueue_generation(request, session_key, text, num_sentences, length, use_cache=use_cache)
+		
+		# Script and XHR clients get the job id straight back and poll for the result
+		if 'application/json' in request.headers.get('Accept', ''):
+			return JsonResponse({
+				'job_id': job.id,
+				'status': job.status,
+				'status_url': reverse('job_status', args=[job.id]),
+			}, status=202)
+		
+		messages.info(request, 'Your text is being generated. It will appear below when ready.')
+		return redirect(f"{reverse('index')}?job={job.id}")
 
-	# Get user's history (last 10)
-	history = GeneratedText.objects.filter(session_key=session_key).order_by('-created_at')[:10]
+	# Job submitted by this visitor that the page should poll for
+	pending_job = None
+	job_id = request.GET.get('job')
+	if job_id and job_id.isdigit():
+		pending_job = GenerationJob.objects.filter(id=job_id, session_key=session_key).first()
+		if pending_job and pending_job.status == GenerationJob.STATUS_DONE:
+			result = pending_job.result_text
+
+	# Get user's history (last 10); a visitor id minted on this request has none
+	history = []
+	if not is_new_visitor(request):
+		history = GeneratedText.objects.filter(session_key=session_key).order_by('-created_at')[:10]
 	
 	# Log history view if there's any history to show
 	if history and request.method == 'GET':
-		log_user_activity(
+		log_page_visit(
 			user=request.user if request.user.is_authenticated else None,
 			action='view_history',
-			description=f'Viewed history with {len(history)} items',
-			request=request,
-			additional_data={'history_count': len(history)}
+			request=request
 		)
 	return render(request, 'main/index.html', {
 		'result': result,
+		'pending_job': pending_job,
 		'history': history,
 		'num_sentences': num_sentences,
 		'length': length,
 	})
 
+def job_status(request, job_id):
+	"""Return the status of a generation job as JSON"""
+	session_key = SessionManager.get_session_key(request)
+	job = GenerationJob.objects.filter(id=job_id, session_key=session_key).first()
+	if job is None:
+		return JsonResponse({'error': 'Job not found'}, status=404)
+	return JsonResponse(job_to_dict(job))
+
+def _rate_limited_response(retry_after):
+	"""429 response for a caller whose generation budget is used up"""
+	response = JsonResponse({'error': 'Too many generation requests, try again later.'}, status=429)
+	response['Retry-After'] = str(retry_after)
+	return response
+
+@require_http_methods(['POST'])
+def generate_stream(request):
+	"""Queue a generation for streaming and return the URL of its Server-Sent Events stream
+	
+	Signed-in users only; CSRF-protected and counted against GENERATION_RATE_LIMIT like the form.
+	"""
+	if not request.user.is_authenticated:
+		return JsonResponse({'error': 'Authentication required'}, status=401)
+	text = request.POST.get('input_text', '')
+	if not text.strip():
+		return JsonResponse({'error': 'Please enter some text to generate.'}, status=400)
+	retry_after = check_rate(request)
+	if retry_after is not None:
+		return _rate_limited_response(retry_after)
+	
+	session_key = SessionManager.get_session_key(request, create_session=True)
+	settings = SessionManager.get_generation_settings(request)
+	num_sentences, length = _read_generation_settings(
+		request, request.POST, settings.get('num_sentences', 5), settings.get('length', 13)
+	)
+	use_cache = 'fresh_sample' not in request.POST
+	job = enqueue_generation(request, session_key, text, num_sentences, length, use_cache=use_cache, stream=True)
+	return JsonResponse({
+		'job_id': job.id,
+		'status': job.status,
+		'stream_url': reverse('generate_stream_job', args=[job.id]),
+		'status_url': reverse('job_status', args=[job.id]),
+	}, status=202)
+
+@login_required
+def stream_job(request, job_id):
+	"""Stream a generation job's sentences as Server-Sent Events
+	
+	The model only runs if this request claims the queued job. A finished job is replayed and a job
+	taken by a worker is followed until it ends, so reconnects and prefetches never start another run.
+	"""
+	job = GenerationJob.objects.filter(id=job_id, user=request.user).first()
+	if job is None:
+		return JsonResponse({'error': 'Job not found'}, status=404)
+	
+	# Under ASGI the stream is async so a slow generation does not pin a thread per client
+	is_async = isinstance(request, ASGIRequest)
+	generate = astream_generation if is_async else stream_generation
+	if job.status == GenerationJob.STATUS_DONE:
+		stream = generate(job.input_text, job.num_sentences, job.length, lambda text: None, cached_text=job.result_text)
+	elif claim_job(job.id, f'stream:{default_worker_id()}'):
+		job = GenerationJob.objects.select_related('user').get(id=job.id)
+		stream = generate(
+			job.input_text, job.num_sentences, job.length,
+			lambda text: finish_job(job, text),
+			on_error=lambda error: fail_job(job, error),
+			# A client that disconnects mid-stream leaves the job to the workers
+			on_abort=lambda: release_job(job)
+		)
+	else:
+		stream = (afollow_job if is_async else follow_job)(job.id)
+	
+	response = StreamingHttpResponse(stream, content_type='text/event-stream')
+	response['Cache-Control'] = 'no-cache'
+	response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+	return response
+
+def _parse_batch_prompts(payload, default_sentences, default_length):
+	"""Validate the prompt list posted to the batch API"""
+	prompts = payload.get('prompts') if isinstance(payload, dict) else None
+	if not isinstance(prompts, list) or not prompts:
+		raise ValueError('"prompts" must be a non-empty list')
+	max_prompts = getattr(django_settings, 'GENERATION_BATCH_MAX_PROMPTS', 32)
+	if len(prompts) > max_prompts:
+		raise ValueError(f'At most {max_prompts} prompts are allowed per request')
+	
+	parsed = []
+	for index, prompt in enumerate(prompts):
+		if isinstance(prompt, str):
+			prompt = {'input_text': prompt}
+		if not isinstance(prompt, dict):
+			raise ValueError(f'Prompt {index} must be a string or an object')
+		text = prompt.get('input_text', '')
+		if not isinstance(text, str) or not text.strip():
+			raise ValueError(f'Prompt {index} has no input_text')
+		num_sentences = int(prompt.get('num_sentences', default_sentences))
+		length = int(prompt.get('length', default_length))
+		if not 1 <= num_sentences <= 10 or not 5 <= length <= 30:
+			raise ValueError(f'Prompt {index}: num_sentences must be 1-10 and length 5-30')
+		parsed.append({
+			'input_text': text,
+			'num_sentences': num_sentences,
+			'length': length,
+			'fresh': bool(prompt.get('fresh', False)),
+		})
+	return parsed
+
+@require_http_methods(['POST'])
+def generate_batch_api(request):
+	"""Generate text for a list of prompts in parallel and return the results as JSON
+	
+	Signed-in users only; clients authenticated by the session cookie must send the CSRF token
+	(X-CSRFToken header). Every prompt counts against GENERATION_RATE_LIMIT.
+	"""
+	if not request.user.is_authenticated:
+		return JsonResponse({'error': 'Authentication required'}, status=401)
+	session_key = SessionManager.get_session_key(request)
+	settings = SessionManager.get_generation_settings(request)
+	try:
+		prompts = _parse_batch_prompts(
+			json.loads(request.body or b'{}'),
+			settings.get('num_sentences', 5),
+			settings.get('length', 13)
+		)
+	except (ValueError, TypeError) as e:
+		return JsonResponse({'error': str(e)}, status=400)
+	
+	retry_after = check_rate(request, cost=len(prompts))
+	if retry_after is not None:
+		return _rate_limited_response(retry_after)
+	
+	# Serve cached prompts directly and fan the rest out to the process pool
+	outcomes = [None] * len(prompts)
+	pending = []
+	for index, prompt in enumerate(prompts):
+		cached_text = None
+		if not prompt['fresh']:
+			cached_text = GenerationCache.get(prompt['input_text'], prompt['num_sentences'], prompt['length'])
+		if cached_text is not None:
+			outcomes[index] = {'generated_text': cached_text, 'error': None, 'cached': True}
+		else:
+			pending.append(index)
+	
+	for index, outcome in zip(pending, generate_many([prompts[i] for i in pending])):
+		outcome['cached'] = False
+		outcomes[index] = outcome
+		if outcome['error'] is None:
+			prompt = prompts[index]
+			GenerationCache.set(prompt['input_text'], prompt['num_sentences'], prompt['length'], outcome['generated_text'])
+	
+	# One INSERT per table for the whole batch
+	user = request.user
+	ip_address = get_client_ip(request)
+	text_rows = []
+	activity_rows = []
+	for prompt, outcome in zip(prompts, outcomes):
+		if outcome['error'] is not None:
+			continue
+		text_rows.append(GeneratedText(
+			user=user,
+			session_key=session_key,
+			input_text=prompt['input_text'],
+			generated_text=outcome['generated_text'],
+			ip_address=ip_address
+		))
+		activity_rows.append(log_text_generation(
+			user=user,
+			session_key=session_key,
+			input_text=prompt['input_text'],
+			generated_text=outcome['generated_text'],
+			request=request,
+			cache_hit=outcome['cached'],
+			commit=False
+		))
+	with transaction.atomic():
+		GeneratedText.objects.bulk_create(text_rows)
+		UserActivityLog.objects.bulk_create(activity_rows)
+	
+	saved_rows = iter(text_rows)
+	results = []
+	for prompt, outcome in zip(prompts, outcomes):
+		saved = next(saved_rows) if outcome['error'] is None else None
+		results.append({
+			'input_text': prompt['input_text'],
+			'num_sentences': prompt['num_sentences'],
+			'length': prompt['length'],
+			'generated_text': outcome['generated_text'],
+			'cached': outcome['cached'],
+			'error': outcome['error'],
+			'id': saved.id if saved else None,
+		})
+	return JsonResponse({'results': results})
+
 @csrf_exempt
 def transition_analysis(request):
 	"""Handle transition analysis requests"""
 	analysis_results = None
 	
 	# Log page visit
-	log_user_activity(
+	log_page_visit(
 		user=request.user if request.user.is_authenticated else None,
 		action='view_transition_analysis',
-		description='Visited Transition Analysis page',
 		request=request
 	)
 	
@@ -144,20 +356,7 @@ def transition_analysis(request):
 		
 		if text.strip():
 			try:
-				# Placeholder for centering theory analysis
-				# This would integrate with lgram's centering theory implementation
-				analysis_results = {
-					'continue_count': 12,
-					'retain_count': 8,
-					'shift_count': 5,
-					'rough_shift_count': 2,
-					'coherence_score': 0.78,
-					'transitions': [
-						{'type': 'CONTINUE', 'center': 'the student', 'backward_center': 'the student'},
-						{'type': 'RETAIN', 'center': 'the professor', 'backward_center': 'the student'},
-						{'type': 'SHIFT', 'center': 'the assignment', 'backward_center': 'the professor'},
-					]
-				}
+				analysis_results = analyze_text(text, sentence_window, coherence_threshold)
 				
 				# Log analysis activity
 				log_user_activity(
@@ -168,7 +367,8 @@ def transition_analysis(request):
 					additional_data={
 						'text_length': len(text),
 						'sentence_window': sentence_window,
-						'coherence_threshold': coherence_threshold
+						'coherence_threshold': coherence_threshold,
+						'analysis_seconds': round(analysis_results['timings']['total_seconds'], 3)
 					}
 				)
 				
@@ -185,10 +385,9 @@ def coherence_report(request):
 	coherence_report = None
 	
 	# Log page visit
-	log_user_activity(
+	log_page_visit(
 		user=request.user if request.user.is_authenticated else None,
 		action='view_coherence_report',
-		description='Visited Coherence Report page',
 		request=request
 	)
 	
@@ -200,36 +399,28 @@ def coherence_report(request):
 		
 		if text.strip():
 			try:
-				# Placeholder for coherence analysis
-				# This would integrate with lgram's coherence analysis
-				coherence_report = {
-					'overall_score': 0.82,
-					'entity_coherence': 0.85,
-					'transition_coherence': 0.79,
-					'sentence_count': len(text.split('.')),
-					'lexical_cohesion': 78.5,
-					'semantic_coherence': 82.3,
-					'referential_coherence': 76.8,
-					'key_entities': [
-						{'text': 'student', 'frequency': 8},
-						{'text': 'professor', 'frequency': 5},
-						{'text': 'assignment', 'frequency': 4},
-					],
-					'strengths': [
-						'Strong entity continuity throughout the text',
-						'Good use of referential expressions',
-						'Clear topic progression'
-					],
-					'improvements': [
-						'Some abrupt topic transitions',
-						'Could benefit from more connecting phrases'
-					],
-					'recommendations': [
-						'Add transitional sentences between paragraphs',
-						'Use more varied referential expressions',
-						'Consider reorganizing some content for better flow'
-					]
-				}
+				check_text_size(text)
+				
+				# Sentences and entities come from the parse cache shared with transition analysis;
+				# sentences past the depth's budget are dropped before anything is parsed
+				level = DEPTH_LEVELS.get(analysis_depth, DEPTH_LEVELS['standard'])
+				document = ParseCache.get_or_parse(text, max_sentences=level['max_sentences'])
+				parse_started = time.perf_counter()
+				entities = document.get_entities()
+				transitions = None
+				if level['centering']:
+					transitions = document.get_transitions()
+				parse_seconds = time.perf_counter() - parse_started
+				ParseCache.save(document)
+				
+				coherence_report = score_coherence(
+					entities,
+					analysis_depth=analysis_depth,
+					entity_weight=entity_weight,
+					transition_weight=transition_weight,
+					transitions=transitions
+				)
+				coherence_report['timings']['parse_seconds'] = parse_seconds
 				
 				# Log analysis activity
 				log_user_activity(
@@ -241,7 +432,9 @@ def coherence_report(request):
 						'text_length': len(text),
 						'analysis_depth': analysis_depth,
 						'entity_weight': entity_weight,
-						'transition_weight': transition_weight
+						'transition_weight': transition_weight,
+						'overall_score': coherence_report['overall_score'],
+						'analysis_seconds': coherence_report['timings']['total_seconds'] + parse_seconds
 					}
 				)
 				
@@ -349,43 +542,55 @@ def session_info_view(request):
 	generation_settings = SessionManager.get_generation_settings(request)
 	recent_activities = SessionManager.get_recent_activities(request)
 	
-	# Convert timestamp strings back to datetime objects for template
-	for activity in recent_activities:
-		from django.utils.dateparse import parse_datetime
-		activity['timestamp'] = parse_datetime(activity['timestamp'])
-	
 	return render(request, 'main/session_info.html', {
 		'session_info': session_info,
 		'generation_settings': generation_settings,
 		'recent_activities': recent_activities[-10:],  # Last 10 activities
+		'model_stats': ModelRegistry.get_stats(),
 	})
 
 @login_required
 def profile_view(request):
 	"""Display user profile information"""
-	# Get user statistics
-	total_generations = GeneratedText.objects.filter(user=request.user).count()
-	total_activities = UserActivityLog.objects.filter(user=request.user).count()
-	login_count = UserLoginLog.objects.filter(user=request.user, login_successful=True).count()
+	# Get user statistics (kept current in UserStats)
+	user_stats = get_stats(request.user)
 	days_member = (timezone.now() - request.user.date_joined).days
 	
 	stats = {
-		'total_generations': total_generations,
-		'total_activities': total_activities,
-		'login_count': login_count,
+		'total_generations': user_stats.total_generations,
+		'total_activities': user_stats.total_activities,
+		'login_count': user_stats.total_logins,
 		'days_member': days_member,
 	}
 	
 	# Get recent activities
-	recent_activities = UserActivityLog.objects.filter(
-		user=request.user
-	).order_by('-timestamp')[:10]
+	recent_activities = UserActivityLog.objects.across_partitions().filter(user=request.user).newest(10)
 	
 	return render(request, 'main/profile.html', {
 		'stats': stats,
 		'recent_activities': recent_activities,
 	})
 
+@login_required
+def history_search_view(request):
+	"""Search the user's generation history (full-text, best match first)"""
+	query = request.GET.get('q', '').strip()
+	results = search_history(request.user, query) if query else []
+	
+	if query:
+		log_user_activity(
+			user=request.user,
+			action='view_history',
+			description=f'Searched history for "{query[:50]}"',
+			request=request,
+			additional_data={'query': query[:100], 'results': len(results)}
+		)
+	
+	return render(request, 'main/history_search.html', {
+		'query': query,
+		'results': results,
+	})
+
 @login_required
 def settings_view(request):
 	"""Handle user settings and preferences"""
@@ -459,6 +664,7 @@ def settings_view(request):
 			# Clear all user history
 			deleted_count = GeneratedText.objects.filter(user=request.user).count()
 			GeneratedText.objects.filter(user=request.user).delete()
+			recount_generations(request.user.pk)
 			
 			log_user_activity(
 				user=request.user,
@@ -485,50 +691,7 @@ def settings_view(request):
 
 @login_required
 def export_data_view(request):
-	"""Export user data as JSON"""
-	# Collect user data
-	user_data = {
-		'user_info': {
-			'username': request.user.username,
-			'email': request.user.email,
-			'first_name': request.user.first_name,
-			'last_name': request.user.last_name,
-			'date_joined': request.user.date_joined.isoformat(),
-			'last_login': request.user.last_login.isoformat() if request.user.last_login else None,
-		},
-		'generated_texts': list(
-			GeneratedText.objects.filter(user=request.user).values(
-				'input_text', 'generated_text', 'created_at'
-			)
-		),
-		'activities': list(
-			UserActivityLog.objects.filter(user=request.user).values(
-				'action', 'description', 'timestamp', 'ip_address'
-			)
-		),
-		'login_history': list(
-			UserLoginLog.objects.filter(user=request.user).values(
-				'login_time', 'logout_time', 'ip_address', 'login_successful'
-			)
-		),
-		'export_date': timezone.now().isoformat(),
-	}
-	
-	# Convert datetime objects to strings
-	for item in user_data['generated_texts']:
-		if item['created_at']:
-			item['created_at'] = item['created_at'].isoformat()
-	
-	for item in user_data['activities']:
-		if item['timestamp']:
-			item['timestamp'] = item['timestamp'].isoformat()
-	
-	for item in user_data['login_history']:
-		if item['login_time']:
-			item['login_time'] = item['login_time'].isoformat()
-		if item['logout_time']:
-			item['logout_time'] = item['logout_time'].isoformat()
-	
+	"""Export user data as JSON, streamed (add ?compress=gzip for a .json.gz download)"""
 	# Log export activity
 	log_user_activity(
 		user=request.user,
@@ -537,12 +700,14 @@ def export_data_view(request):
 		request=request
 	)
 	
-	# Return JSON response
-	response = HttpResponse(
-		json.dumps(user_data, indent=2, ensure_ascii=False),
-		content_type='application/json'
-	)
-	response['Content-Disposition'] = f'attachment; filename="{request.user.username}_data_export.json"'
+	filename = f'{request.user.username}_data_export.json'
+	chunks = iter_user_export(request.user)
+	if request.GET.get('compress') == 'gzip':
+		response = StreamingHttpResponse(gzip_stream(chunks), content_type='application/gzip')
+		filename += '.gz'
+	else:
+		response = StreamingHttpResponse(chunks, content_type='application/json')
+	response['Content-Disposition'] = f'attachment; filename="{filename}"'
 	
 	return response
 
@@ -0,0 +1,65 @@
+"""
+Sessionless identity for anonymous visitors
+
+Anonymous visitors get a random id in a signed cookie instead of a
+django_session row. The id is used wherever the app keys data by
+"session" (history, jobs, logs). A real session is only created once the
+visitor stores something in it (generation settings, preferences); the
+id is then copied into the session so the visitor keeps their history.
+"""
+import uuid
+from typing import Optional
+
+from django.conf import settings
+
+VISITOR_SALT = 'main.visitor'
+
+
+def _cookie_name() -> str:
+    return getattr(settings, 'VISITOR_COOKIE_NAME', 'lgram_visitor')
+
+
+def get_visitor_id(request, create: bool = True) -> Optional[str]:
+    """
+    Visitor id from the signed cookie; a new one is minted (and set on the
+    response by VisitorCookieMiddleware) when ``create`` is true
+    """
+    visitor_id = getattr(request, '_visitor_id', None)
+    if visitor_id:
+        return visitor_id
+    visitor_id = request.get_signed_cookie(_cookie_name(), default=None, salt=VISITOR_SALT)
+    if visitor_id is None and create:
+        visitor_id = uuid.uuid4().hex
+        request._new_visitor = True
+    request._visitor_id = visitor_id
+    return visitor_id
+
+
+def is_new_visitor(request) -> bool:
+    """
+    True when the visitor id was minted during this request, so nothing can be stored under it yet
+    """
+    return getattr(request, '_new_visitor', False)
+
+
+class VisitorCookieMiddleware:
+    """
+    Sets the signed visitor cookie for ids minted during the request
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if is_new_visitor(request):
+            response.set_signed_cookie(
+                _cookie_name(),
+                request._visitor_id,
+                salt=VISITOR_SALT,
+                max_age=settings.SESSION_COOKIE_AGE,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite=settings.SESSION_COOKIE_SAMESITE,
+            )
+        return response